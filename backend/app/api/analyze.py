@@ -1,15 +1,62 @@
-from fastapi import APIRouter, HTTPException
-from models.schemas import PTInput, TreatmentPlanOutput
-from rag.pipeline import run_rag_pipeline
+import json
+from typing import Literal, Optional
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import StreamingResponse
+from app.core.config import settings
+from app.core.tracing import tracer
+from models.schemas import BatchAnalyzeRequest, BatchJobStatus, PTInput, TreatmentPlanOutput
+from rag.batch import batch_analyzer
+from rag.pipeline import run_rag_pipeline, stream_rag_pipeline
 
 router = APIRouter()
 
 
 @router.post("/analyze", response_model=TreatmentPlanOutput)
-async def analyze(pt_input: PTInput):
-    """Accept PT input and return an evidence-based treatment plan."""
+async def analyze(pt_input: PTInput, ingest: Optional[Literal["wait", "provisional"]] = None,
+                  latency_slo_ms: Optional[float] = Header(None, alias="X-Latency-SLO-Ms", gt=0)):
+    """Accept PT input and return an evidence-based treatment plan.
+
+    ``ingest`` overrides INGEST_POLICY for conditions that need new research.
+    With model routing enabled, an ``X-Latency-SLO-Ms`` header caps the model
+    tier at one expected to answer within it.
+    """
     try:
-        result = run_rag_pipeline(pt_input)
+        with tracer.trace("analyze"):
+            result = await run_rag_pipeline(pt_input, ingest_policy=ingest, latency_slo_ms=latency_slo_ms)
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/analyze/stream")
+async def analyze_stream(pt_input: PTInput, ingest: Optional[Literal["wait", "provisional"]] = None,
+                         latency_slo_ms: Optional[float] = Header(None, alias="X-Latency-SLO-Ms", gt=0)):
+    """Stream the treatment plan as NDJSON events, one plan section per line as it is generated."""
+
+    async def events():
+        try:
+            with tracer.trace("analyze_stream"):
+                async for event in stream_rag_pipeline(pt_input, ingest_policy=ingest, latency_slo_ms=latency_slo_ms):
+                    yield json.dumps(event) + "\n"
+        except Exception as e:
+            yield json.dumps({"event": "error", "detail": str(e)}) + "\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+
+@router.post("/analyze/batch", response_model=BatchJobStatus, status_code=202)
+async def analyze_batch(request: BatchAnalyzeRequest):
+    """Start a batch analysis job; poll GET /analyze/batch/{job_id} for its results."""
+    if len(request.inputs) > settings.BATCH_MAX_INPUTS:
+        raise HTTPException(status_code=413, detail=f"At most {settings.BATCH_MAX_INPUTS} inputs per batch")
+    job = await batch_analyzer.submit(request.inputs, mode=request.mode, ingest_policy=request.ingest)
+    return job.snapshot()
+
+
+@router.get("/analyze/batch/{job_id}", response_model=BatchJobStatus)
+async def analyze_batch_status(job_id: str):
+    """Progress of a batch job, with each input's plan or error once it is done."""
+    job = await batch_analyzer.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired batch job")
+    return job.snapshot()
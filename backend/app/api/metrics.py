@@ -0,0 +1,33 @@
+from fastapi import APIRouter, Query
+from app.core.tracing import tracer
+from rag.embeddings import query_cache
+from rag.response_cache import response_cache
+from rag.routing import model_router
+from rag.usage import plan_output_stats, prompt_usage
+from rag.warm_plans import warm_plans
+
+router = APIRouter()
+
+
+@router.get("/metrics")
+async def metrics():
+    """p50/p95/p99 latency per pipeline stage over recent requests.
+
+    Also token usage, plan output, query embedding cache, response cache, model
+    routing and warm plan stats.
+    """
+    return {
+        **tracer.metrics(),
+        "token_usage": prompt_usage.stats(),
+        "plan_output": plan_output_stats.stats(),
+        "embedding_cache": query_cache.stats(),
+        "response_cache": response_cache.stats(),
+        "model_routing": model_router.stats(),
+        "warm_plans": warm_plans.stats(),
+    }
+
+
+@router.get("/metrics/traces")
+async def recent_traces(limit: int = Query(20, ge=1, le=500)):
+    """The most recent request traces, span by span."""
+    return tracer.recent(limit)
@@ -0,0 +1,85 @@
+import importlib
+from typing import TYPE_CHECKING, Optional
+from app.core.config import settings
+from app.core.startup import startup_profile
+
+if TYPE_CHECKING:
+    import httpx
+    from anthropic import AsyncAnthropic
+    from postgrest import AsyncPostgrestClient
+
+# Clients are built on first use, not at import: anthropic and httpx alone add
+# ~0.5 s to importing main, which every scale-from-zero machine would pay
+# before serving its first request. The lifespan closes whatever was built.
+_http_client: Optional["httpx.AsyncClient"] = None
+_anthropic_client: Optional["AsyncAnthropic"] = None
+_supabase: Optional["AsyncPostgrestClient"] = None
+
+# Imported on a worker thread after startup when PRELOAD_CLIENTS is set; numpy
+# is not a client but is likewise deferred until the first request needs it
+PRELOAD_MODULES = ("httpx", "anthropic", "postgrest", "numpy")
+
+
+def get_http_client() -> "httpx.AsyncClient":
+    """One connection pool shared by the short outbound calls (Voyage, Supabase,
+    PubMed) so concurrent requests reuse keep-alive connections."""
+    global _http_client
+    if _http_client is None:
+        with startup_profile.phase("init http client"):
+            import httpx
+            _http_client = httpx.AsyncClient(
+                timeout=httpx.Timeout(30.0, connect=10.0),
+                limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+            )
+    return _http_client
+
+
+def get_anthropic_client() -> "AsyncAnthropic":
+    """Anthropic keeps its own connection pool: the shared client's 30 s timeout
+    would cut off long non-streaming generations, so it gets the SDK default."""
+    global _anthropic_client
+    if _anthropic_client is None:
+        with startup_profile.phase("init anthropic client"):
+            import anthropic
+            _anthropic_client = anthropic.AsyncAnthropic(
+                api_key=settings.ANTHROPIC_API_KEY,
+                base_url=settings.ANTHROPIC_BASE_URL or None,
+            )
+    return _anthropic_client
+
+
+def get_supabase() -> "AsyncPostgrestClient":
+    global _supabase
+    if _supabase is None:
+        http_client = get_http_client()
+        with startup_profile.phase("init supabase client"):
+            from postgrest import AsyncPostgrestClient
+            _supabase = AsyncPostgrestClient(
+                f"{settings.SUPABASE_URL}/rest/v1",
+                headers={
+                    "apikey": settings.SUPABASE_KEY,
+                    "Authorization": f"Bearer {settings.SUPABASE_KEY}",
+                },
+                http_client=http_client,
+            )
+    return _supabase
+
+
+def preload_client_modules() -> None:
+    """Import the client libraries so the first request finds them loaded.
+
+    Blocking; the lifespan runs it on a worker thread once the app is serving.
+    """
+    with startup_profile.phase("preload client modules"):
+        for module in PRELOAD_MODULES:
+            importlib.import_module(module)
+
+
+async def close_clients() -> None:
+    """Close the connection pools on application shutdown."""
+    global _http_client, _anthropic_client, _supabase
+    if _http_client is not None:
+        await _http_client.aclose()
+    if _anthropic_client is not None:
+        await _anthropic_client.close()
+    _http_client = _anthropic_client = _supabase = None
@@ -7,6 +7,131 @@ class Settings(BaseSettings):
     SUPABASE_URL: str = ""
     SUPABASE_KEY: str = ""
     DATABASE_URL: str = ""
+    NCBI_API_KEY: str = ""
+    NCBI_EUTILS_URL: str = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils"
+    VOYAGE_BASE_URL: str = "https://api.voyageai.com/v1"
+    ANTHROPIC_BASE_URL: str = ""
+    EMBEDDING_CACHE_PATH: str = ".cache/embeddings.sqlite3"
+    EMBEDDING_CACHE_SIZE: int = 2048
+    EMBEDDING_CACHE_TTL: int = 86400
+    # The SQLite tier: rows older than the TTL and the oldest beyond the row cap
+    # (~6 KB each) are pruned as new embeddings are written
+    EMBEDDING_CACHE_DISK_TTL: int = 30 * 86400
+    EMBEDDING_CACHE_DISK_ROWS: int = 20_000
+    STORE_BATCH_SIZE: int = 100
+    # Import the client libraries on a worker thread once the app is serving, so
+    # neither startup nor the first request waits for them
+    PRELOAD_CLIENTS: bool = True
+    # Voyage allows 1000 texts and 120K tokens per voyage-large-2 request; stay under both
+    EMBED_BATCH_MAX_TEXTS: int = 128
+    EMBED_BATCH_MAX_TOKENS: int = 100_000
+    EMBED_CONCURRENCY: int = 4
+    EMBED_MAX_RETRIES: int = 5
+    # Evidence re-ranking (rag.reranker): combined score weights, candidate pool
+    # fetched per search, and MMR diversity (lambda 1.0 disables it)
+    RERANK_SIMILARITY_WEIGHT: float = 0.7
+    RERANK_EVIDENCE_WEIGHT: float = 0.3
+    RERANK_RECENCY_WEIGHT: float = 0.0
+    RERANK_SOURCE_WEIGHT: float = 0.0
+    RERANK_RECENCY_HALF_LIFE: float = 10.0
+    RERANK_CANDIDATE_POOL: int = 50
+    RERANK_MMR_LAMBDA: float = 0.7
+    RERANK_DUPLICATE_SIMILARITY: float = 0.97
+    # Passage-level retrieval (rag.chunking); needs the research_chunks table and
+    # match_research_chunks RPC from sql/research_chunks.sql. Takes precedence
+    # over the document-level local index when both are enabled.
+    CHUNK_INDEX_ENABLED: bool = False
+    CHUNK_SIZE: int = 600  # characters; longer sections become sentence windows
+    CHUNK_OVERLAP: int = 120
+    CHUNK_CANDIDATE_POOL: int = 100  # passages fetched per search before grouping; the RPC caps it at 1000
+    PASSAGES_PER_DOCUMENT: int = 2
+    EVIDENCE_TOKEN_BUDGET: int = 1000  # prompt tokens for passages across all documents
+    # Hybrid retrieval (rag.lexical_index): BM25 over titles and abstracts, fused
+    # with the vector candidates by reciprocal rank fusion. Built from a
+    # research_documents snapshot at startup, then updated by store_documents.
+    # MIN_RESULTS documents matching LEXICAL_MIN_COVERAGE of the query's IDF
+    # weight make the evidence sufficient without a vector search.
+    LEXICAL_INDEX_ENABLED: bool = False
+    LEXICAL_INDEX_MAX_AGE: int = 86400
+    LEXICAL_CANDIDATE_POOL: int = 50
+    LEXICAL_MIN_COVERAGE: float = 0.6
+    RRF_K: int = 60
+    LOCAL_INDEX_ENABLED: bool = False
+    LOCAL_INDEX_PATH: str = ".cache/local_index"
+    LOCAL_INDEX_DTYPE: str = "float32"  # "float16" halves memory but searches ~10x slower
+    LOCAL_INDEX_MAX_AGE: int = 86400
+    # Quantized embeddings (rag.quantization): store_documents also writes each
+    # vector's sign bits and int8 codes (columns and match_research_documents_quantized
+    # RPC from sql/quantized_embeddings.sql; backfill with scripts/backfill_quantized.py).
+    # QUANTIZED_SEARCH "binary" or "int8" prefilters every row by Hamming distance
+    # or int8 dot product, then rescores the top QUANTIZED_RESCORE exactly. The
+    # RPC prefilters on the bits either way and returns int8 codes instead of
+    # float vectors; the local index keeps only the codes in memory and reads
+    # the rescored float vectors from its memory-mapped snapshot.
+    QUANTIZED_EMBEDDINGS_ENABLED: bool = False
+    QUANTIZED_SEARCH: str = "none"  # "none", "binary" or "int8" (4x the codes of binary and slower in NumPy)
+    QUANTIZED_RESCORE: int = 400  # the RPC caps it at 1000, pgvector's largest hnsw.ef_search
+    RESPONSE_CACHE_ENABLED: bool = True
+    RESPONSE_CACHE_SIZE: int = 256
+    RESPONSE_CACHE_TTL: int = 6 * 3600
+    RESPONSE_CACHE_SEMANTIC_DISTANCE: float = 0.03  # 0 disables the semantic tier
+    # Request tracing (app.core.tracing): traces kept for /api/v1/metrics, and
+    # optional replay to OpenTelemetry (needs opentelemetry-api and an SDK/exporter)
+    TRACE_BUFFER_SIZE: int = 2000
+    OTEL_EXPORT_ENABLED: bool = False
+    # "tool": the plan is a forced tool call whose input schema is TreatmentPlanOutput;
+    # "json": the plan is JSON text. Either way, a truncated or invalid plan is
+    # completed by requesting only its missing fields, up to this many times.
+    PLAN_OUTPUT_MODE: str = "tool"
+    PLAN_CONTINUATION_ATTEMPTS: int = 2
+    # Model routing (rag.routing): with MODEL_ROUTING_ENABLED each plan goes to
+    # the fast, standard or deep tier by evidence strength, input complexity and
+    # the X-Latency-SLO-Ms header; otherwise every plan uses the deep tier. A
+    # tier that times out (timeouts are seconds per generation) or is
+    # overloaded is retried once on its fallback ("" for none). EXPECTED_MS is
+    # the latency assumed for SLO routing until the tier has served requests.
+    MODEL_ROUTING_ENABLED: bool = False
+    ROUTING_STRONG_EVIDENCE_SHARE: float = 0.6  # systematic reviews + RCTs among the evidence
+    ROUTING_COMPLEX_INPUT: int = 2  # rag.routing.input_complexity score that needs the deep tier
+    FAST_MODEL: str = "claude-haiku-4-5"
+    FAST_MAX_TOKENS: int = 4096
+    FAST_TIMEOUT: float = 45.0
+    FAST_EXPECTED_MS: float = 12_000
+    FAST_FALLBACK: str = "standard"
+    STANDARD_MODEL: str = "claude-sonnet-4-5"
+    STANDARD_MAX_TOKENS: int = 4096
+    STANDARD_TIMEOUT: float = 90.0
+    STANDARD_EXPECTED_MS: float = 30_000
+    STANDARD_FALLBACK: str = "fast"
+    DEEP_MODEL: str = "claude-opus-4-5"
+    DEEP_MAX_TOKENS: int = 4096
+    DEEP_TIMEOUT: float = 150.0
+    DEEP_EXPECTED_MS: float = 50_000
+    DEEP_FALLBACK: str = "standard"
+    # Warm plans (rag.warm_plans): baseline plans per curated condition and
+    # healing stage, generated on WARM_PLAN_TIER by scripts/precompute_plans.py
+    # after the weekly refresh and stored in the warm_plans table
+    # (sql/warm_plans.sql), which each API process reloads every
+    # WARM_PLANS_RELOAD_SECONDS. A request whose diagnosis maps to a condition
+    # is answered while the condition's evidence is unchanged by asking
+    # WARM_PLAN_ADAPT_TIER for only the sections this patient changes.
+    WARM_PLANS_ENABLED: bool = False
+    WARM_PLANS_RELOAD_SECONDS: float = 300
+    WARM_PLAN_TIER: str = "deep"
+    WARM_PLAN_ADAPT_TIER: str = "standard"
+    # Batch analysis jobs (rag.batch): generations in flight per job in
+    # "concurrent" mode, and how often "message_batches" jobs poll Anthropic.
+    # Jobs are kept in the batch_jobs table (sql/batch_jobs.sql); one whose
+    # process stopped writing it for BATCH_JOB_LEASE_SECONDS without releasing
+    # it is resumed by another
+    BATCH_MAX_INPUTS: int = 200
+    BATCH_CONCURRENCY: int = 8
+    BATCH_POLL_SECONDS: float = 30.0
+    BATCH_JOB_TTL: int = 24 * 3600
+    BATCH_JOB_LEASE_SECONDS: float = 600
+    INGEST_WORKERS: int = 2
+    INGEST_POLICY: str = "wait"  # "wait" or "provisional"
+    INGEST_WAIT_SECONDS: float = 20.0
 
     class Config:
         env_file = ".env"
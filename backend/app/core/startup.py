@@ -0,0 +1,43 @@
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Tuple
+
+
+class StartupProfile:
+    """Wall time of each import and init phase of process startup.
+
+    Phases are always recorded (it costs two clock reads each); the report is
+    printed once the app has started when STARTUP_PROFILE=1. For a per-module
+    breakdown of a slow import phase, run ``python -X importtime -c "import main"``.
+    """
+
+    def __init__(self, enabled: bool):
+        self.enabled = enabled
+        self.started = time.perf_counter()
+        self.phases: List[Tuple[str, float]] = []
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - start))
+
+    def report(self) -> Dict[str, float]:
+        """Phase durations in milliseconds, plus the time elapsed since this module was imported."""
+        report = {name: round(seconds * 1000, 1) for name, seconds in self.phases}
+        report["elapsed"] = round((time.perf_counter() - self.started) * 1000, 1)
+        return report
+
+    def print_report(self) -> None:
+        if not self.enabled:
+            return
+        print("Startup profile:")
+        for name, ms in self.report().items():
+            print(f"  {name:<32} {ms:>8.1f} ms")
+
+
+# Read from the environment rather than settings: importing the settings is itself a profiled phase
+startup_profile = StartupProfile(enabled=os.environ.get("STARTUP_PROFILE", "").lower() in ("1", "true", "yes"))
@@ -0,0 +1,204 @@
+import math
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Deque, Dict, List, Optional
+
+from app.core.config import settings
+
+
+class Span:
+    """One timed stage of a trace, used as ``with tracer.span("embed") as span:``.
+
+    ``size`` is the stage's payload: characters for text, rows or articles
+    for searches and stores, tokens for prompts and generated output.
+    """
+
+    __slots__ = ("stage", "start", "duration", "size", "error", "_trace")
+
+    def __init__(self, stage: str, size: Optional[int] = None):
+        self.stage = stage
+        self.size = size
+        self.start = 0.0
+        self.duration = 0.0
+        self.error = False
+        self._trace: Optional["Trace"] = None
+
+    def __enter__(self) -> "Span":
+        self._trace = _current_trace.get()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.duration = time.perf_counter() - self.start
+        self.error = exc_type is not None
+        if self._trace is not None:
+            self._trace.spans.append(self)
+            self._trace = None
+
+
+class Trace:
+    """The spans recorded for one request or background ingestion job."""
+
+    __slots__ = ("name", "start", "wall_start", "duration", "error", "spans")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.start = 0.0
+        self.wall_start = 0
+        self.duration = 0.0
+        self.error = False
+        self.spans: List[Span] = []
+
+    def as_dict(self) -> Dict:
+        return {
+            "name": self.name,
+            "started_at": self.wall_start / 1e9,
+            "total_ms": round(self.duration * 1000, 2),
+            "error": self.error,
+            "spans": [{
+                "stage": span.stage,
+                "offset_ms": round((span.start - self.start) * 1000, 2),
+                "duration_ms": round(span.duration * 1000, 2),
+                "size": span.size,
+                "error": span.error,
+            } for span in self.spans],
+        }
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+
+
+def percentile(ordered: List[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list; shared by the tracing and routing metrics."""
+    return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+
+class Tracer:
+    """Always-on request tracing into an in-memory ring buffer.
+
+    A span costs two clock reads and a list append, and spans outside a
+    trace are timed but dropped. The last TRACE_BUFFER_SIZE traces back
+    the per-stage percentiles served at /api/v1/metrics; with
+    OTEL_EXPORT_ENABLED each finished trace is also replayed to the global
+    OpenTelemetry tracer provider (configure its exporter with the usual
+    OTEL_* environment variables or opentelemetry-instrument).
+    """
+
+    def __init__(self, buffer_size: int = 2000, export_otel: bool = False):
+        self.traces: Deque[Trace] = deque(maxlen=buffer_size)
+        self.export_otel = export_otel
+        self._otel_tracer = None
+
+    def trace(self, name: str) -> "_TraceScope":
+        """Start a trace that collects the spans of everything awaited inside it."""
+        return _TraceScope(self, name)
+
+    def span(self, stage: str, size: Optional[int] = None) -> Span:
+        return Span(stage, size)
+
+    def record(self, stage: str, seconds: float, size: Optional[int] = None) -> None:
+        """Add a span measured elsewhere, e.g. time to first token, ending now."""
+        trace = _current_trace.get()
+        if trace is None:
+            return
+        span = Span(stage, size)
+        span.start = time.perf_counter() - seconds
+        span.duration = seconds
+        trace.spans.append(span)
+
+    def _finish(self, trace: Trace) -> None:
+        self.traces.append(trace)
+        if self.export_otel:
+            self._export(trace)
+
+    def metrics(self) -> Dict:
+        """p50/p95/p99 latency per trace and per stage over the ring buffer."""
+        totals: Dict[str, List[float]] = {}
+        stages: Dict[str, List[Span]] = {}
+        for trace in list(self.traces):
+            totals.setdefault(trace.name, []).append(trace.duration)
+            for span in trace.spans:
+                stages.setdefault(span.stage, []).append(span)
+        return {
+            "traces": {name: self._summary(durations) for name, durations in totals.items()},
+            "stages": {stage: self._stage_summary(spans) for stage, spans in stages.items()},
+        }
+
+    @staticmethod
+    def _summary(durations: List[float]) -> Dict[str, float]:
+        ordered = sorted(durations)
+        return {
+            "count": len(ordered),
+            "p50_ms": round(percentile(ordered, 0.50) * 1000, 2),
+            "p95_ms": round(percentile(ordered, 0.95) * 1000, 2),
+            "p99_ms": round(percentile(ordered, 0.99) * 1000, 2),
+        }
+
+    def _stage_summary(self, spans: List[Span]) -> Dict[str, float]:
+        summary = self._summary([span.duration for span in spans])
+        summary["errors"] = sum(span.error for span in spans)
+        sizes = [span.size for span in spans if span.size is not None]
+        if sizes:
+            summary["mean_size"] = round(sum(sizes) / len(sizes), 1)
+        return summary
+
+    def recent(self, limit: int = 20) -> List[Dict]:
+        """The most recent traces, newest first."""
+        traces = list(self.traces)[-limit:]
+        return [trace.as_dict() for trace in reversed(traces)]
+
+    def _export(self, trace: Trace) -> None:
+        if self._otel_tracer is None:
+            try:
+                from opentelemetry import trace as otel_trace
+            except ImportError:
+                print("OTEL_EXPORT_ENABLED is set but opentelemetry-api is not installed; export disabled")
+                self.export_otel = False
+                return
+            self._otel_tracer = otel_trace.get_tracer("promPT")
+        from opentelemetry import trace as otel_trace
+
+        # Spans are timed with perf_counter; anchor them to the trace's wall-clock start
+        def wall_ns(perf: float) -> int:
+            return trace.wall_start + int((perf - trace.start) * 1e9)
+
+        root = self._otel_tracer.start_span(trace.name, start_time=trace.wall_start)
+        context = otel_trace.set_span_in_context(root)
+        for span in trace.spans:
+            attributes = {"size": span.size} if span.size is not None else None
+            child = self._otel_tracer.start_span(span.stage, context=context, start_time=wall_ns(span.start),
+                                                 attributes=attributes)
+            if span.error:
+                child.set_status(otel_trace.Status(otel_trace.StatusCode.ERROR))
+            child.end(end_time=wall_ns(span.start + span.duration))
+        root.end(end_time=wall_ns(trace.start + trace.duration))
+
+
+class _TraceScope:
+    """Context manager (sync or async code alike) that makes a Trace current."""
+
+    __slots__ = ("tracer", "trace", "token")
+
+    def __init__(self, tracer: Tracer, name: str):
+        self.tracer = tracer
+        self.trace = Trace(name)
+
+    def __enter__(self) -> Trace:
+        self.trace.wall_start = time.time_ns()
+        self.trace.start = time.perf_counter()
+        self.token = _current_trace.set(self.trace)
+        return self.trace
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.trace.duration = time.perf_counter() - self.trace.start
+        self.trace.error = exc_type is not None
+        try:
+            _current_trace.reset(self.token)
+        except ValueError:
+            # A streaming response's generator can be closed from another context
+            pass
+        self.tracer._finish(self.trace)
+
+
+tracer = Tracer(buffer_size=settings.TRACE_BUFFER_SIZE, export_otel=settings.OTEL_EXPORT_ENABLED)
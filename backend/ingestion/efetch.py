@@ -0,0 +1,144 @@
+import re
+import xml.etree.ElementTree as ET
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Union, IO
+from ingestion.eutils import PUBMED_FETCH_URL, eutils_stream
+
+# efetch accepts up to 200 IDs per GET; larger batches must be POSTed
+EFETCH_GET_LIMIT = 200
+
+# Records per efetch request when paging through a search on the history server
+EFETCH_BATCH_SIZE = 200
+
+YEAR_PATTERN = re.compile(r"\b(1[89]|20)\d{2}\b")
+
+
+def _text(el: Optional[ET.Element]) -> str:
+    # itertext keeps inline markup such as <i> or <sup> inside titles and abstracts
+    return "".join(el.itertext()).strip() if el is not None else ""
+
+
+def _abstract(article_el: ET.Element) -> str:
+    """Join every AbstractText section, prefixing labelled sections with their label."""
+    sections = []
+    for section in article_el.iterfind("Abstract/AbstractText"):
+        text = _text(section)
+        if not text:
+            continue
+        label = section.get("Label")
+        sections.append(f"{label}: {text}" if label else text)
+    return " ".join(sections)
+
+
+def _year(article_el: ET.Element) -> str:
+    pub_date = article_el.find("Journal/JournalIssue/PubDate")
+    if pub_date is None:
+        return ""
+    year = pub_date.findtext("Year")
+    if year:
+        return year
+    # e.g. <MedlineDate>1998 Dec-1999 Jan</MedlineDate>
+    match = YEAR_PATTERN.search(pub_date.findtext("MedlineDate") or "")
+    return match.group(0) if match else ""
+
+
+def article_from_element(elem: ET.Element) -> Optional[Dict]:
+    """Extract one PubmedArticle element; returns None when title or abstract is missing."""
+    citation = elem.find("MedlineCitation")
+    if citation is None:
+        return None
+    article_el = citation.find("Article")
+    if article_el is None:
+        return None
+
+    title = _text(article_el.find("ArticleTitle"))
+    abstract = _abstract(article_el)
+    if not title or not abstract:
+        return None
+
+    authors = []
+    for author in article_el.iterfind("AuthorList/Author"):
+        last = author.findtext("LastName")
+        if last:
+            first = author.findtext("ForeName")
+            authors.append(f"{last} {first}" if first else last)
+
+    return {
+        "pmid": citation.findtext("PMID") or "",
+        "title": title,
+        "abstract": abstract,
+        "authors": authors,
+        "year": _year(article_el),
+        "publication_types": [_text(p) for p in article_el.iterfind("PublicationTypeList/PublicationType")],
+    }
+
+
+class EfetchParser:
+    """Incremental efetch XML parser: feed raw bytes, get article dicts back one at a time.
+
+    Each PubmedArticle is cleared from the tree once extracted, so memory stays
+    bounded by the largest single article rather than the whole response.
+    """
+
+    def __init__(self):
+        self._parser = ET.XMLPullParser(events=("start", "end"))
+        self._root: Optional[ET.Element] = None
+
+    def feed(self, chunk: bytes) -> Iterator[Dict]:
+        self._parser.feed(chunk)
+        for event, elem in self._parser.read_events():
+            if event == "start":
+                if self._root is None:
+                    self._root = elem
+                continue
+            if elem.tag != "PubmedArticle":
+                continue
+            try:
+                article = article_from_element(elem)
+            except Exception as e:
+                print(f"Error parsing article: {e}")
+                article = None
+            elem.clear()
+            self._root.remove(elem)
+            if article is not None:
+                yield article
+
+    def close(self) -> None:
+        self._parser.close()
+
+
+def parse_efetch(source: Union[bytes, IO[bytes]], chunk_size: int = 64 * 1024) -> Iterator[Dict]:
+    """Parse an efetch XML document (bytes or binary file) into article dicts."""
+    parser = EfetchParser()
+    if isinstance(source, bytes):
+        yield from parser.feed(source)
+    else:
+        while chunk := source.read(chunk_size):
+            yield from parser.feed(chunk)
+    parser.close()
+
+
+async def _stream_efetch(params: Dict, method: str = "GET") -> AsyncIterator[Dict]:
+    parser = EfetchParser()
+    async for chunk in eutils_stream(PUBMED_FETCH_URL, {**params, "db": "pubmed", "retmode": "xml", "rettype": "abstract"},
+                                     method=method):
+        for article in parser.feed(chunk):
+            yield article
+    parser.close()
+
+
+async def stream_articles(pubmed_ids: List[str]) -> AsyncIterator[Dict]:
+    """Fetch and parse PubMed records, yielding each article as soon as its XML has arrived."""
+    if not pubmed_ids:
+        return
+    method = "GET" if len(pubmed_ids) <= EFETCH_GET_LIMIT else "POST"
+    async for article in _stream_efetch({"id": ",".join(pubmed_ids)}, method=method):
+        yield article
+
+
+async def stream_history_articles(webenv: str, query_key: str, count: int,
+                                  batch_size: int = EFETCH_BATCH_SIZE) -> AsyncIterator[Dict]:
+    """Page through a search stored on the E-utilities history server, ``batch_size`` records per efetch."""
+    for retstart in range(0, count, batch_size):
+        params = {"WebEnv": webenv, "query_key": query_key, "retstart": retstart, "retmax": batch_size}
+        async for article in _stream_efetch(params):
+            yield article
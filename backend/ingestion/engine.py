@@ -0,0 +1,227 @@
+import asyncio
+import json
+import os
+import random
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+from ingestion.eutils import eutils_stats
+from ingestion.pedro import fetch_new_pedro_research, fetch_pedro_research
+from ingestion.pubmed import fetch_new_research, fetch_research
+from rag.vectorstore import store_documents
+
+SOURCES = {
+    "pubmed": fetch_research,
+    "pedro": fetch_pedro_research,
+}
+
+# Fetchers taking (condition, mindate, maxdate) that return only articles added in that window
+INCREMENTAL_SOURCES = {
+    "pubmed": fetch_new_research,
+    "pedro": fetch_new_pedro_research,
+}
+
+# E-utilities date format
+EUTILS_DATE_FORMAT = "%Y/%m/%d"
+# A checkpoint older than this belongs to an earlier run and is discarded
+CHECKPOINT_MAX_AGE = 24 * 3600
+
+
+def load_conditions(path: str) -> Dict[str, List[str]]:
+    """Load the condition lists, keyed by source, from a JSON config file."""
+    with open(path) as f:
+        return json.load(f)
+
+
+class IngestionTask:
+    def __init__(self, source: str, condition: str, max_results: int = 8):
+        self.source = source
+        self.condition = condition
+        self.max_results = max_results
+
+    @property
+    def key(self) -> str:
+        return f"{self.source}::{self.condition}"
+
+
+class IngestionEngine:
+    """Parallel, resumable bulk ingestion.
+
+    A pool of workers fetches conditions concurrently; the shared NCBI limiter in
+    ingestion.eutils paces them instead of fixed sleeps. Fetched articles are
+    buffered and stored ``batch_size`` at a time, so embedding and upserts are
+    batched across conditions. A condition is checkpointed only once its
+    articles are stored, so an interrupted run resumes where it stopped. The
+    checkpoint belongs to one run: it is removed when the run completes, and
+    a run that finishes with failures keeps only the failed conditions, which
+    the next start retries. A checkpoint older than ``CHECKPOINT_MAX_AGE`` is
+    from an earlier run and is ignored.
+
+    With a ``watermark_path`` the run is incremental: each condition's last
+    refresh date is kept in that file, and a condition that has one fetches
+    only articles added to PubMed since then. Conditions without a watermark
+    get a full fetch, which sets their first watermark.
+    """
+
+    def __init__(self, checkpoint_path: str, workers: int = 4, batch_size: int = 100,
+                 max_attempts: int = 3, watermark_path: Optional[str] = None):
+        self.checkpoint_path = checkpoint_path
+        self.watermark_path = watermark_path
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.completed: set = set()
+        self.failed_keys: set = set()
+        self.retry: Optional[set] = None
+        self.watermarks: Dict[str, str] = {}
+        self.run_date = ""
+        self.started_at = 0.0
+        self.buffer: List[Dict] = []
+        self.buffered_tasks: List[str] = []
+        self.stats = {
+            "fetch_seconds": 0.0, "fetched": 0, "ncbi_requests": 0, "failed_tasks": 0, "incremental_tasks": 0,
+            "store_seconds": 0.0, "stored": 0, "skipped": 0, "failed": 0, "embed_calls": 0, "db_calls": 0,
+        }
+        self._store_lock = asyncio.Lock()
+
+    def load_checkpoint(self) -> None:
+        """Resume the run the checkpoint belongs to, unless it is from an earlier run."""
+        if not os.path.exists(self.checkpoint_path):
+            return
+        with open(self.checkpoint_path) as f:
+            checkpoint = json.load(f)
+        if time.time() - checkpoint.get("started_at", 0) > CHECKPOINT_MAX_AGE:
+            print("Ignoring the checkpoint of an earlier run")
+            os.remove(self.checkpoint_path)
+            return
+        # Keep the run's date, so resumed fetches use the same window and watermark
+        self.run_date, self.started_at = checkpoint["run_date"], checkpoint["started_at"]
+        if checkpoint.get("finished"):
+            self.retry = set(checkpoint["failed"])
+            print(f"Retrying {len(self.retry)} conditions that failed in the last run")
+        else:
+            self.completed = set(checkpoint["completed"])
+            print(f"Resuming: {len(self.completed)} conditions already ingested")
+
+    def save_checkpoint(self, finished: bool = False) -> None:
+        checkpoint = {"run_date": self.run_date, "started_at": self.started_at}
+        if finished:
+            checkpoint.update(finished=True, failed=sorted(self.failed_keys))
+        else:
+            checkpoint["completed"] = sorted(self.completed)
+        _write_json(self.checkpoint_path, checkpoint)
+
+    def load_watermarks(self) -> None:
+        if self.watermark_path and os.path.exists(self.watermark_path):
+            with open(self.watermark_path) as f:
+                self.watermarks = json.load(f)
+
+    def save_watermarks(self) -> None:
+        if self.watermark_path:
+            _write_json(self.watermark_path, self.watermarks)
+
+    async def run(self, tasks: List[IngestionTask], resume: bool = True) -> Dict:
+        if resume:
+            self.load_checkpoint()
+        self.load_watermarks()
+        if not self.started_at:
+            self.started_at = time.time()
+            self.run_date = datetime.now(timezone.utc).strftime(EUTILS_DATE_FORMAT)
+        queue: asyncio.Queue = asyncio.Queue()
+        for task in tasks:
+            if task.key in self.retry if self.retry is not None else task.key not in self.completed:
+                queue.put_nowait(task)
+        print(f"Ingesting {queue.qsize()} of {len(tasks)} conditions with {self.workers} workers")
+
+        requests_before = eutils_stats["requests"]
+        started = time.perf_counter()
+        await asyncio.gather(*(self._worker(queue) for _ in range(self.workers)))
+        await self._flush()
+        self.stats["fetch_seconds"] = time.perf_counter() - started - self.stats["store_seconds"]
+        self.stats["ncbi_requests"] = eutils_stats["requests"] - requests_before
+
+        if self.failed_keys:
+            self.save_checkpoint(finished=True)
+        elif os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+        self.print_stats()
+        return self.stats
+
+    async def _worker(self, queue: asyncio.Queue) -> None:
+        while not queue.empty():
+            task = queue.get_nowait()
+            articles = await self._fetch(task)
+            if articles is None:
+                self.stats["failed_tasks"] += 1
+                self.failed_keys.add(task.key)
+                continue
+            self.stats["fetched"] += len(articles)
+            for article in articles:
+                article["query_term"] = task.condition
+            self.buffer.extend(articles)
+            self.buffered_tasks.append(task.key)
+            if len(self.buffer) >= self.batch_size:
+                await self._flush()
+
+    async def _fetch(self, task: IngestionTask) -> Optional[List[Dict]]:
+        """The task's articles, or None once every attempt failed (its watermark then stays put)."""
+        # mindate is inclusive, so the last refresh day is fetched again; store_documents skips the overlap
+        since = self.watermarks.get(task.key) if self.watermark_path else None
+        if since:
+            self.stats["incremental_tasks"] += 1
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                if since:
+                    articles = await INCREMENTAL_SOURCES[task.source](task.condition, since, self.run_date)
+                else:
+                    articles = await SOURCES[task.source](task.condition, max_results=task.max_results)
+                print(f"[{task.source}] {task.condition}: {len(articles)} articles")
+                return articles
+            except Exception as e:
+                delay = 2 ** attempt + random.random()
+                print(f"[{task.source}] {task.condition}: attempt {attempt} failed ({e}); retrying in {delay:.1f}s")
+                if attempt < self.max_attempts:
+                    await asyncio.sleep(delay)
+        return None
+
+    async def _flush(self) -> None:
+        async with self._store_lock:
+            if not self.buffered_tasks:
+                return
+            articles, self.buffer = self.buffer, []
+            task_keys, self.buffered_tasks = self.buffered_tasks, []
+
+            started = time.perf_counter()
+            counts = await store_documents(articles, batch_size=self.batch_size)
+            for key in ("stored", "skipped", "failed", "embed_calls", "db_calls"):
+                self.stats[key] += counts[key]
+            self.stats["store_seconds"] += time.perf_counter() - started
+
+            if counts["failed"]:
+                self.failed_keys.update(task_keys)
+            else:
+                self.completed.update(task_keys)
+                self.save_checkpoint()
+                if self.watermark_path:
+                    self.watermarks.update({key: self.run_date for key in task_keys})
+                    self.save_watermarks()
+
+    def print_stats(self) -> None:
+        s = self.stats
+        fetch_rate = s["fetched"] / s["fetch_seconds"] if s["fetch_seconds"] else 0.0
+        store_rate = (s["stored"] + s["skipped"]) / s["store_seconds"] if s["store_seconds"] else 0.0
+        print(f"Fetch phase: {s['fetched']} articles in {s['fetch_seconds']:.1f}s "
+              f"({fetch_rate:.1f} articles/s, {s['ncbi_requests']} NCBI requests, {s['incremental_tasks']} incremental, "
+              f"{s['failed_tasks']} failed conditions)")
+        print(f"Store phase: {s['stored']} stored, {s['skipped']} skipped, {s['failed']} failed in "
+              f"{s['store_seconds']:.1f}s ({store_rate:.1f} articles/s, {s['embed_calls']} embed calls, "
+              f"{s['db_calls']} DB round-trips)")
+
+
+def _write_json(path: str, data) -> None:
+    """Write JSON atomically so an interrupted run never leaves a truncated file."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp, path)
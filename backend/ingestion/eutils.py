@@ -0,0 +1,45 @@
+from typing import TYPE_CHECKING, AsyncIterator
+from aiolimiter import AsyncLimiter
+from app.core.clients import get_http_client
+from app.core.config import settings
+
+if TYPE_CHECKING:
+    import httpx
+
+PUBMED_SEARCH_URL = f"{settings.NCBI_EUTILS_URL}/esearch.fcgi"
+PUBMED_FETCH_URL = f"{settings.NCBI_EUTILS_URL}/efetch.fcgi"
+
+# NCBI allows 3 requests/second per client, or 10 with an API key. Every
+# E-utilities call in the process goes through this one limiter so that
+# concurrent ingestion jobs cannot exceed the budget together.
+ncbi_limiter = AsyncLimiter(10 if settings.NCBI_API_KEY else 3, 1)
+
+# Running count of E-utilities requests, for throughput reporting
+eutils_stats = {"requests": 0}
+
+
+async def eutils_get(url: str, params: dict, timeout: float = 15) -> "httpx.Response":
+    """Rate-limited GET against an NCBI E-utilities endpoint."""
+    if settings.NCBI_API_KEY:
+        params = {**params, "api_key": settings.NCBI_API_KEY}
+    async with ncbi_limiter:
+        eutils_stats["requests"] += 1
+        response = await get_http_client().get(url, params=params, timeout=timeout)
+    response.raise_for_status()
+    return response
+
+
+async def eutils_stream(url: str, params: dict, method: str = "GET", timeout: float = 60) -> AsyncIterator[bytes]:
+    """Rate-limited E-utilities request whose body is yielded in chunks as it arrives.
+
+    POST sends the parameters as a form body, which efetch requires for long ID lists.
+    """
+    if settings.NCBI_API_KEY:
+        params = {**params, "api_key": settings.NCBI_API_KEY}
+    request_args = {"params": params} if method == "GET" else {"data": params}
+    await ncbi_limiter.acquire()
+    eutils_stats["requests"] += 1
+    async with get_http_client().stream(method, url, timeout=timeout, **request_args) as response:
+        response.raise_for_status()
+        async for chunk in response.aiter_bytes():
+            yield chunk
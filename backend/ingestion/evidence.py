@@ -0,0 +1,134 @@
+import re
+from typing import Dict, Iterable, List, Optional, Sequence
+
+# Strongest first; the same levels as rag.vectorstore.EVIDENCE_LEVEL_PRIORITY.
+# "guideline" only ever comes from publication types, never from the text.
+EVIDENCE_LEVELS = ("systematic_review", "guideline", "rct", "clinical_trial", "observational", "standard")
+_RANK = {level: rank for rank, level in enumerate(EVIDENCE_LEVELS)}
+
+# MEDLINE PublicationType values that settle the level. Indexers assign these
+# from the full text, so they outrank anything found in title or abstract.
+PUBLICATION_TYPE_LEVELS = {
+    "systematic review": "systematic_review",
+    "meta-analysis": "systematic_review",
+    "network meta-analysis": "systematic_review",
+    "practice guideline": "guideline",
+    "guideline": "guideline",
+    "randomized controlled trial": "rct",
+    "clinical trial": "clinical_trial",
+    "controlled clinical trial": "clinical_trial",
+    "pragmatic clinical trial": "clinical_trial",
+    "equivalence trial": "clinical_trial",
+    "adaptive clinical trial": "clinical_trial",
+    "clinical trial, phase i": "clinical_trial",
+    "clinical trial, phase ii": "clinical_trial",
+    "clinical trial, phase iii": "clinical_trial",
+    "clinical trial, phase iv": "clinical_trial",
+    "observational study": "observational",
+    "twin study": "observational",
+    # Not a study with results, whatever the text says about trials or reviews
+    "clinical trial protocol": "standard",
+    "case reports": "standard",
+    "editorial": "standard",
+    "comment": "standard",
+    "letter": "standard",
+}
+
+# Abstract sections describing prior work rather than this study
+BACKGROUND_SECTIONS = ("BACKGROUND", "INTRODUCTION", "CONTEXT", "RATIONALE")
+
+# Every keyword in one alternation over the lower-cased text, so a document is
+# scanned once. Each alternative starts with a literal, which lets the regex
+# engine skip ahead to candidate characters, and ends in an empty named group
+# whose name gives the level it stands for.
+DESIGN_PATTERNS = [
+    ("systematic_review", r"systematic\s+(?:literature\s+)?reviews?"),
+    ("systematic_review", r"meta-?\s?analy[sz][ei]s"),
+    ("systematic_review", r"cochrane"),
+    ("rct", r"randomi[sz]ed\s+(?:(?:placebo-)?controlled\s+|clinical\s+)?trials?"),
+    ("rct", r"rcts?"),
+    ("clinical_trial", r"clinical\s+trials?"),
+    ("clinical_trial", r"controlled\s+trials?"),
+    ("observational", r"cohort\s+stud(?:y|ies)"),
+    ("observational", r"case[-\s]control"),
+    ("observational", r"observational"),
+    ("observational", r"cross-sectional\s+stud(?:y|ies)"),
+]
+EVIDENCE_PATTERN = re.compile(
+    "|".join(rf"{pattern}\b(?P<{level}_{i}>)" for i, (level, pattern) in enumerate(DESIGN_PATTERNS))
+)
+_GROUP_RANKS = {f"{level}_{i}": _RANK[level] for i, (level, _) in enumerate(DESIGN_PATTERNS)}
+
+# Checked only where a keyword was found, ending at its start
+MENTION_BEFORE = re.compile(r"\b(?:previous|prior|earlier|existing|several|many|few|no)\s+\Z")
+# A section label such as "BACKGROUND", ending at a colon
+LABEL_BEFORE = re.compile(r"(?:^|(?<=\s))([A-Z][A-Z ,&/-]{2,40})\Z")
+
+_ASCII_LOWER = str.maketrans("ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz")
+
+
+def in_background(text: str, position: int) -> bool:
+    """Whether ``position`` falls in a background section, going by the nearest section label before it."""
+    colon = text.rfind(":", 0, position)
+    while colon != -1:
+        if text[colon + 1].isspace():
+            label = LABEL_BEFORE.search(text, max(0, colon - 41), colon)
+            if label:
+                return label.group(1).startswith(BACKGROUND_SECTIONS)
+        colon = text.rfind(":", 0, colon)
+    return False
+
+
+def level_from_publication_types(publication_types: Optional[Sequence[str]]) -> Optional[str]:
+    """The strongest level the MEDLINE publication types settle, or None if none of them does."""
+    best = None
+    for publication_type in publication_types or ():
+        level = PUBLICATION_TYPE_LEVELS.get(publication_type.strip().lower())
+        if level is not None and (best is None or _RANK[level] < _RANK[best]):
+            best = level
+    return best
+
+
+def level_from_text(title: str, abstract: str) -> str:
+    """The strongest study design named in the title or abstract.
+
+    Keywords must start and end on word boundaries, and are skipped inside
+    background sections and after words like "previous" that point at other
+    studies.
+    """
+    text = f"{title}\n{abstract}"
+    lowered = text.lower()
+    if len(lowered) != len(text):  # a few non-ASCII characters lower-case to two
+        lowered = text.translate(_ASCII_LOWER)
+    best = len(EVIDENCE_LEVELS) - 1
+    for match in EVIDENCE_PATTERN.finditer(lowered):
+        rank = _GROUP_RANKS[match.lastgroup]
+        if rank >= best:
+            continue
+        start = match.start()
+        if (start and lowered[start - 1].isalnum()
+                or MENTION_BEFORE.search(lowered, max(0, start - 12), start)
+                or in_background(text, start)):
+            continue
+        best = rank
+        if best == 0:
+            break
+    return EVIDENCE_LEVELS[best]
+
+
+def classify_evidence_level(title: str, abstract: str, publication_types: Optional[Sequence[str]] = None) -> str:
+    """Classify an article's evidence level, preferring its PubMed publication types.
+
+    Recently added citations are not yet indexed and carry only generic types
+    such as "Journal Article"; those fall back to the title and abstract.
+    """
+    return level_from_publication_types(publication_types) or level_from_text(title, abstract)
+
+
+def classify_evidence_levels(articles: Iterable[Dict]) -> List[str]:
+    """Classify many articles (``title``, ``abstract`` and optional ``publication_types`` keys) in order."""
+    return [
+        level_from_publication_types(article.get("publication_types"))
+        or level_from_text(article.get("title") or "", article.get("abstract") or "")
+        for article in articles
+    ]
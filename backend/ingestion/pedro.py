@@ -1,133 +1,105 @@
-import requests
-import xml.etree.ElementTree as ET
 from typing import List, Dict
-import time
+from ingestion.eutils import PUBMED_SEARCH_URL, eutils_get
+from ingestion.efetch import stream_articles, stream_history_articles
+from ingestion.evidence import classify_evidence_level
+from ingestion.pubmed import search_pubmed_since
 
 # PEDro doesn't have a public API, so we use PubMed with filters
 # that target the same high-quality study types PEDro indexes:
 # RCTs, systematic reviews, and clinical practice guidelines in physiotherapy
 
-PUBMED_SEARCH_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esearch.fcgi"
-PUBMED_FETCH_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/efetch.fcgi"
+# Prefix that distinguishes high-quality results from standard PubMed rows
+HQ_PMID_PREFIX = "hq_"
 
 
-def classify_evidence_level(title: str, abstract: str) -> str:
-    """Classify evidence level based on study type keywords."""
-    text = (title + " " + abstract).lower()
-    if any(k in text for k in ["systematic review", "meta-analysis", "cochrane"]):
-        return "systematic_review"
-    elif any(k in text for k in ["randomized controlled", "randomised controlled", "rct", "randomized trial"]):
-        return "rct"
-    elif any(k in text for k in ["clinical trial", "controlled trial"]):
-        return "clinical_trial"
-    elif any(k in text for k in ["cohort study", "case control", "observational"]):
-        return "observational"
-    else:
-        return "standard"
+def base_pmid(pmid: str) -> str:
+    """Return the real PubMed ID, without the high-quality prefix."""
+    return pmid[len(HQ_PMID_PREFIX):] if pmid.startswith(HQ_PMID_PREFIX) else pmid
 
 
-def search_high_quality_pubmed(query: str, max_results: int = 10) -> List[str]:
-    """Search PubMed filtered to RCTs and systematic reviews only."""
-    # Filter to only return systematic reviews and RCTs in physiotherapy
-    filtered_query = (
+def pmid_variants(pmid: str) -> List[str]:
+    """Both forms a PubMed article can be stored under: plain and high-quality."""
+    pmid = base_pmid(pmid)
+    return [pmid, HQ_PMID_PREFIX + pmid]
+
+
+def dedupe_articles(articles: List[Dict]) -> List[Dict]:
+    """Drop repeats of the same PubMed article, keeping the first occurrence."""
+    seen = set()
+    unique = []
+    for article in articles:
+        pmid = base_pmid(article["pmid"])
+        if pmid not in seen:
+            seen.add(pmid)
+            unique.append(article)
+    return unique
+
+
+def high_quality_query(query: str) -> str:
+    """Restrict a PubMed query to systematic reviews and RCTs in physiotherapy."""
+    return (
         f"({query}) AND "
         f"(physical therapy[MeSH] OR physiotherapy[tiab] OR rehabilitation[MeSH]) AND "
         f"(systematic review[pt] OR randomized controlled trial[pt] OR "
         f"meta-analysis[pt] OR clinical practice guideline[pt])"
     )
 
+
+async def search_high_quality_pubmed(query: str, max_results: int = 10) -> List[str]:
+    """Search PubMed filtered to RCTs and systematic reviews only."""
     params = {
         "db": "pubmed",
-        "term": filtered_query,
+        "term": high_quality_query(query),
         "retmax": max_results,
         "retmode": "json",
         "sort": "relevance",
     }
 
-    response = requests.get(PUBMED_SEARCH_URL, params=params, timeout=15)
-    response.raise_for_status()
+    response = await eutils_get(PUBMED_SEARCH_URL, params)
     data = response.json()
     ids = data["esearchresult"]["idlist"]
     print(f"Found {len(ids)} high-quality articles for: {query}")
     return ids
 
 
-def fetch_abstracts(pubmed_ids: List[str]) -> List[Dict]:
+def _high_quality_article(article: Dict) -> Dict:
+    pmid = article["pmid"]
+    return {
+        **article,
+        "pmid": f"{HQ_PMID_PREFIX}{pmid}",  # prefix to distinguish from standard pubmed
+        "url": f"https://pubmed.ncbi.nlm.nih.gov/{pmid}/" if pmid else "",
+        "source": "PubMed (High Quality)",
+        "evidence_level": classify_evidence_level(article["title"], article["abstract"],
+                                                  article.get("publication_types")),
+    }
+
+
+async def fetch_abstracts(pubmed_ids: List[str]) -> List[Dict]:
     """Fetch article abstracts from PubMed."""
-    if not pubmed_ids:
-        return []
+    return [_high_quality_article(article) async for article in stream_articles(pubmed_ids)]
 
-    params = {
-        "db": "pubmed",
-        "id": ",".join(pubmed_ids),
-        "retmode": "xml",
-        "rettype": "abstract",
-    }
 
-    response = requests.get(PUBMED_FETCH_URL, params=params, timeout=15)
-    response.raise_for_status()
-
-    root = ET.fromstring(response.content)
-    articles = []
-
-    for article in root.findall(".//PubmedArticle"):
-        try:
-            title_el = article.find(".//ArticleTitle")
-            title = title_el.text if title_el is not None else ""
-
-            abstract_el = article.find(".//AbstractText")
-            abstract = abstract_el.text if abstract_el is not None else ""
-
-            if not title or not abstract:
-                continue
-
-            authors = []
-            for author in article.findall(".//Author"):
-                last = author.find("LastName")
-                first = author.find("ForeName")
-                if last is not None:
-                    name = last.text
-                    if first is not None:
-                        name += f" {first.text}"
-                    authors.append(name)
-
-            year_el = article.find(".//PubDate/Year")
-            year = year_el.text if year_el is not None else ""
-
-            pmid_el = article.find(".//PMID")
-            pmid = pmid_el.text if pmid_el is not None else ""
-            url = f"https://pubmed.ncbi.nlm.nih.gov/{pmid}/" if pmid else ""
-
-            evidence_level = classify_evidence_level(title, abstract)
-
-            articles.append({
-                "pmid": f"hq_{pmid}",  # prefix to distinguish from standard pubmed
-                "title": title,
-                "abstract": abstract,
-                "authors": authors,
-                "year": year,
-                "url": url,
-                "source": "PubMed (High Quality)",
-                "evidence_level": evidence_level,
-            })
-        except Exception as e:
-            print(f"Error parsing article: {e}")
-            continue
+async def fetch_pedro_research(query: str, max_results: int = 10) -> List[Dict]:
+    """Fetch high-quality PT research (RCTs + systematic reviews) via PubMed filters.
 
+    Errors propagate, so callers can retry rather than record an empty result.
+    """
+    print(f"Searching for high-quality PT research: {query}")
+    ids = await search_high_quality_pubmed(query, max_results)
+    if not ids:
+        return []
+    articles = await fetch_abstracts(ids)
+    print(f"Fetched {len(articles)} high-quality articles")
     return articles
 
 
-def fetch_pedro_research(query: str, max_results: int = 10) -> List[Dict]:
-    """Fetch high-quality PT research (RCTs + systematic reviews) via PubMed filters."""
-    print(f"Searching for high-quality PT research: {query}")
-    try:
-        ids = search_high_quality_pubmed(query, max_results)
-        if not ids:
-            return []
-        time.sleep(0.5)
-        articles = fetch_abstracts(ids)
-        print(f"Fetched {len(articles)} high-quality articles")
-        return articles
-    except Exception as e:
-        print(f"High-quality search error: {e}")
+async def fetch_new_pedro_research(query: str, mindate: str, maxdate: str) -> List[Dict]:
+    """Fetch every high-quality PT article for a query added between mindate and maxdate."""
+    search = await search_pubmed_since(high_quality_query(query), mindate, maxdate)
+    print(f"Found {search['count']} new high-quality articles for: {query} (since {mindate})")
+    if not search["count"]:
         return []
+    return [
+        _high_quality_article(article)
+        async for article in stream_history_articles(search["webenv"], search["query_key"], search["count"])
+    ]
@@ -1,29 +1,10 @@
-import requests
-import xml.etree.ElementTree as ET
 from typing import List, Dict
-import time
+from ingestion.eutils import PUBMED_SEARCH_URL, eutils_get
+from ingestion.efetch import stream_articles, stream_history_articles
+from ingestion.evidence import classify_evidence_level
 
-PUBMED_SEARCH_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esearch.fcgi"
-PUBMED_FETCH_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/efetch.fcgi"
 
-
-def classify_evidence_level(title: str, abstract: str) -> str:
-    """Classify evidence level based on study type keywords."""
-    text = (title + " " + abstract).lower()
-
-    if any(k in text for k in ["systematic review", "meta-analysis", "cochrane"]):
-        return "systematic_review"
-    elif any(k in text for k in ["randomized controlled", "randomised controlled", "rct", "randomized trial"]):
-        return "rct"
-    elif any(k in text for k in ["clinical trial", "controlled trial"]):
-        return "clinical_trial"
-    elif any(k in text for k in ["cohort study", "case control", "observational"]):
-        return "observational"
-    else:
-        return "standard"
-
-
-def search_pubmed(query: str, max_results: int = 8) -> List[str]:
+async def search_pubmed(query: str, max_results: int = 8) -> List[str]:
     """Search PubMed and return list of PMIDs."""
     params = {
         "db": "pubmed",
@@ -32,83 +13,68 @@ def search_pubmed(query: str, max_results: int = 8) -> List[str]:
         "retmode": "json",
         "sort": "relevance",
     }
-    response = requests.get(PUBMED_SEARCH_URL, params=params, timeout=15)
-    response.raise_for_status()
+    response = await eutils_get(PUBMED_SEARCH_URL, params)
     data = response.json()
     return data["esearchresult"]["idlist"]
 
 
-def fetch_abstracts(pubmed_ids: List[str]) -> List[Dict]:
-    """Fetch article abstracts from PubMed."""
-    if not pubmed_ids:
-        return []
+async def search_pubmed_since(query: str, mindate: str, maxdate: str) -> Dict:
+    """Search PubMed for articles added between two Entrez dates (YYYY/MM/DD, inclusive).
 
+    The result set is left on the E-utilities history server rather than returned
+    as IDs; the returned dict carries its ``webenv``, ``query_key`` and ``count``
+    for paging with ``stream_history_articles``.
+    """
     params = {
         "db": "pubmed",
-        "id": ",".join(pubmed_ids),
-        "retmode": "xml",
-        "rettype": "abstract",
+        "term": query,
+        "datetype": "edat",
+        "mindate": mindate,
+        "maxdate": maxdate,
+        "usehistory": "y",
+        "retmax": 0,
+        "retmode": "json",
+    }
+    response = await eutils_get(PUBMED_SEARCH_URL, params)
+    data = response.json()["esearchresult"]
+    return {"webenv": data["webenv"], "query_key": data["querykey"], "count": int(data["count"])}
+
+
+def _pubmed_article(article: Dict) -> Dict:
+    pmid = article["pmid"]
+    return {
+        **article,
+        "url": f"https://pubmed.ncbi.nlm.nih.gov/{pmid}/" if pmid else "",
+        "source": "PubMed",
+        "evidence_level": classify_evidence_level(article["title"], article["abstract"],
+                                                  article.get("publication_types")),
     }
-    response = requests.get(PUBMED_FETCH_URL, params=params, timeout=15)
-    response.raise_for_status()
-
-    root = ET.fromstring(response.content)
-    articles = []
-
-    for article in root.findall(".//PubmedArticle"):
-        try:
-            title_el = article.find(".//ArticleTitle")
-            title = title_el.text if title_el is not None else ""
-
-            abstract_el = article.find(".//AbstractText")
-            abstract = abstract_el.text if abstract_el is not None else ""
-
-            if not title or not abstract:
-                continue
-
-            authors = []
-            for author in article.findall(".//Author"):
-                last = author.find("LastName")
-                first = author.find("ForeName")
-                if last is not None:
-                    name = last.text
-                    if first is not None:
-                        name += f" {first.text}"
-                    authors.append(name)
-
-            year_el = article.find(".//PubDate/Year")
-            year = year_el.text if year_el is not None else ""
-
-            pmid_el = article.find(".//PMID")
-            pmid = pmid_el.text if pmid_el is not None else ""
-            url = f"https://pubmed.ncbi.nlm.nih.gov/{pmid}/" if pmid else ""
-
-            evidence_level = classify_evidence_level(title, abstract)
 
-            articles.append({
-                "pmid": pmid,
-                "title": title,
-                "abstract": abstract,
-                "authors": authors,
-                "year": year,
-                "url": url,
-                "source": "PubMed",
-                "evidence_level": evidence_level,
-            })
-        except Exception as e:
-            print(f"Error parsing article: {e}")
-            continue
 
+async def fetch_abstracts(pubmed_ids: List[str]) -> List[Dict]:
+    """Fetch article abstracts from PubMed."""
+    articles = [_pubmed_article(article) async for article in stream_articles(pubmed_ids)]
     print(f"Fetched {len(articles)} abstracts")
     return articles
 
 
-def fetch_research(query: str, max_results: int = 8) -> List[Dict]:
+async def fetch_research(query: str, max_results: int = 8) -> List[Dict]:
     """Main function to fetch PubMed research."""
     print(f"Searching PubMed for: {query}")
-    pubmed_ids = search_pubmed(query, max_results)
+    pubmed_ids = await search_pubmed(query, max_results)
     print(f"Found {len(pubmed_ids)} articles")
     if not pubmed_ids:
         return []
-    time.sleep(0.5)
-    return fetch_abstracts(pubmed_ids)
+    return await fetch_abstracts(pubmed_ids)
+
+
+async def fetch_new_research(query: str, mindate: str, maxdate: str) -> List[Dict]:
+    """Fetch every PubMed article for a query added between mindate and maxdate."""
+    search = await search_pubmed_since(query, mindate, maxdate)
+    print(f"Found {search['count']} new articles for: {query} (since {mindate})")
+    if not search["count"]:
+        return []
+    return [
+        _pubmed_article(article)
+        async for article in stream_history_articles(search["webenv"], search["query_key"], search["count"])
+    ]
@@ -1,20 +1,78 @@
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
-from app.api.analyze import router as analyze_router
+from app.core.startup import startup_profile
 
-app = FastAPI(
-    title="promPT",
-    description="AI-powered Physical Therapy Clinical Decision Support System",
-    version="0.1.0",
-)
+with startup_profile.phase("import fastapi"):
+    import asyncio
+    from contextlib import asynccontextmanager
+    from fastapi import FastAPI
+    from fastapi.middleware.cors import CORSMiddleware
+with startup_profile.phase("import settings"):
+    from app.core.config import settings
+    from app.core.clients import close_clients, preload_client_modules
+with startup_profile.phase("import api and rag pipeline"):
+    from app.api.analyze import router as analyze_router
+    from app.api.metrics import router as metrics_router
+    from rag.batch import batch_analyzer
+    from rag.embeddings import query_cache
+    from rag.ingest_queue import ingestion_queue
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["http://localhost:3000", "https://prompt-frontend-ten.vercel.app"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+
+async def warm_up() -> None:
+    if settings.PRELOAD_CLIENTS:
+        await asyncio.to_thread(preload_client_modules)
+    startup_profile.print_report()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    indexes = []
+    if settings.LOCAL_INDEX_ENABLED:
+        from rag.local_index import local_index
+        # Searches use the RPC until the local index snapshot is ready; a stale
+        # snapshot is retaken in the background by the search that finds it
+        local_index.start_refresh()
+        indexes.append(local_index)
+    if settings.LEXICAL_INDEX_ENABLED:
+        from rag.lexical_index import lexical_index
+        # Searches are vector-only until the lexical index is built
+        lexical_index.start_refresh()
+        indexes.append(lexical_index)
+    if settings.WARM_PLANS_ENABLED:
+        from rag.warm_plans import warm_plans
+        # Requests run the live pipeline until the plans are loaded from Supabase
+        warm_plans.start_refresh()
+        indexes.append(warm_plans)
+    warm_up_task = asyncio.create_task(warm_up())
+    # Batch jobs a stopped machine left unfinished, e.g. a Message Batch still being processed
+    resume_task = asyncio.create_task(batch_analyzer.resume())
+    yield
+    for index in indexes:
+        if index.refreshing:
+            index.refreshing.cancel()
+    warm_up_task.cancel()
+    resume_task.cancel()
+    await batch_analyzer.shutdown()
+    await ingestion_queue.shutdown()
+    await query_cache.flush()
+    if settings.WARM_PLANS_ENABLED:
+        await warm_plans.flush()
+    await close_clients()
+
+
+with startup_profile.phase("create app"):
+    app = FastAPI(
+        title="promPT",
+        description="AI-powered Physical Therapy Clinical Decision Support System",
+        version="0.1.0",
+        lifespan=lifespan,
+    )
+
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["http://localhost:3000", "https://prompt-frontend-ten.vercel.app"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
 
 
 @app.get("/api/v1/health")
@@ -23,3 +81,4 @@ async def health_check():
 
 
 app.include_router(analyze_router, prefix="/api/v1")
+app.include_router(metrics_router, prefix="/api/v1")
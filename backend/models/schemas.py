@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import List, Literal, Optional
 from enum import Enum
 
 
@@ -61,3 +61,38 @@ class TreatmentPlanOutput(BaseModel):
     contraindications: List[str]
     recovery_timeline: str
     citations: List[Citation]
+    provisional: bool = Field(
+        default=False,
+        description="True when new research was still being ingested and the plan used existing evidence only",
+    )
+
+
+class BatchAnalyzeRequest(BaseModel):
+    inputs: List[PTInput] = Field(..., min_length=1, description="Patient assessments to analyze")
+    mode: Literal["concurrent", "message_batches"] = Field(
+        default="concurrent",
+        description="concurrent: generate now, BATCH_CONCURRENCY at a time; "
+                    "message_batches: submit to the Anthropic Message Batches API (half price, finishes within 24h)",
+    )
+    ingest: Optional[Literal["wait", "provisional"]] = None
+
+
+class BatchItemResult(BaseModel):
+    index: int
+    status: Literal["pending", "completed", "failed"] = "pending"
+    plan: Optional[TreatmentPlanOutput] = None
+    error: Optional[str] = None
+
+
+class BatchJobStatus(BaseModel):
+    job_id: str
+    status: Literal["queued", "retrieving", "generating", "completed", "failed"]
+    mode: str
+    total: int
+    completed: int
+    failed: int
+    unique_queries: int
+    created_at: float
+    finished_at: Optional[float] = None
+    error: Optional[str] = None
+    results: List[BatchItemResult]
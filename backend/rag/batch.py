@@ -0,0 +1,381 @@
+import asyncio
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+from app.core.clients import get_anthropic_client, get_supabase
+from app.core.config import settings
+from app.core.tracing import tracer
+from models.schemas import BatchItemResult, BatchJobStatus, PTInput, TreatmentPlanOutput
+from rag.embeddings import embed_queries
+from rag.pipeline import build_prompt, build_query, ensure_evidence, generate_plan, plan_from_message
+from rag.response_cache import response_cache
+from rag.routing import model_router
+from rag.usage import prompt_usage
+from rag.vectorstore import Retrieval
+
+# (retrieval, provisional, indices of the inputs that share its query)
+QueryGroup = Tuple[Retrieval, bool, List[int]]
+
+
+class BatchJob:
+    """One submitted batch: its inputs, per-input results and progress.
+
+    ``message_batch`` holds what collecting a submitted Message Batch needs
+    after a restart: its id, when it was submitted, each request's query,
+    tier and provisional flag, and the evidence per query.
+    """
+
+    def __init__(self, inputs: List[PTInput], mode: str, ingest_policy: Optional[str]):
+        self.id = uuid.uuid4().hex
+        self.inputs = inputs
+        self.mode = mode
+        self.ingest_policy = ingest_policy
+        self.status = "queued"
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.updated_at = self.created_at
+        self.owner: Optional[str] = None
+        self.unique_queries = 0
+        self.results = [BatchItemResult(index=i) for i in range(len(inputs))]
+        self.message_batch: Optional[Dict] = None
+        self.task: Optional[asyncio.Task] = None
+
+    def complete(self, index: int, plan: TreatmentPlanOutput) -> None:
+        self.results[index] = BatchItemResult(index=index, status="completed", plan=plan)
+
+    def fail(self, index: int, error: str) -> None:
+        self.results[index] = BatchItemResult(index=index, status="failed", error=error)
+
+    def snapshot(self) -> BatchJobStatus:
+        return BatchJobStatus(
+            job_id=self.id,
+            status=self.status,
+            mode=self.mode,
+            total=len(self.results),
+            completed=sum(r.status == "completed" for r in self.results),
+            failed=sum(r.status == "failed" for r in self.results),
+            unique_queries=self.unique_queries,
+            created_at=self.created_at,
+            finished_at=self.finished_at,
+            error=self.error,
+            results=list(self.results),
+        )
+
+    def to_row(self) -> Dict:
+        return {
+            "id": self.id, "mode": self.mode, "ingest_policy": self.ingest_policy, "status": self.status,
+            "error": self.error, "unique_queries": self.unique_queries, "created_at": self.created_at,
+            "finished_at": self.finished_at, "updated_at": self.updated_at, "owner": self.owner,
+            "inputs": [i.model_dump(mode="json") for i in self.inputs],
+            "results": [r.model_dump(mode="json") for r in self.results],
+            "message_batch": self.message_batch,
+        }
+
+    @classmethod
+    def from_row(cls, row: Dict) -> "BatchJob":
+        job = cls([PTInput(**i) for i in row["inputs"]], row["mode"], row["ingest_policy"])
+        for name in ("id", "status", "error", "unique_queries", "created_at", "finished_at", "updated_at",
+                     "owner", "message_batch"):
+            setattr(job, name, row[name])
+        job.results = [BatchItemResult(**r) for r in row["results"]]
+        return job
+
+
+class BatchAnalyzer:
+    """Batch analysis jobs, polled by id, kept in the batch_jobs table.
+
+    A job embeds the distinct retrieval queries of all its inputs in one
+    Voyage request and runs one vector search per distinct query. Inputs
+    sharing a query share its evidence: the first plan generated for it
+    writes the evidence block to the prompt cache and the rest read it.
+    Generation runs BATCH_CONCURRENCY at a time, or as one Anthropic Message
+    Batch. Job state is written to Supabase as it changes, by one background
+    writer, so any machine can answer a poll; jobs a stopped process left
+    unfinished are resumed at startup or when polled. Finished jobs are kept
+    for BATCH_JOB_TTL seconds.
+    """
+
+    def __init__(self, concurrency: int = 8, job_ttl: float = 24 * 3600, lease: float = 600):
+        self.concurrency = concurrency
+        self.job_ttl = job_ttl
+        self.lease = lease
+        # Marks the jobs this process runs in batch_jobs.owner
+        self.instance = uuid.uuid4().hex
+        self.jobs: Dict[str, BatchJob] = {}
+        self.resumed = 0
+        self._dirty: Dict[str, BatchJob] = {}
+        self._flushing: Optional[asyncio.Task] = None
+
+    async def submit(self, inputs: List[PTInput], mode: str = "concurrent",
+                     ingest_policy: Optional[str] = None) -> BatchJob:
+        self._evict()
+        job = BatchJob(inputs, mode, ingest_policy)
+        job.owner = self.instance
+        # Written before the job id is returned, so a poll on another machine finds it
+        self.persist(job)
+        await self.flush()
+        self._start(job)
+        return job
+
+    async def get(self, job_id: str) -> Optional[BatchJob]:
+        """The job from memory, or from batch_jobs if another process ran it, resuming it if that process stopped."""
+        job = self.jobs.get(job_id)
+        if job is not None:
+            return job
+        try:
+            result = await get_supabase().table("batch_jobs").select("*").eq("id", job_id).execute()
+        except Exception as e:
+            print(f"Could not read batch job {job_id}: {e}")
+            return None
+        if not result.data:
+            return None
+        job = BatchJob.from_row(result.data[0])
+        if job.finished_at is not None and job.finished_at < time.time() - self.job_ttl:
+            return None
+        if self._orphaned(job) and await self._claim(job):
+            self._start(job)
+        return job
+
+    def _start(self, job: BatchJob) -> None:
+        self.jobs[job.id] = job
+        job.task = asyncio.create_task(self._run(job))
+
+    def _evict(self) -> None:
+        cutoff = time.time() - self.job_ttl
+        for job_id, job in list(self.jobs.items()):
+            if job.finished_at is not None and job.finished_at < cutoff:
+                del self.jobs[job_id]
+
+    def _orphaned(self, job: BatchJob) -> bool:
+        """Unfinished, and released at shutdown or not written by its owner for ``lease`` seconds."""
+        return job.finished_at is None and (job.owner is None or job.updated_at < time.time() - self.lease)
+
+    async def _claim(self, job: BatchJob) -> bool:
+        """Take over an orphaned job, unless another process claimed or wrote it since it was read."""
+        updated_at = time.time()
+        try:
+            result = await get_supabase().table("batch_jobs").update(
+                {"owner": self.instance, "updated_at": updated_at}
+            ).eq("id", job.id).eq("updated_at", job.updated_at).execute()
+        except Exception as e:
+            print(f"Could not claim batch job {job.id}: {e}")
+            return False
+        if not result.data:
+            return False
+        job.owner, job.updated_at = self.instance, updated_at
+        self.resumed += 1
+        print(f"Resuming batch job {job.id} ({job.status}, "
+              f"{sum(r.status == 'pending' for r in job.results)} inputs pending)")
+        return True
+
+    async def resume(self) -> int:
+        """Resume every orphaned job in batch_jobs and drop expired ones; returns how many were resumed."""
+        try:
+            result = await get_supabase().table("batch_jobs").select("*").is_("finished_at", "null").execute()
+            await get_supabase().table("batch_jobs").delete().lt(
+                "finished_at", time.time() - self.job_ttl
+            ).execute()
+        except Exception as e:
+            print(f"Could not read unfinished batch jobs: {e}")
+            return 0
+        resumed = 0
+        for row in result.data:
+            job = BatchJob.from_row(row)
+            if job.id not in self.jobs and self._orphaned(job) and await self._claim(job):
+                self._start(job)
+                resumed += 1
+        return resumed
+
+    def persist(self, job: BatchJob) -> None:
+        """Queue the job's current state for the background writer."""
+        job.updated_at = time.time()
+        self._dirty[job.id] = job
+        if self._flushing is None or self._flushing.done():
+            self._flushing = asyncio.get_running_loop().create_task(self._write())
+
+    async def flush(self) -> None:
+        """Wait until every queued job state is written."""
+        if self._flushing is not None:
+            await self._flushing
+
+    async def _write(self) -> None:
+        from postgrest import ReturnMethod
+
+        while self._dirty:
+            jobs, self._dirty = list(self._dirty.values()), {}
+            try:
+                await get_supabase().table("batch_jobs").upsert(
+                    [job.to_row() for job in jobs], on_conflict="id", returning=ReturnMethod.minimal
+                ).execute()
+            except Exception as e:
+                print(f"Could not save {len(jobs)} batch jobs, their state is in this process only: {e}")
+
+    async def _run(self, job: BatchJob) -> None:
+        with tracer.trace("analyze_batch"):
+            try:
+                if job.message_batch is not None:
+                    # Resumed after its Message Batch was submitted: only the results are left to collect
+                    job.status = "generating"
+                    await self._collect_message_batch(job)
+                else:
+                    job.status = "retrieving"
+                    self.persist(job)
+                    groups = await self._retrieve(job)
+                    job.status = "generating"
+                    self.persist(job)
+                    if job.mode == "message_batches":
+                        await self._generate_message_batch(job, groups)
+                    else:
+                        await self._generate_concurrently(job, groups)
+                job.status = "completed"
+            except Exception as e:
+                print(f"Batch job {job.id} failed: {e}")
+                job.status = "failed"
+                job.error = str(e)
+                for result in job.results:
+                    if result.status == "pending":
+                        job.fail(result.index, "Batch job failed before this input was generated")
+            # Not reached when cancelled at shutdown, which leaves the job to be resumed
+            job.finished_at = time.time()
+            self.persist(job)
+
+    async def _retrieve(self, job: BatchJob) -> List[QueryGroup]:
+        """Embed the distinct queries of the pending inputs together, then search and check sufficiency once per query."""
+        indices: Dict[str, List[int]] = {}
+        with tracer.span("query_build", size=len(job.inputs)):
+            for i, pt_input in enumerate(job.inputs):
+                if job.results[i].status == "pending":
+                    indices.setdefault(build_query(pt_input), []).append(i)
+        job.unique_queries = len(indices)
+        print(f"Batch job {job.id}: {len(job.inputs)} inputs, {len(indices)} distinct queries")
+
+        queries = list(indices)
+        with tracer.span("embed", size=len(queries)):
+            embeddings = await embed_queries(queries)
+        retrievals = []
+        for query, embedding in zip(queries, embeddings):
+            retrieval = Retrieval(query, match_count=5)
+            retrieval.embedding = embedding
+            retrievals.append(retrieval)
+
+        provisional = await asyncio.gather(*(
+            ensure_evidence(retrieval, job.inputs[indices[retrieval.query][0]].diagnosis, job.ingest_policy)
+            for retrieval in retrievals
+        ))
+        return [(r, p, indices[r.query]) for r, p in zip(retrievals, provisional)]
+
+    async def _generate_concurrently(self, job: BatchJob, groups: List[QueryGroup]) -> None:
+        slots = asyncio.Semaphore(self.concurrency)
+
+        async def generate_one(index: int, retrieval: Retrieval, provisional: bool) -> None:
+            async with slots:
+                try:
+                    job.complete(index, await generate_plan(job.inputs[index], retrieval, provisional))
+                except Exception as e:
+                    job.fail(index, str(e))
+                self.persist(job)
+
+        async def generate_group(retrieval: Retrieval, provisional: bool, indices: List[int]) -> None:
+            # The first plan writes the shared evidence to the prompt cache for the rest
+            await generate_one(indices[0], retrieval, provisional)
+            await asyncio.gather(*(generate_one(i, retrieval, provisional) for i in indices[1:]))
+
+        await asyncio.gather(*(generate_group(*group) for group in groups))
+
+    async def _generate_message_batch(self, job: BatchJob, groups: List[QueryGroup]) -> None:
+        """Submit every uncached plan as one Message Batch, record it on the job, and collect it."""
+        requests, pending, evidence, embeddings = [], {}, {}, {}
+        for retrieval, provisional, indices in groups:
+            for index in indices:
+                pt_input = job.inputs[index]
+                if not provisional:
+                    cached = response_cache.get(pt_input, retrieval.results, retrieval.embedding)
+                    if cached is not None:
+                        job.complete(index, cached)
+                        continue
+                prompt = build_prompt(pt_input, retrieval.results)
+                tier = model_router.route(pt_input, retrieval.results, provisional).tier
+                pending[str(index)] = {"query": retrieval.query, "provisional": provisional, "tier": tier.name}
+                evidence[retrieval.query] = [
+                    {k: v for k, v in doc.items() if not k.startswith("embedding")} for doc in retrieval.results
+                ]
+                embeddings[retrieval.query] = retrieval.embedding
+                requests.append({
+                    "custom_id": str(index),
+                    "params": {"model": tier.model, "max_tokens": tier.max_tokens, **prompt},
+                })
+        if not requests:
+            return
+
+        batch = await get_anthropic_client().messages.batches.create(requests=requests)
+        print(f"Batch job {job.id}: submitted Message Batch {batch.id} with {len(requests)} requests")
+        job.message_batch = {"id": batch.id, "submitted_at": time.time(), "requests": pending, "evidence": evidence}
+        self.persist(job)
+        await self._collect_message_batch(job, embeddings)
+
+    async def _collect_message_batch(self, job: BatchJob,
+                                     embeddings: Optional[Dict[str, List[float]]] = None) -> None:
+        """Poll the job's Message Batch until it ends, then complete each input from its result.
+
+        ``embeddings`` are the query embeddings for the response cache; a
+        resumed job embeds its queries again, from the query cache if it can.
+        """
+        state = job.message_batch
+        if embeddings is None:
+            queries = list(state["evidence"])
+            embeddings = dict(zip(queries, await embed_queries(queries)))
+        client = get_anthropic_client()
+        with tracer.span("message_batch", size=len(state["requests"])):
+            batch = await client.messages.batches.retrieve(state["id"])
+            while batch.processing_status != "ended":
+                await asyncio.sleep(settings.BATCH_POLL_SECONDS)
+                batch = await client.messages.batches.retrieve(state["id"])
+                # Renews this process's lease on the job
+                self.persist(job)
+            results = await client.messages.batches.results(state["id"])
+
+        elapsed = time.time() - state["submitted_at"]
+        async for entry in results:
+            index = int(entry.custom_id)
+            request = state["requests"][entry.custom_id]
+            evidence, tier = state["evidence"][request["query"]], model_router.tiers[request["tier"]]
+            if entry.result.type != "succeeded":
+                job.fail(index, f"Message Batch request {entry.result.type}")
+                continue
+            message = entry.result.message
+            prompt_usage.record(message.usage)
+            model_router.record_batch(tier, message.usage)
+            try:
+                # A truncated plan is completed with an online continuation request
+                plan = await plan_from_message(message, build_prompt(job.inputs[index], evidence),
+                                               request["provisional"], tier)
+            except Exception as e:
+                job.fail(index, f"Could not complete treatment plan: {e}")
+                continue
+            if not request["provisional"]:
+                response_cache.put(job.inputs[index], evidence, embeddings[request["query"]], plan, elapsed)
+            job.complete(index, plan)
+
+        for custom_id in state["requests"]:
+            if job.results[int(custom_id)].status == "pending":
+                job.fail(int(custom_id), "Missing from the Message Batch results")
+
+    async def shutdown(self) -> None:
+        """Stop running jobs on application shutdown and release them in batch_jobs for the next process.
+
+        A Message Batch keeps running at Anthropic; whichever process resumes
+        the job collects its results.
+        """
+        running = [job for job in self.jobs.values() if job.task and not job.task.done()]
+        for job in running:
+            job.task.cancel()
+        await asyncio.gather(*(job.task for job in running), return_exceptions=True)
+        for job in running:
+            job.owner = None
+            self.persist(job)
+        await self.flush()
+
+
+batch_analyzer = BatchAnalyzer(concurrency=settings.BATCH_CONCURRENCY, job_ttl=settings.BATCH_JOB_TTL,
+                               lease=settings.BATCH_JOB_LEASE_SECONDS)
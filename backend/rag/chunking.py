@@ -0,0 +1,109 @@
+import re
+from functools import lru_cache
+from typing import Dict, List
+from app.core.config import settings
+from rag.embeddings import estimate_tokens
+
+# Structured abstracts arrive from efetch as "BACKGROUND: ... METHODS: ..."
+SECTION_LABEL = re.compile(r"(?:^|\s)([A-Z][A-Z ,&/-]{2,40}):\s")
+
+
+@lru_cache(maxsize=1)
+def _splitter():
+    # Deferred: langchain-text-splitters pulls in langchain-core (~1 s to import)
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    return RecursiveCharacterTextSplitter(
+        chunk_size=settings.CHUNK_SIZE,
+        chunk_overlap=settings.CHUNK_OVERLAP,
+        separators=[". ", "; ", ", ", " "],
+        keep_separator="end",
+    )
+
+
+def split_sections(abstract: str) -> List[Dict[str, str]]:
+    """Split a structured abstract on its section labels; unlabelled text is one section."""
+    abstract = " ".join(abstract.split())
+    matches = list(SECTION_LABEL.finditer(abstract))
+    if not matches:
+        return [{"section": "", "text": abstract}] if abstract else []
+    sections = []
+    preamble = abstract[:matches[0].start()].strip()
+    if preamble:
+        sections.append({"section": "", "text": preamble})
+    for match, following in zip(matches, matches[1:] + [None]):
+        text = abstract[match.end():following.start() if following else len(abstract)].strip()
+        if text:
+            sections.append({"section": match.group(1).strip(), "text": text})
+    return sections
+
+
+def chunk_article(article: Dict) -> List[Dict]:
+    """Split an article's abstract into passages that link back to it by ``pmid``.
+
+    Each labelled section is a passage; sections (or unlabelled abstracts)
+    longer than CHUNK_SIZE characters become overlapping sentence windows.
+    """
+    chunks = []
+    for section in split_sections(article.get("abstract") or ""):
+        pieces = [section["text"]] if len(section["text"]) <= settings.CHUNK_SIZE \
+            else _splitter().split_text(section["text"])
+        for piece in pieces:
+            chunks.append({
+                "pmid": article["pmid"],
+                "chunk_index": len(chunks),
+                "section": section["section"],
+                "content": piece.strip(),
+            })
+    return chunks
+
+
+def chunk_embedding_text(article: Dict, chunk: Dict) -> str:
+    """Text embedded for a passage: the title and section label give it context."""
+    label = f"{chunk['section']}: " if chunk["section"] else ""
+    return f"{article['title']}. {label}{chunk['content']}"
+
+
+def group_passages(rows: List[Dict]) -> List[Dict]:
+    """Group match_research_chunks rows by parent document, best document first.
+
+    Each document carries its ``passages`` (best first) and the similarity of
+    its best passage.
+    """
+    documents: Dict[str, Dict] = {}
+    for row in sorted(rows, key=lambda r: r["similarity"], reverse=True):
+        passage = {k: row[k] for k in ("chunk_index", "section", "content", "similarity")}
+        doc = documents.get(row["pmid"])
+        if doc is None:
+            doc = {k: v for k, v in row.items() if k not in passage}
+            doc["similarity"] = row["similarity"]
+            doc["passages"] = []
+            documents[row["pmid"]] = doc
+        doc["passages"].append(passage)
+    return list(documents.values())
+
+
+def select_passages(evidence: List[Dict], token_budget: int, per_document: int) -> Dict[str, List[Dict]]:
+    """Choose the passages to put in the prompt, keyed by pmid, in reading order.
+
+    Every document keeps its best passage so each citation stays grounded;
+    the remaining budget goes to the next best passages across all documents,
+    up to ``per_document`` each.
+    """
+    chosen: Dict[str, List[Dict]] = {doc["pmid"]: [] for doc in evidence}
+    used = 0
+    candidates = []
+    for doc in evidence:
+        passages = doc.get("passages") or []
+        if passages:
+            chosen[doc["pmid"]].append(passages[0])
+            used += estimate_tokens(passages[0]["content"])
+        candidates.extend((p["similarity"], doc["pmid"], p) for p in passages[1:per_document])
+
+    for _, pmid, passage in sorted(candidates, key=lambda c: (-c[0], c[1], c[2]["chunk_index"])):
+        cost = estimate_tokens(passage["content"])
+        if used + cost > token_budget:
+            continue
+        chosen[pmid].append(passage)
+        used += cost
+
+    return {pmid: sorted(passages, key=lambda p: p["chunk_index"]) for pmid, passages in chosen.items()}
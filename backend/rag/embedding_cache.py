@@ -0,0 +1,133 @@
+import asyncio
+import os
+import sqlite3
+import time
+from array import array
+from threading import Lock
+from typing import Dict, List, Optional, Tuple
+from cachetools import TTLCache
+
+CacheKey = Tuple[str, str, str]
+# Rows written between sweeps of expired and surplus rows
+PRUNE_EVERY = 256
+
+
+def normalize_text(text: str) -> str:
+    """Lower-case and collapse whitespace so trivially different queries share a key."""
+    return " ".join(text.lower().split())
+
+
+class EmbeddingCache:
+    """Two-tier embedding cache: in-process LRU with TTL in front of a SQLite file.
+
+    The SQLite tier survives process restarts (e.g. Fly auto-stop), so the first
+    request after a cold start can still skip the Voyage round-trip. Disk reads
+    run on a worker thread; writes are queued and committed together by one
+    background flush, which also drops rows older than ``disk_ttl`` and the
+    oldest beyond ``disk_max_rows``.
+    """
+
+    def __init__(self, path: str, maxsize: int = 2048, ttl: float = 86400, disk_ttl: float = 30 * 86400,
+                 disk_max_rows: int = 20_000):
+        self.path = path
+        self.disk_ttl = disk_ttl
+        self.disk_max_rows = disk_max_rows
+        self.memory: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.disk_writes = 0
+        self.pruned = 0
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = Lock()
+        self._pending: List[Tuple] = []
+        self._flushing: Optional[asyncio.Task] = None
+        self._unpruned = PRUNE_EVERY  # sweep on the first write
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "text TEXT, model TEXT, input_type TEXT, vector BLOB, created_at REAL, "
+                "PRIMARY KEY (text, model, input_type))"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_created_at ON embeddings (created_at)")
+        return self._conn
+
+    @staticmethod
+    def key(text: str, model: str, input_type: str) -> CacheKey:
+        return (normalize_text(text), model, input_type)
+
+    async def get(self, text: str, model: str, input_type: str) -> Optional[List[float]]:
+        key = self.key(text, model, input_type)
+        vector = self.memory.get(key)
+        if vector is not None:
+            self.memory_hits += 1
+            return vector
+
+        row = await asyncio.to_thread(self._read, key)
+        if row is not None and time.time() - row[1] < self.disk_ttl:
+            vector = array("f", row[0]).tolist()
+            self.memory[key] = vector
+            self.disk_hits += 1
+            return vector
+
+        self.misses += 1
+        return None
+
+    def put(self, text: str, model: str, input_type: str, vector: List[float]) -> None:
+        """Cache in memory now; the disk write is queued for the background flush."""
+        key = self.key(text, model, input_type)
+        self.memory[key] = vector
+        self._pending.append((*key, array("f", vector).tobytes(), time.time()))
+        if self._flushing is None or self._flushing.done():
+            self._flushing = asyncio.get_running_loop().create_task(self.flush())
+
+    async def flush(self) -> None:
+        """Commit every queued write, one transaction per batch, on a worker thread."""
+        while self._pending:
+            rows, self._pending = self._pending, []
+            try:
+                await asyncio.to_thread(self._write, rows)
+            except Exception as e:
+                print(f"Embedding cache write failed, {len(rows)} vectors kept in memory only: {e}")
+
+    def _read(self, key: CacheKey) -> Optional[Tuple[bytes, float]]:
+        with self._lock:
+            return self._db().execute(
+                "SELECT vector, created_at FROM embeddings WHERE text = ? AND model = ? AND input_type = ?",
+                key,
+            ).fetchone()
+
+    def _write(self, rows: List[Tuple]) -> None:
+        with self._lock:
+            conn = self._db()
+            conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?, ?)", rows)
+            self.disk_writes += len(rows)
+            self._unpruned += len(rows)
+            if self._unpruned >= PRUNE_EVERY:
+                self._unpruned = 0
+                expired = conn.execute("DELETE FROM embeddings WHERE created_at < ?", (time.time() - self.disk_ttl,))
+                surplus = conn.execute(
+                    "DELETE FROM embeddings WHERE rowid IN "
+                    "(SELECT rowid FROM embeddings ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                    (self.disk_max_rows,),
+                )
+                self.pruned += expired.rowcount + surplus.rowcount
+            conn.commit()
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+            "memory_entries": len(self.memory),
+            "disk_writes": self.disk_writes,
+            "pending_writes": len(self._pending),
+            "pruned": self.pruned,
+        }
@@ -1,17 +1,169 @@
-import voyageai
-from typing import List
+import asyncio
+import random
+from typing import TYPE_CHECKING, Dict, List, Optional
 from app.core.config import settings
+from app.core.clients import get_http_client
+from rag.embedding_cache import EmbeddingCache
 
-client = voyageai.Client(api_key=settings.VOYAGE_API_KEY, timeout=30)
+if TYPE_CHECKING:
+    import httpx
 
+EMBED_MODEL = "voyage-large-2"
 
-def embed_texts(texts: List[str]) -> List[List[float]]:
-    """Embed a list of texts using Voyage AI."""
-    result = client.embed(texts, model="voyage-large-2", input_type="document")
-    return result.embeddings
+# Voyage's tokenizer averages ~4 characters per token on English abstracts;
+# estimating at 3 keeps packed batches safely under the real token limit
+CHARS_PER_TOKEN = 3
 
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
 
-def embed_query(query: str) -> List[float]:
-    """Embed a single query using Voyage AI."""
-    result = client.embed([query], model="voyage-large-2", input_type="query")
-    return result.embeddings[0]
+query_cache = EmbeddingCache(
+    settings.EMBEDDING_CACHE_PATH,
+    maxsize=settings.EMBEDDING_CACHE_SIZE,
+    ttl=settings.EMBEDDING_CACHE_TTL,
+    disk_ttl=settings.EMBEDDING_CACHE_DISK_TTL,
+    disk_max_rows=settings.EMBEDDING_CACHE_DISK_ROWS,
+)
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def pack_batches(texts: List[str], max_texts: int, max_tokens: int) -> List[List[int]]:
+    """Greedily pack text indices into batches under both the item and the token limit.
+
+    A single text over the token limit gets a batch of its own; Voyage truncates it.
+    """
+    batches: List[List[int]] = []
+    current: List[int] = []
+    current_tokens = 0
+    for i, text in enumerate(texts):
+        tokens = estimate_tokens(text)
+        if current and (len(current) >= max_texts or current_tokens + tokens > max_tokens):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(i)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _retry_delay(response: Optional["httpx.Response"], attempt: int) -> float:
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+    # Full jitter, so concurrent batches that were throttled together don't retry together
+    return random.uniform(0, min(30.0, 0.5 * 2 ** attempt))
+
+
+async def _embed(texts: List[str], input_type: str) -> List[List[float]]:
+    """Call the Voyage embeddings endpoint over the shared connection pool.
+
+    429s, 5xx responses and transport errors are retried with jittered
+    exponential backoff, honouring Retry-After when Voyage sends one.
+    """
+    import httpx  # deferred with the clients, see app.core.clients
+
+    for attempt in range(settings.EMBED_MAX_RETRIES + 1):
+        response = None
+        try:
+            response = await get_http_client().post(
+                f"{settings.VOYAGE_BASE_URL}/embeddings",
+                headers={"Authorization": f"Bearer {settings.VOYAGE_API_KEY}"},
+                json={"input": texts, "model": EMBED_MODEL, "input_type": input_type},
+            )
+            response.raise_for_status()
+        except (httpx.HTTPStatusError, httpx.TransportError) as e:
+            retryable = response is None or response.status_code in RETRYABLE_STATUS
+            if not retryable or attempt == settings.EMBED_MAX_RETRIES:
+                raise
+            delay = _retry_delay(response, attempt)
+            print(f"Embedding request failed ({e}); retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+            continue
+        data = sorted(response.json()["data"], key=lambda d: d["index"])
+        return [d["embedding"] for d in data]
+
+
+class BatchEmbedder:
+    """Embeds arbitrarily long text lists within Voyage's per-request limits.
+
+    Duplicate texts are embedded once, the unique texts are packed into batches
+    under the item and token budgets, and up to ``concurrency`` batches are in
+    flight at a time. Results come back in input order.
+    """
+
+    def __init__(self, max_texts: int, max_tokens: int, concurrency: int):
+        self.max_texts = max_texts
+        self.max_tokens = max_tokens
+        self.concurrency = concurrency
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.stats = {"texts": 0, "unique_texts": 0, "requests": 0}
+
+    async def _embed_batch(self, texts: List[str], input_type: str) -> List[List[float]]:
+        async with self._slots:
+            self.stats["requests"] += 1
+            return await _embed(texts, input_type)
+
+    async def embed(self, texts: List[str], input_type: str = "document") -> List[List[float]]:
+        if not texts:
+            return []
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.concurrency)
+
+        positions: Dict[str, int] = {}
+        unique: List[str] = []
+        for text in texts:
+            if text not in positions:
+                positions[text] = len(unique)
+                unique.append(text)
+        self.stats["texts"] += len(texts)
+        self.stats["unique_texts"] += len(unique)
+
+        batches = pack_batches(unique, self.max_texts, self.max_tokens)
+        results = await asyncio.gather(*(
+            self._embed_batch([unique[i] for i in batch], input_type) for batch in batches
+        ))
+        embeddings: List[List[float]] = [None] * len(unique)
+        for batch, batch_embeddings in zip(batches, results):
+            for i, embedding in zip(batch, batch_embeddings):
+                embeddings[i] = embedding
+        return [embeddings[positions[text]] for text in texts]
+
+
+batch_embedder = BatchEmbedder(
+    max_texts=settings.EMBED_BATCH_MAX_TEXTS,
+    max_tokens=settings.EMBED_BATCH_MAX_TOKENS,
+    concurrency=settings.EMBED_CONCURRENCY,
+)
+
+
+async def embed_texts(texts: List[str]) -> List[List[float]]:
+    """Embed a list of texts of any length using Voyage AI."""
+    return await batch_embedder.embed(texts, input_type="document")
+
+
+async def embed_query(query: str) -> List[float]:
+    """Embed a single query using Voyage AI, served from the query cache when possible."""
+    cached = await query_cache.get(query, EMBED_MODEL, "query")
+    if cached is not None:
+        return cached
+    embeddings = await _embed([query], input_type="query")
+    query_cache.put(query, EMBED_MODEL, "query", embeddings[0])
+    return embeddings[0]
+
+
+async def embed_queries(queries: List[str]) -> List[List[float]]:
+    """Embed several queries, sending every query-cache miss in one batched request."""
+    vectors: List[Optional[List[float]]] = [await query_cache.get(q, EMBED_MODEL, "query") for q in queries]
+    misses = list(dict.fromkeys(q for q, v in zip(queries, vectors) if v is None))
+    if misses:
+        embedded = dict(zip(misses, await batch_embedder.embed(misses, input_type="query")))
+        for query, vector in embedded.items():
+            query_cache.put(query, EMBED_MODEL, "query", vector)
+        vectors = [v if v is not None else embedded[q] for q, v in zip(queries, vectors)]
+    return vectors
@@ -0,0 +1,64 @@
+import asyncio
+from typing import Dict, Optional
+from app.core.config import settings
+from app.core.tracing import tracer
+from rag.embedding_cache import normalize_text
+
+
+class IngestionQueue:
+    """In-process background ingestion with a bounded number of concurrent jobs.
+
+    Jobs are keyed by normalized diagnosis, so concurrent requests for the same
+    unseen condition share one dynamic_ingest run instead of each starting one.
+    """
+
+    def __init__(self, workers: int = 2):
+        self.workers = workers
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._jobs: Dict[str, asyncio.Task] = {}
+
+    def submit(self, diagnosis: str) -> asyncio.Task:
+        """Start ingestion for a diagnosis, or join the job already running for it."""
+        key = normalize_text(diagnosis)
+        job = self._jobs.get(key)
+        if job is None:
+            job = asyncio.create_task(self._run(diagnosis))
+            self._jobs[key] = job
+            job.add_done_callback(lambda done: self._finished(key, diagnosis, done))
+        return job
+
+    def _finished(self, key: str, diagnosis: str, job: asyncio.Task) -> None:
+        self._jobs.pop(key, None)
+        # Retrieved here because in provisional mode nobody awaits the job
+        if not job.cancelled() and job.exception() is not None:
+            print(f"Background ingestion error for {diagnosis}: {job.exception()}")
+
+    async def _run(self, diagnosis: str) -> Dict[str, int]:
+        # Imported here to avoid a cycle: the pipeline imports this queue
+        from rag.pipeline import dynamic_ingest
+
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.workers)
+        async with self._slots:
+            # Its own trace: the job outlives the request that submitted it
+            with tracer.trace("ingest"):
+                return await dynamic_ingest(diagnosis)
+
+    @staticmethod
+    async def wait(job: asyncio.Task, timeout: float) -> bool:
+        """Wait up to ``timeout`` seconds; the job keeps running if the deadline passes."""
+        done, _ = await asyncio.wait({job}, timeout=timeout)
+        return bool(done) and not job.cancelled() and job.exception() is None
+
+    def pending(self) -> int:
+        return len(self._jobs)
+
+    async def shutdown(self) -> None:
+        """Cancel outstanding jobs on application shutdown."""
+        jobs = list(self._jobs.values())
+        for job in jobs:
+            job.cancel()
+        await asyncio.gather(*jobs, return_exceptions=True)
+
+
+ingestion_queue = IngestionQueue(workers=settings.INGEST_WORKERS)
@@ -0,0 +1,74 @@
+import json
+from typing import Any, Iterator, List, Tuple
+
+
+class TopLevelFieldParser:
+    """Incremental parser that yields each top-level field of a JSON object once it is complete.
+
+    Feed it text chunks as they arrive from the model; ``feed`` returns the
+    ``(key, value)`` pairs whose values closed within that chunk. Any preamble
+    or code fence before the opening brace is skipped.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.pos = 0
+        self.started = False
+        self.finished = False
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.key: str = ""
+        self.key_start = -1
+        self.value_start = -1
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        self.buffer += chunk
+        return list(self._scan())
+
+    def _scan(self) -> Iterator[Tuple[str, Any]]:
+        buf = self.buffer
+        while self.pos < len(buf) and not self.finished:
+            ch = buf[self.pos]
+            if not self.started:
+                if ch == "{":
+                    self.started = True
+                    self.depth = 1
+                self.pos += 1
+                continue
+
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+                    if self.depth == 1 and self.value_start < 0:
+                        # Closing quote of a top-level key
+                        self.key = json.loads(buf[self.key_start:self.pos + 1])
+                self.pos += 1
+                continue
+
+            if ch == '"':
+                self.in_string = True
+                if self.depth == 1 and self.value_start < 0:
+                    self.key_start = self.pos
+            elif ch == ":" and self.depth == 1 and self.value_start < 0:
+                self.value_start = self.pos + 1
+            elif ch in "{[":
+                self.depth += 1
+            elif ch in "}]":
+                self.depth -= 1
+                if self.depth == 0:
+                    self.finished = True
+                    if self.value_start >= 0:
+                        yield self._complete_value(self.pos)
+            elif ch == "," and self.depth == 1 and self.value_start >= 0:
+                yield self._complete_value(self.pos)
+            self.pos += 1
+
+    def _complete_value(self, end: int) -> Tuple[str, Any]:
+        value = json.loads(self.buffer[self.value_start:end])
+        self.value_start = -1
+        return self.key, value
@@ -0,0 +1,215 @@
+import asyncio
+import math
+import re
+import time
+from array import array
+from collections import Counter, defaultdict
+from itertools import repeat
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from app.core.clients import get_supabase
+from app.core.config import settings
+from rag.vectorstore import store_listeners
+
+SNAPSHOT_COLUMNS = "id,pmid,title,abstract,authors,year,url,source,evidence_level,query_term"
+SNAPSHOT_PAGE_SIZE = 1000
+
+TOKEN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be been but by for from had has have in into is it its of on or that the their "
+    "there these this to was were which while with who will".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in TOKEN.findall(text.lower()) if t not in STOPWORDS]
+
+
+def term_counts(doc: Dict) -> Counter:
+    """Term frequencies of a row's title and abstract, without stopwords."""
+    counts = Counter(TOKEN.findall(f"{doc['title']} {doc.get('abstract') or ''}".lower()))
+    for word in STOPWORDS.intersection(counts):
+        del counts[word]
+    return counts
+
+
+class LexicalIndex:
+    """In-process BM25 index over research_documents titles and abstracts.
+
+    Postings are compressed rows: term ``t`` occurs in documents
+    ``doc_ids[offsets[t]:offsets[t + 1]]`` (uint32, ascending) with term
+    frequencies at the same positions of ``frequencies`` (uint16). A snapshot
+    is built in one vectorized pass; rows stored afterwards go to small
+    per-term tail arrays, so an insert never rewrites the main postings. A
+    query is scored with one array pass over the postings of its terms. Rows
+    are kept (without embeddings) so lexical matches can be returned as
+    evidence; a snapshot older than ``max_age`` seconds is reported stale so
+    callers fall back to vector search alone while ``start_refresh`` takes a
+    new one.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, max_age: float = 86400):
+        self.k1 = k1
+        self.b = b
+        self.max_age = max_age
+        self.snapshot_at = 0.0
+        # Indexing an unseen term assigns it the next id; lookups use .get()
+        self.terms: Dict[str, int] = defaultdict()
+        self.terms.default_factory = self.terms.__len__
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.doc_ids = np.zeros(0, dtype=np.uint32)
+        self.frequencies = np.zeros(0, dtype=np.uint16)
+        self.tails: Dict[int, Tuple[array, array]] = {}
+        self.lengths = array("I")
+        self.total_length = 0
+        self.docs: List[Dict] = []
+        self.rows: Dict[str, int] = {}
+        self.refreshing: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    def is_fresh(self) -> bool:
+        return self.snapshot_at > 0 and time.time() - self.snapshot_at < self.max_age
+
+    def build(self, docs: List[Dict], snapshot_at: float = 0.0) -> None:
+        """Replace the index contents with the given rows.
+
+        The new index is built aside and swapped in with one dict update, so
+        this can run on a worker thread while searches use the old contents.
+        """
+        fresh = LexicalIndex(self.k1, self.b, self.max_age)
+        term_ids, doc_ids, frequencies = array("I"), array("I"), array("I")
+        for doc in docs:
+            if doc["pmid"] in fresh.rows:
+                continue
+            number = len(fresh.docs)
+            counts = fresh._append(doc)
+            term_ids.extend(map(fresh.terms.__getitem__, counts))
+            frequencies.extend(counts.values())
+            doc_ids.extend(repeat(number, len(counts)))
+
+        terms = np.frombuffer(term_ids, dtype=np.uint32)
+        # Stable, so each term's documents stay in ascending order
+        order = np.argsort(terms, kind="stable")
+        fresh.doc_ids = np.frombuffer(doc_ids, dtype=np.uint32)[order]
+        fresh.frequencies = np.minimum(np.frombuffer(frequencies, dtype=np.uint32)[order], 0xFFFF).astype(np.uint16)
+        fresh.offsets = np.concatenate([[0], np.cumsum(np.bincount(terms, minlength=len(fresh.terms)))])
+        fresh.snapshot_at = snapshot_at or time.time()
+        self.__dict__.update(fresh.__dict__)
+
+    def add(self, query_term: str, rows: List[Dict]) -> None:
+        """Index newly stored rows (store_documents listener)."""
+        if not self.snapshot_at:
+            return
+        for row in rows:
+            if row["pmid"] in self.rows:
+                continue
+            number = len(self.docs)
+            for term, count in self._append({k: v for k, v in row.items() if k != "embedding"}).items():
+                term_id = self.terms[term]
+                tail = self.tails.get(term_id)
+                if tail is None:
+                    tail = self.tails[term_id] = (array("I"), array("H"))
+                tail[0].append(number)
+                tail[1].append(min(count, 0xFFFF))
+
+    def _append(self, doc: Dict) -> Counter:
+        counts = term_counts(doc)
+        length = sum(counts.values())
+        self.lengths.append(length)
+        self.total_length += length
+        self.rows[doc["pmid"]] = len(self.docs)
+        self.docs.append(doc)
+        return counts
+
+    def _postings(self, term_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Document numbers and term frequencies for one term, snapshot then tail."""
+        if term_id + 1 < len(self.offsets):
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            docs, frequencies = self.doc_ids[start:end], self.frequencies[start:end]
+        else:
+            docs, frequencies = self.doc_ids[:0], self.frequencies[:0]
+        tail = self.tails.get(term_id)
+        if tail is not None:
+            docs = np.concatenate([docs, np.array(tail[0], dtype=np.uint32)])
+            frequencies = np.concatenate([frequencies, np.array(tail[1], dtype=np.uint16)])
+        return docs, frequencies
+
+    def _score(self, query: str) -> Tuple[np.ndarray, np.ndarray]:
+        """BM25 score and matched share of the query's IDF weight, per document."""
+        n = len(self.docs)
+        scores = np.zeros(n, dtype=np.float32)
+        matched = np.zeros(n, dtype=np.float32)
+        query_terms = set(tokenize(query))
+        if not n or not query_terms:
+            return scores, matched
+        lengths = np.array(self.lengths, dtype=np.float32)
+        norm = self.k1 * (1 - self.b + self.b * lengths / (self.total_length / n))
+        total_idf = 0.0
+        for term in query_terms:
+            term_id = self.terms.get(term)
+            docs, tf = self._postings(term_id) if term_id is not None else (None, None)
+            df = len(docs) if docs is not None else 0
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            total_idf += idf
+            if not df:
+                continue
+            tf = tf.astype(np.float32)
+            # Postings hold each document once per term, so fancy-index += is exact
+            scores[docs] += idf * tf * (self.k1 + 1) / (tf + norm[docs])
+            matched[docs] += idf
+        return scores, matched / total_idf
+
+    def search(self, query: str, limit: int) -> List[Dict]:
+        """Top ``limit`` rows by BM25, best first, each with its ``lexical_score``."""
+        scores, _ = self._score(query)
+        hits = np.flatnonzero(scores)
+        if len(hits) > limit:
+            hits = hits[np.argpartition(-scores[hits], limit - 1)[:limit]]
+        hits = hits[np.argsort(-scores[hits], kind="stable")]
+        return [{**self.docs[i], "lexical_score": float(scores[i])} for i in hits]
+
+    def covered(self, query: str, min_results: int, min_coverage: float) -> bool:
+        """Whether at least ``min_results`` documents match ``min_coverage`` of the query's IDF weight.
+
+        Terms the index has never seen carry the highest IDF, so a query for a
+        condition with no stored research cannot pass on generic terms alone.
+        """
+        _, coverage = self._score(query)
+        return int(np.count_nonzero(coverage >= min_coverage)) >= min_results
+
+    async def snapshot(self) -> None:
+        """Pull every research_documents row (without embeddings) from Supabase and index it."""
+        docs, offset = [], 0
+        while True:
+            # Ordered, so pages neither overlap nor skip rows
+            result = await get_supabase().table("research_documents").select(SNAPSHOT_COLUMNS).order("id").range(
+                offset, offset + SNAPSHOT_PAGE_SIZE - 1
+            ).execute()
+            docs.extend(result.data)
+            if len(result.data) < SNAPSHOT_PAGE_SIZE:
+                break
+            offset += SNAPSHOT_PAGE_SIZE
+        started = time.perf_counter()
+        await asyncio.to_thread(self.build, docs)
+        print(f"Lexical index: {len(docs)} documents, {len(self.terms)} terms "
+              f"in {time.perf_counter() - started:.1f}s")
+
+    async def ensure_fresh(self) -> None:
+        """Take a snapshot if there is none or it is stale."""
+        try:
+            if not self.is_fresh():
+                await self.snapshot()
+        except Exception as e:
+            print(f"Lexical index unavailable, using vector search alone: {e}")
+
+    def start_refresh(self) -> asyncio.Task:
+        """Run ensure_fresh in the background, one at a time; searches are vector-only until it is done."""
+        if self.refreshing is None or self.refreshing.done():
+            self.refreshing = asyncio.create_task(self.ensure_fresh())
+        return self.refreshing
+
+
+lexical_index = LexicalIndex(max_age=settings.LEXICAL_INDEX_MAX_AGE)
+store_listeners.append(lexical_index.add)
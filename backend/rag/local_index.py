@@ -0,0 +1,245 @@
+import asyncio
+import json
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from app.core.clients import get_supabase
+from app.core.config import settings
+from rag.quantization import BLOCK_ROWS, binary_codes, hamming_distances, int8_codes, int8_scores
+from rag.reranker import candidate_features, reranker
+from rag.vectorstore import parse_embedding, reciprocal_rank_fusion, store_listeners
+
+SNAPSHOT_COLUMNS = "id,pmid,title,abstract,authors,year,url,source,evidence_level,query_term,embedding"
+SNAPSHOT_PAGE_SIZE = 1000
+
+
+class LocalIndex:
+    """In-process snapshot of research_documents for vector search without a network RPC.
+
+    Embeddings are stored L2-normalized in one (n, dim) matrix, memory-mapped
+    from ``{path}.npy``, so top-k cosine search is a single matmul. Metadata for
+    each row lives in ``{path}.json``. New rows from store_documents are kept in
+    a small in-memory ``tail`` matrix after the snapshot rows; a snapshot older
+    than ``max_age`` seconds is reported stale so callers fall back to the
+    match_research_documents RPC while ``start_refresh`` takes a new one.
+
+    With ``quantization`` "binary" or "int8", search is two-stage: every row is
+    scored by the Hamming distance of its sign bits or by its int8 codes, and
+    only the best ``rescore`` rows are scored exactly against the float
+    vectors. The codes are the only per-row data the first stage reads, so the
+    float matrix can stay on disk, memory-mapped.
+    """
+
+    def __init__(self, path: str, dtype: str = "float32", max_age: float = 86400, quantization: str = "none",
+                 rescore: int = 400):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.max_age = max_age
+        self.quantization = quantization
+        self.rescore = rescore
+        self.matrix: Optional[np.ndarray] = None
+        self.tail: Optional[np.ndarray] = None
+        self.codes: Optional[np.ndarray] = None
+        self.scales: Optional[np.ndarray] = None
+        self.docs: List[Dict] = []
+        self.rows: Dict[str, int] = {}
+        self.features = candidate_features([])
+        self.snapshot_at = 0.0
+        self.refreshing: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    def is_fresh(self) -> bool:
+        return self.matrix is not None and time.time() - self.snapshot_at < self.max_age
+
+    def build(self, docs: List[Dict], embeddings: np.ndarray, snapshot_at: Optional[float] = None,
+              normalized: bool = False) -> None:
+        """Replace the index contents with the given rows and (n, dim) embeddings."""
+        if normalized:
+            self.matrix = embeddings
+        else:
+            matrix = np.asarray(embeddings, dtype=np.float32)
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            self.matrix = (matrix / np.maximum(norms, 1e-12)).astype(self.dtype)
+        self.tail = np.zeros((0, self.matrix.shape[1]), dtype=self.dtype)
+        self.codes, self.scales = self._encode(self.matrix)
+        self.docs = docs
+        self.rows = {d["pmid"]: i for i, d in enumerate(docs)}
+        self.features = candidate_features(docs)
+        self.snapshot_at = snapshot_at or time.time()
+
+    def _encode(self, vectors: np.ndarray) -> Tuple[Optional[np.ndarray], Optional[np.ndarray]]:
+        """Quantized codes (and int8 scales) of the vectors, a block at a time so a memory-mapped matrix is streamed."""
+        if self.quantization == "none":
+            return None, None
+        blocks = [np.asarray(vectors[i:i + BLOCK_ROWS], dtype=np.float32)
+                  for i in range(0, len(vectors), BLOCK_ROWS)] or [np.zeros((0, vectors.shape[1]), dtype=np.float32)]
+        if self.quantization == "binary":
+            return np.concatenate([binary_codes(block) for block in blocks]), None
+        encoded = [int8_codes(block) for block in blocks]
+        return np.concatenate([codes for codes, _ in encoded]), np.concatenate([scales for _, scales in encoded])
+
+    def add(self, query_term: str, rows: List[Dict]) -> None:
+        """Append newly stored rows to the tail (store_documents listener)."""
+        if self.matrix is None:
+            return
+        rows = [r for r in rows if r["pmid"] not in self.rows]
+        if not rows:
+            return
+        docs = [{k: v for k, v in r.items() if k != "embedding"} for r in rows]
+        embeddings = np.array([parse_embedding(r["embedding"]) for r in rows], dtype=np.float32)
+        embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+        self.tail = np.vstack([self.tail, embeddings.astype(self.dtype)])
+        if self.codes is not None:
+            codes, scales = self._encode(embeddings)
+            self.codes = np.concatenate([self.codes, codes])
+            if scales is not None:
+                self.scales = np.concatenate([self.scales, scales])
+        self.rows.update({doc["pmid"]: len(self.docs) + i for i, doc in enumerate(docs)})
+        self.docs = self.docs + docs
+        self.features = candidate_features(self.docs)
+
+    def search(self, query_embedding: List[float], match_count: int, pool: Optional[int] = None,
+               lexical: Optional[List[Dict]] = None) -> List[Dict]:
+        """Top ``pool`` rows by cosine similarity, re-ranked; returns ``match_count``.
+
+        Mirrors search_similar, with the re-rank features precomputed at build
+        time and MMR run directly against the index matrix. ``lexical`` matches
+        (best first) join the pool and are ranked by fused rank; unlike the RPC
+        path, every candidate here has its true similarity and embedding.
+        """
+        pool = min(pool or max(settings.RERANK_CANDIDATE_POOL, match_count * 2), len(self.docs))
+        if pool == 0:
+            return []
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+        candidates, similarity = self.nearest(query, pool)
+
+        relevance = None
+        if lexical:
+            order = np.argsort(-similarity, kind="stable")
+            candidates, similarity = candidates[order], similarity[order]
+            vector_pmids = [self.docs[i]["pmid"] for i in candidates]
+            lexical_pmids = [d["pmid"] for d in lexical if d["pmid"] in self.rows]
+            fused = reciprocal_rank_fusion([vector_pmids, lexical_pmids], settings.RRF_K)
+            pooled = set(vector_pmids)
+            extra = np.array([self.rows[pmid] for pmid in lexical_pmids if pmid not in pooled], dtype=candidates.dtype)
+            candidates = np.concatenate([candidates, extra])
+            similarity = np.concatenate([similarity, self._vectors(extra) @ query])
+            relevance = np.array([fused[self.docs[i]["pmid"]] for i in candidates], dtype=np.float32)
+        return reranker.rerank(
+            [self.docs[i] for i in candidates],
+            match_count,
+            similarity=similarity,
+            features={name: values[candidates] for name, values in self.features.items()},
+            embeddings=self._vectors(candidates) if reranker.uses_embeddings else None,
+            relevance=relevance,
+        )
+
+    def nearest(self, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Rows of the (about) ``k`` most similar vectors, unordered, with their exact cosine similarity.
+
+        Exact over every row, or rescored from the quantized shortlist.
+        """
+        k = min(k, len(self.docs))
+        if self.codes is None:
+            similarity = self._similarity(query)
+            rows = np.argpartition(-similarity, k - 1)[:k]
+            return rows, similarity[rows]
+        shortlist = self._shortlist(query, max(self.rescore, k))
+        similarity = self._vectors(shortlist) @ query
+        best = np.argpartition(-similarity, k - 1)[:k]
+        return shortlist[best], similarity[best]
+
+    def _shortlist(self, query: np.ndarray, k: int) -> np.ndarray:
+        k = min(k, len(self.docs))
+        if self.quantization == "binary":
+            distances = hamming_distances(self.codes, binary_codes(query))
+            return np.argpartition(distances, k - 1)[:k]
+        return np.argpartition(-int8_scores(self.codes, self.scales, query), k - 1)[:k]
+
+    def _vectors(self, rows: np.ndarray) -> np.ndarray:
+        """float32 vectors of the given rows, from the snapshot matrix or the tail."""
+        # Ascending reads are sequential when the matrix is memory-mapped
+        order = np.argsort(rows, kind="stable")
+        vectors = np.empty((len(rows), self.matrix.shape[1]), dtype=np.float32)
+        snapshot = rows[order] < len(self.matrix)
+        vectors[order[snapshot]] = self.matrix[rows[order][snapshot]]
+        vectors[order[~snapshot]] = self.tail[rows[order][~snapshot] - len(self.matrix)]
+        return vectors
+
+    def _similarity(self, query: np.ndarray) -> np.ndarray:
+        tail = self.tail.astype(np.float32) @ query
+        if self.matrix.dtype == np.float32:
+            return np.concatenate([self.matrix @ query, tail]) if len(tail) else self.matrix @ query
+        # NumPy has no BLAS path for float16, so upcast block by block instead
+        return np.concatenate([
+            self.matrix[i:i + BLOCK_ROWS].astype(np.float32) @ query
+            for i in range(0, len(self.matrix), BLOCK_ROWS)
+        ] + [tail])
+
+    def save(self) -> None:
+        """Write the snapshot rows; replaced rather than overwritten, so a mapping of the old file stays valid."""
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(f"{self.path}.npy.tmp", "wb") as f:
+            np.save(f, np.asarray(self.matrix))
+        os.replace(f"{self.path}.npy.tmp", f"{self.path}.npy")
+        with open(f"{self.path}.json", "w") as f:
+            json.dump({"snapshot_at": self.snapshot_at, "docs": self.docs[:len(self.matrix)]}, f)
+
+    def load(self) -> bool:
+        """Memory-map a saved snapshot; returns False when none exists."""
+        if not (os.path.exists(f"{self.path}.npy") and os.path.exists(f"{self.path}.json")):
+            return False
+        with open(f"{self.path}.json") as f:
+            meta = json.load(f)
+        matrix = np.load(f"{self.path}.npy", mmap_mode="r")
+        self.build(meta["docs"], matrix, snapshot_at=meta["snapshot_at"], normalized=True)
+        return True
+
+    async def snapshot(self) -> None:
+        """Pull every research_documents row from Supabase and persist a fresh snapshot."""
+        docs, embeddings, offset = [], [], 0
+        while True:
+            # Ordered, so pages neither overlap nor skip rows
+            result = await get_supabase().table("research_documents").select(SNAPSHOT_COLUMNS).order("id").range(
+                offset, offset + SNAPSHOT_PAGE_SIZE - 1
+            ).execute()
+            for row in result.data:
+                embeddings.append(parse_embedding(row.pop("embedding")))
+                docs.append(row)
+            if len(result.data) < SNAPSHOT_PAGE_SIZE:
+                break
+            offset += SNAPSHOT_PAGE_SIZE
+        self.build(docs, np.array(embeddings, dtype=np.float32).reshape(len(docs), -1))
+        self.save()
+        if self.codes is not None:
+            # Searches only read the rescored rows, so the float vectors can stay on disk
+            self.matrix = np.load(f"{self.path}.npy", mmap_mode="r")
+        print(f"Local vector index snapshot: {len(docs)} documents")
+
+    async def ensure_fresh(self) -> None:
+        """Load the on-disk snapshot, taking a new one if it is missing or stale."""
+        try:
+            if not (self.load() and self.is_fresh()):
+                await self.snapshot()
+        except Exception as e:
+            print(f"Local vector index unavailable, using RPC search: {e}")
+
+    def start_refresh(self) -> asyncio.Task:
+        """Run ensure_fresh in the background, one at a time; searches use the RPC until it is done."""
+        if self.refreshing is None or self.refreshing.done():
+            self.refreshing = asyncio.create_task(self.ensure_fresh())
+        return self.refreshing
+
+
+local_index = LocalIndex(
+    settings.LOCAL_INDEX_PATH,
+    dtype=settings.LOCAL_INDEX_DTYPE,
+    max_age=settings.LOCAL_INDEX_MAX_AGE,
+    quantization=settings.QUANTIZED_SEARCH,
+    rescore=settings.QUANTIZED_RESCORE,
+)
+store_listeners.append(local_index.add)
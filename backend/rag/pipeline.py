@@ -1,13 +1,26 @@
-import anthropic
+import asyncio
 import json
-from typing import List, Dict
-from app.core.config import settings
-from rag.vectorstore import search_similar, store_documents, needs_more_research
+import time
+from typing import AsyncIterator, Iterator, List, Dict, Optional, Tuple
+from pydantic import ValidationError
+from app.core.tracing import tracer
+from rag.vectorstore import EVIDENCE_LEVEL_PRIORITY, Retrieval, evidence_fingerprint, store_documents
 from ingestion.pubmed import fetch_research
-from ingestion.pedro import fetch_pedro_research
-from models.schemas import PTInput, TreatmentPlanOutput, Citation, ExerciseItem, ManualTherapyItem, SpecialTest
-
-client = anthropic.Anthropic(api_key=settings.ANTHROPIC_API_KEY)
+from ingestion.pedro import fetch_pedro_research, dedupe_articles
+from rag.ingest_queue import ingestion_queue
+from rag.chunking import select_passages
+from rag.embeddings import estimate_tokens
+from rag.json_stream import TopLevelFieldParser
+from rag.plan_output import (
+    PLAN_TOOL_NAME, SECTION_VALIDATORS, PlanOutputError, continuation_prompt, extract_plan, fields_from_text,
+    kept_share, missing_fields, plan_tool,
+)
+from rag.response_cache import response_cache
+from rag.routing import ModelTier, model_router
+from rag.usage import plan_output_stats, prompt_usage
+from rag.warm_plans import WarmEntry, warm_plans
+from app.core.config import settings
+from models.schemas import HealingStage, PTInput, TreatmentPlanOutput, Citation
 
 
 def build_query(pt_input: PTInput) -> str:
@@ -18,43 +31,16 @@ def build_query(pt_input: PTInput) -> str:
     )
 
 
-def build_prompt(pt_input: PTInput, evidence: List[Dict]) -> str:
-    evidence_text = ""
-    for i, doc in enumerate(evidence, 1):
-        source = doc.get("source", "PubMed")
-        evidence_level = doc.get("evidence_level", "standard")
-        evidence_text += f"""
-[{i}] Title: {doc['title']}
-Authors: {', '.join(doc['authors']) if doc['authors'] else 'Unknown'}
-Year: {doc['year']}
-Source: {source}
-Evidence Level: {evidence_level}
-URL: {doc['url']}
-Abstract: {doc['abstract']}
----
-"""
-
-    return f"""You are an expert Physical Therapy clinical decision support AI.
+SYSTEM_PROMPT = """You are an expert Physical Therapy clinical decision support AI.
 You must ONLY make recommendations that are directly supported by the provided research evidence.
 You must NEVER hallucinate or invent medical recommendations without citation.
 If the retrieved evidence is not relevant to the diagnosis, say so clearly.
 When citing evidence, prioritize systematic reviews and RCTs over lower quality evidence.
 
-PATIENT ASSESSMENT:
-- Diagnosis: {pt_input.diagnosis}
-- Symptoms: {', '.join(pt_input.symptoms)}
-- Stage of Healing: {pt_input.healing_stage.value}
-- Functional Limitations: {', '.join(pt_input.functional_limitations)}
-- Pain Level: {pt_input.pain_level}/10
-- Pain with Movement: {', '.join(pt_input.pain_with_movement) if pt_input.pain_with_movement else 'Not specified'}
-- Tenderness to Palpation: {', '.join(pt_input.tenderness_to_palpation) if pt_input.tenderness_to_palpation else 'Not specified'}
-- Constraints: {', '.join(pt_input.constraints) if pt_input.constraints else 'None'}
-
-RETRIEVED EVIDENCE (ranked by quality):
-{evidence_text}
+You will receive the RETRIEVED EVIDENCE (ranked by quality) followed by the PATIENT ASSESSMENT.
 
-Based ONLY on the evidence above, generate a structured clinical response in the following JSON format:
-{{
+Based ONLY on the retrieved evidence, generate a structured clinical response in the following JSON format:
+{
   "differential_diagnosis": [
     "Most likely diagnosis with brief rationale",
     "Alternative diagnosis 1 with brief rationale",
@@ -62,120 +48,615 @@ Based ONLY on the evidence above, generate a structured clinical response in the
   ],
   "gold_standard": "A concise 2-3 sentence summary of the current evidence-based gold standard treatment approach for this condition based on the retrieved research, prioritizing systematic reviews and RCTs, with citation numbers e.g. [1], [2]",
   "special_tests": [
-    {{
+    {
       "name": "name of special orthopedic test",
       "procedure": "step by step description of how to perform the test",
       "positive_finding": "what a positive result looks like",
       "indicates": "what a positive result suggests"
-    }}
+    }
   ],
   "treatment_plan": "detailed narrative treatment plan with evidence references by number e.g. [1], [2]",
   "manual_therapy": [
-    {{
+    {
       "technique": "name of manual therapy technique",
       "target": "target tissue or joint",
       "rationale": "brief rationale based on evidence"
-    }}
+    }
   ],
   "exercise_protocol": [
-    {{
+    {
       "name": "exercise name",
       "description": "step by step instructions for how to perform the exercise",
       "sets": "number of sets",
       "reps": "number of reps or duration",
       "frequency": "how often per day or week",
       "notes": "any progressions, modifications, or special instructions"
-    }}
+    }
   ],
   "progression_criteria": ["criterion 1", "criterion 2"],
   "contraindications": ["contraindication 1", "contraindication 2"],
   "recovery_timeline": "expected recovery timeline narrative based only on current patient",
   "citations": [
-    {{
+    {
       "title": "article title",
       "authors": ["author1", "author2"],
       "year": "year",
       "url": "url to article",
       "source": "PubMed or PEDro"
-    }}
+    }
   ]
-}}
+}
+"""
+
+# Appended to SYSTEM_PROMPT for each PLAN_OUTPUT_MODE
+OUTPUT_INSTRUCTIONS = {
+    "tool": f"Submit the plan by calling the {PLAN_TOOL_NAME} tool with these fields as its input.\n",
+    "json": "Respond with valid JSON only. No additional text. No markdown. No code fences.\n",
+}
+
+# Marks a prompt block as a prompt-caching breakpoint; everything up to it is reusable
+CACHE_CONTROL = {"type": "ephemeral"}
+
+
+def order_evidence(evidence: List[Dict]) -> List[Dict]:
+    """Order evidence by quality, then PMID, independent of retrieval ranking ties."""
+    return sorted(
+        evidence,
+        key=lambda d: (-EVIDENCE_LEVEL_PRIORITY.get(d.get("evidence_level", "standard"), 0), str(d.get("pmid", ""))),
+    )
+
+
+def _passage_text(passages: List[Dict]) -> str:
+    return "\n".join(f"- {p['section']}: {p['content']}" if p["section"] else f"- {p['content']}" for p in passages)
+
 
-Respond with valid JSON only. No additional text. No markdown. No code fences.
+def format_evidence(evidence: List[Dict]) -> str:
+    """Render evidence deterministically so identical evidence sets produce identical, cacheable text.
+
+    Documents retrieved from the chunk index show only their selected passages,
+    within EVIDENCE_TOKEN_BUDGET; others show the whole abstract.
+    """
+    passages = select_passages(evidence, settings.EVIDENCE_TOKEN_BUDGET, settings.PASSAGES_PER_DOCUMENT)
+    evidence_text = ""
+    for i, doc in enumerate(order_evidence(evidence), 1):
+        source = doc.get("source", "PubMed")
+        evidence_level = doc.get("evidence_level", "standard")
+        if doc.get("passages"):
+            body = f"Relevant passages:\n{_passage_text(passages[doc['pmid']])}"
+        else:
+            body = f"Abstract: {' '.join(doc['abstract'].split())}"
+        evidence_text += f"""
+[{i}] Title: {doc['title']}
+Authors: {', '.join(doc['authors']) if doc['authors'] else 'Unknown'}
+Year: {doc['year']}
+Source: {source}
+Evidence Level: {evidence_level}
+URL: {doc['url']}
+{body}
+---
 """
+    return f"RETRIEVED EVIDENCE (ranked by quality):\n{evidence_text}"
+
+
+def format_patient(pt_input: PTInput) -> str:
+    return f"""PATIENT ASSESSMENT:
+- Diagnosis: {pt_input.diagnosis}
+- Symptoms: {', '.join(pt_input.symptoms)}
+- Stage of Healing: {pt_input.healing_stage.value}
+- Functional Limitations: {', '.join(pt_input.functional_limitations)}
+- Pain Level: {pt_input.pain_level}/10
+- Pain with Movement: {', '.join(pt_input.pain_with_movement) if pt_input.pain_with_movement else 'Not specified'}
+- Tenderness to Palpation: {', '.join(pt_input.tenderness_to_palpation) if pt_input.tenderness_to_palpation else 'Not specified'}
+- Constraints: {', '.join(pt_input.constraints) if pt_input.constraints else 'None'}
+"""
+
+
+def _plan_prompt(evidence: List[Dict], patient_blocks: List[Dict]) -> Dict:
+    mode = settings.PLAN_OUTPUT_MODE
+    prompt = {
+        "system": [{"type": "text", "text": SYSTEM_PROMPT + OUTPUT_INSTRUCTIONS[mode], "cache_control": CACHE_CONTROL}],
+        "messages": [{
+            "role": "user",
+            "content": [{"type": "text", "text": format_evidence(evidence), "cache_control": CACHE_CONTROL}]
+            + patient_blocks,
+        }],
+    }
+    if mode == "tool":
+        prompt["tools"] = [plan_tool()]
+        prompt["tool_choice"] = {"type": "tool", "name": PLAN_TOOL_NAME}
+    return prompt
+
+
+def build_prompt(pt_input: PTInput, evidence: List[Dict]) -> Dict:
+    """Build messages.create arguments laid out for Anthropic prompt caching.
+
+    The static instructions and output schema form the system block, the
+    evidence set is a second cached block, and the small per-patient block
+    comes last, so requests sharing evidence only pay full price for the patient.
+    In "tool" PLAN_OUTPUT_MODE the model must answer with a forced call to the
+    plan tool, whose input schema is TreatmentPlanOutput.
+    """
+    return _plan_prompt(evidence, [{"type": "text", "text": format_patient(pt_input)}])
+
+
+def baseline_input(condition: str, healing_stage: HealingStage) -> PTInput:
+    """The presentation a warm plan is generated for: the diagnosis and stage, without patient findings."""
+    return PTInput(diagnosis=condition, healing_stage=healing_stage, symptoms=[],
+                   functional_limitations=[], pain_level=0)
+
+
+def baseline_query(condition: str, healing_stage: HealingStage) -> str:
+    """The evidence query for a warm plan: the diagnosis and stage, without patient symptoms."""
+    return build_query(baseline_input(condition, healing_stage))
+
 
+def baseline_prompt(condition: str, healing_stage: HealingStage, evidence: List[Dict]) -> Dict:
+    """build_prompt for the baseline plan of a condition and healing stage rather than a patient."""
+    return _plan_prompt(evidence, [{"type": "text", "text": f"""BASELINE ASSESSMENT:
+- Diagnosis: {condition}
+- Stage of Healing: {healing_stage.value}
+This plan is the baseline for a typical patient with this diagnosis at this stage of healing and will be
+adapted to individual patients. Do not assume patient-specific symptoms, pain level or constraints.
+"""}])
 
-def dynamic_ingest(diagnosis: str) -> None:
-    """Fetch research from both PubMed and PEDro for an unknown condition."""
+
+# Ends an adaptation request; the adapted plan is the baseline with these fields replaced
+ADAPT_INSTRUCTION = (
+    "Adapt the baseline plan to this patient. Provide only the fields that must change for this patient, "
+    "each complete and consistent with the evidence and the rest of the baseline plan. "
+    "Omit fields that apply to them unchanged."
+)
+
+
+def adapt_prompt(pt_input: PTInput, entry: WarmEntry, evidence: List[Dict]) -> Dict:
+    """Request the fields of a warm plan that differ for this patient.
+
+    The baseline plan is a third cached block after the evidence, so patients
+    sharing a condition and healing stage only pay full price for themselves
+    and the (short) answer.
+    """
+    plan = entry.plan.model_dump(mode="json", exclude={"provisional"})
+    baseline = (f"BASELINE PLAN for a typical {entry.condition} patient in the {entry.healing_stage} stage, "
+                f"generated from the evidence above:\n{json.dumps(plan)}")
+    return _plan_prompt(evidence, [
+        {"type": "text", "text": baseline, "cache_control": CACHE_CONTROL},
+        {"type": "text", "text": format_patient(pt_input)},
+        {"type": "text", "text": ADAPT_INSTRUCTION},
+    ])
+
+
+def prompt_tokens(prompt: Dict) -> int:
+    """Estimated input tokens of a build_prompt result."""
+    blocks = prompt["system"] + prompt["messages"][0]["content"]
+    tools = estimate_tokens(json.dumps(prompt["tools"])) if "tools" in prompt else 0
+    return tools + sum(estimate_tokens(block["text"]) for block in blocks)
+
+
+async def _traced_fetch(stage: str, fetch) -> List[Dict]:
+    with tracer.span(stage) as span:
+        articles = await fetch
+        span.size = len(articles)
+        return articles
+
+
+async def dynamic_ingest(diagnosis: str) -> Dict[str, int]:
+    """Fetch research from PubMed and PEDro concurrently and store it as one batch."""
     print(f"Dynamic ingestion from PubMed and PEDro for: {diagnosis}")
 
-    # Fetch from PubMed
-    try:
-        pubmed_articles = fetch_research(
-            diagnosis + " physical therapy rehabilitation treatment",
-            max_results=8
-        )
-        if pubmed_articles:
-            store_documents(pubmed_articles, query_term=diagnosis)
-            print(f"Stored {len(pubmed_articles)} PubMed articles")
-    except Exception as e:
-        print(f"PubMed ingestion error: {e}")
-
-    # Fetch from PEDro
-    try:
-        pedro_articles = fetch_pedro_research(
-            diagnosis + " physiotherapy",
-            max_results=8
-        )
-        if pedro_articles:
-            store_documents(pedro_articles, query_term=diagnosis)
-            print(f"Stored {len(pedro_articles)} PEDro articles")
-    except Exception as e:
-        print(f"PEDro ingestion error: {e}")
+    pubmed_result, pedro_result = await asyncio.gather(
+        _traced_fetch("ingest_pubmed", fetch_research(
+            diagnosis + " physical therapy rehabilitation treatment", max_results=8)),
+        _traced_fetch("ingest_pedro", fetch_pedro_research(diagnosis + " physiotherapy", max_results=8)),
+        return_exceptions=True,
+    )
+
+    # High-quality results go first so they win the dedupe against plain PubMed copies
+    articles = []
+    for name, result in (("PEDro", pedro_result), ("PubMed", pubmed_result)):
+        if isinstance(result, Exception):
+            print(f"{name} ingestion error: {result}")
+        else:
+            articles.extend(result)
+
+    articles = dedupe_articles(articles)
+    if not articles:
+        return {"stored": 0, "skipped": 0, "failed": 0, "embed_calls": 0, "db_calls": 0}
+    with tracer.span("store", size=len(articles)):
+        return await store_documents(articles, query_term=diagnosis)
+
+
+async def ensure_evidence(retrieval: Retrieval, diagnosis: str, ingest_policy: Optional[str] = None) -> bool:
+    """Search, ingesting new research for the diagnosis if the evidence is insufficient; returns provisional."""
+    ingest_policy = ingest_policy or settings.INGEST_POLICY
+    await retrieval.search()
+    with tracer.span("sufficiency_check"):
+        insufficient = await retrieval.needs_more_research()
 
+    # Dynamic ingestion from both sources if insufficient research found. The job
+    # runs in the background; "wait" blocks up to INGEST_WAIT_SECONDS for it,
+    # "provisional" answers straight away from the evidence already stored.
+    if not insufficient:
+        return False
+    print(f"Insufficient research — fetching from PubMed and PEDro for: {diagnosis}")
+    job = ingestion_queue.submit(diagnosis)
+    ingested = False
+    if ingest_policy == "wait":
+        with tracer.span("ingest_wait"):
+            ingested = await ingestion_queue.wait(job, settings.INGEST_WAIT_SECONDS)
+    if ingested:
+        await retrieval.refresh()
+    return not ingested
 
-def run_rag_pipeline(pt_input: PTInput) -> TreatmentPlanOutput:
-    query = build_query(pt_input)
+
+async def retrieve_evidence(pt_input: PTInput, ingest_policy: Optional[str] = None) -> Tuple[Retrieval, bool]:
+    """Retrieve ranked evidence for the input; returns (retrieval, provisional)."""
+    with tracer.span("query_build") as span:
+        query = build_query(pt_input)
+        span.size = len(query)
     print(f"Searching for evidence: {query}")
+    retrieval = Retrieval(query, match_count=5)
+    provisional = await ensure_evidence(retrieval, pt_input.diagnosis, ingest_policy)
 
-    # Dynamic ingestion from both sources if insufficient research found
-    if needs_more_research(query):
-        print(f"Insufficient research — fetching from PubMed and PEDro for: {pt_input.diagnosis}")
-        dynamic_ingest(pt_input.diagnosis)
+    evidence = await retrieval.search()
+    print(f"Retrieved {len(evidence)} evidence documents "
+          f"(embed calls: {retrieval.embed_calls}, RPC calls: {retrieval.rpc_calls})")
+    return retrieval, provisional
 
-    evidence = search_similar(query, match_count=5)
-    print(f"Retrieved {len(evidence)} evidence documents")
 
-    prompt = build_prompt(pt_input, evidence)
-    print("Calling Claude API...")
+def evidence_citations(evidence: List[Dict]) -> List[Citation]:
+    return [
+        Citation(
+            title=doc["title"],
+            authors=doc.get("authors") or [],
+            year=doc.get("year") or "",
+            url=doc.get("url") or "",
+            source=doc.get("source", "PubMed"),
+        )
+        for doc in evidence
+    ]
 
-    message = client.messages.create(
-        model="claude-opus-4-5",
-        max_tokens=4096,
-        messages=[{"role": "user", "content": prompt}]
-    )
 
-    response_text = message.content[0].text
-    print(f"Raw response preview: {response_text[:200]}")
-
-    clean = response_text.strip()
-    if clean.startswith("```"):
-        clean = clean.split("```")[1]
-        if clean.startswith("json"):
-            clean = clean[4:]
-    clean = clean.strip()
-
-    data = json.loads(clean)
-
-    return TreatmentPlanOutput(
-        differential_diagnosis=data["differential_diagnosis"],
-        gold_standard=data["gold_standard"],
-        special_tests=[SpecialTest(**t) for t in data["special_tests"]],
-        treatment_plan=data["treatment_plan"],
-        manual_therapy=[ManualTherapyItem(**m) for m in data["manual_therapy"]],
-        exercise_protocol=[ExerciseItem(**e) for e in data["exercise_protocol"]],
-        progression_criteria=data["progression_criteria"],
-        contraindications=data["contraindications"],
-        recovery_timeline=data["recovery_timeline"],
-        citations=[Citation(**c) for c in data["citations"]],
-    )
+def parse_treatment_plan(response_text: str, provisional: bool = False) -> TreatmentPlanOutput:
+    """Parse a complete JSON plan from text, tolerating preamble and code fences."""
+    fields, _ = fields_from_text(response_text)
+    missing = missing_fields(fields)
+    if missing:
+        raise PlanOutputError(f"Treatment plan is missing fields: {', '.join(missing)}")
+    return TreatmentPlanOutput(**fields, provisional=provisional)
+
+
+async def continue_plan(prompt: Dict, fields: Dict, tier: Optional[ModelTier] = None) -> Dict:
+    """Request only the fields a truncated or invalid response is missing, up to PLAN_CONTINUATION_ATTEMPTS times.
+
+    Continuations run on the tier that generated the plan. Adds the recovered
+    fields to ``fields`` in place and returns it.
+    """
+    tier = tier or model_router.default()
+    for _ in range(settings.PLAN_CONTINUATION_ATTEMPTS):
+        missing = missing_fields(fields)
+        if not missing:
+            break
+        print(f"Plan incomplete, requesting the remaining fields: {', '.join(missing)}")
+        with tracer.span("llm_continuation", size=len(missing)):
+            message, tier = await model_router.generate(
+                tier, lambda t: generate(continuation_prompt(prompt, fields, missing), t))
+        prompt_usage.record(message.usage)
+        recovered = {k: v for k, v in extract_plan(message).fields.items() if k in missing}
+        plan_output_stats.record_continuation(message.usage.output_tokens, wasted=not recovered)
+        fields.update(recovered)
+    return fields
+
+
+async def plan_from_message(message, prompt: Dict, provisional: bool = False,
+                            tier: Optional[ModelTier] = None) -> TreatmentPlanOutput:
+    """Validate a generated plan, completing a truncated one with a continuation instead of regenerating it."""
+    with tracer.span("parse", size=message.usage.output_tokens):
+        extracted = extract_plan(message)
+    fields = dict(extracted.fields)
+    if extracted.dropped:
+        print(f"Dropped invalid plan fields: {', '.join(extracted.dropped)}")
+    complete = not missing_fields(fields)
+    if not complete:
+        await continue_plan(prompt, fields, tier)
+
+    missing = missing_fields(fields)
+    outcome = "failed" if missing else "clean" if extracted.clean else "repaired" if complete else "continued"
+    plan_output_stats.record(outcome, extracted.truncated, message.usage.output_tokens,
+                             kept_share(extracted.fields, extracted.raw_chars))
+    if missing:
+        raise PlanOutputError(f"Model response is missing fields after continuation: {', '.join(missing)}")
+    with tracer.span("validate"):
+        return TreatmentPlanOutput(**fields, provisional=provisional)
+
+
+def _traced_prompt(pt_input: PTInput, evidence: List[Dict]) -> Dict:
+    with tracer.span("prompt_build") as span:
+        prompt = build_prompt(pt_input, evidence)
+        span.size = prompt_tokens(prompt)
+    return prompt
+
+
+async def generate(prompt: Dict, tier: Optional[ModelTier] = None):
+    """Create the message over a stream so time to first token can be traced; returns the final Message.
+
+    ``tier`` (default: the router's default tier) sets the model and max_tokens.
+    """
+    tier = tier or model_router.default()
+    with tracer.span("llm_total") as span:
+        async with tier.client().messages.stream(
+            model=tier.model,
+            max_tokens=tier.max_tokens,
+            **prompt,
+        ) as stream:
+            async for event in stream:
+                if event.type == "content_block_delta":
+                    tracer.record("llm_ttft", time.perf_counter() - span.start)
+                    break
+            message = await stream.get_final_message()
+        span.size = message.usage.output_tokens
+    return message
+
+
+def _deadline(latency_slo_ms: Optional[float]) -> Optional[float]:
+    return time.perf_counter() + latency_slo_ms / 1000 if latency_slo_ms else None
+
+
+def _budget_ms(deadline: Optional[float]) -> Optional[float]:
+    """Milliseconds left before the request's latency SLO deadline, if it has one."""
+    return (deadline - time.perf_counter()) * 1000 if deadline is not None else None
+
+
+async def precompute_warm_plan(condition: str, healing_stage: HealingStage) -> Optional[WarmEntry]:
+    """Generate and store the baseline plan for a condition and healing stage on WARM_PLAN_TIER.
+
+    Stores nothing and returns None when the stored evidence for the baseline
+    query is insufficient; requests for it then run the live pipeline, which
+    ingests research.
+    """
+    query = baseline_query(condition, healing_stage)
+    retrieval = Retrieval(query, match_count=5)
+    evidence = await retrieval.search()
+    if await retrieval.needs_more_research():
+        print(f"Not enough evidence for a warm plan: {condition} ({healing_stage.value})")
+        return None
+    prompt = baseline_prompt(condition, healing_stage, evidence)
+    started = time.perf_counter()
+    message, tier = await model_router.generate(model_router.tiers[settings.WARM_PLAN_TIER],
+                                                lambda t: generate(prompt, t))
+    prompt_usage.record(message.usage)
+    plan = await plan_from_message(message, prompt, tier=tier)
+    entry = WarmEntry(condition, healing_stage.value, query, evidence_fingerprint(evidence), plan, tier.model,
+                      time.time(), round(time.perf_counter() - started, 3))
+    await warm_plans.put(entry)
+    return entry
+
+
+async def warm_evidence(pt_input: PTInput) -> Optional[Tuple[WarmEntry, List[Dict]]]:
+    """The warm plan entry for the input and its evidence, if there is one and its evidence is unchanged."""
+    entry = warm_plans.lookup(pt_input)
+    if entry is None:
+        return None
+    with tracer.span("warm_check") as span:
+        evidence = await Retrieval(entry.query, match_count=5).search()
+        span.size = len(evidence)
+    return (entry, evidence) if warm_plans.current(entry, evidence) else None
+
+
+async def warm_plan(pt_input: PTInput, entry: WarmEntry, evidence: List[Dict]) -> TreatmentPlanOutput:
+    """The entry's baseline plan with the fields this patient changes.
+
+    The baseline is generated without patient findings, so it is never
+    returned as is. Fields the adaptation drops as invalid or loses to
+    max_tokens keep their baseline value, so the result is always a complete plan.
+    """
+    tier = model_router.tiers[settings.WARM_PLAN_ADAPT_TIER]
+    prompt = adapt_prompt(pt_input, entry, evidence)
+    print(f"Adapting warm plan for {entry.condition} ({entry.healing_stage}), {tier}...")
+    message, tier = await model_router.generate(tier, lambda t: generate(prompt, t))
+    prompt_usage.record(message.usage)
+    with tracer.span("parse", size=message.usage.output_tokens):
+        changes = extract_plan(message)
+    if changes.dropped:
+        print(f"Dropped invalid plan fields, keeping the baseline: {', '.join(changes.dropped)}")
+    print(f"Adapted fields: {', '.join(changes.fields) or 'none'}")
+    warm_plans.adapted += 1
+    return entry.plan.model_copy(update=changes.fields)
+
+
+def _ttfub_ms(started: float) -> float:
+    """Time to first useful byte since ``started``, also recorded as the trace's ``ttfub`` stage."""
+    seconds = time.perf_counter() - started
+    tracer.record("ttfub", seconds)
+    return round(seconds * 1000, 1)
+
+
+def _plan_events(plan: TreatmentPlanOutput, started: float, **flags) -> Iterator[Dict]:
+    """Section events for a plan that is already complete, then ``done``."""
+    for i, (name, value) in enumerate(plan.model_dump(mode="json", exclude={"provisional"}).items()):
+        event = {"event": "section", "name": name, "value": value, **flags}
+        if i == 0:
+            event["ttfub_ms"] = _ttfub_ms(started)
+        yield event
+    yield {"event": "done", "sections": i + 1, "total_ms": round((time.perf_counter() - started) * 1000, 1)}
+
+
+async def run_rag_pipeline(pt_input: PTInput, ingest_policy: Optional[str] = None,
+                           latency_slo_ms: Optional[float] = None) -> TreatmentPlanOutput:
+    deadline = _deadline(latency_slo_ms)
+    warm = await warm_evidence(pt_input)
+    if warm is not None:
+        return await warm_plan(pt_input, *warm)
+    retrieval, provisional = await retrieve_evidence(pt_input, ingest_policy)
+    return await generate_plan(pt_input, retrieval, provisional, deadline)
+
+
+async def generate_plan(pt_input: PTInput, retrieval: Retrieval, provisional: bool = False,
+                        deadline: Optional[float] = None) -> TreatmentPlanOutput:
+    """Generate (or serve from the response cache) the plan for input whose evidence is retrieved.
+
+    The model tier is routed from the evidence, the input and the time left
+    before ``deadline`` (a perf_counter time).
+    """
+    evidence = retrieval.results
+
+    # Provisional plans are never cached: they predate the evidence being ingested
+    if not provisional:
+        with tracer.span("response_cache"):
+            cached = response_cache.get(pt_input, evidence, retrieval.embedding)
+        if cached is not None:
+            print("Serving treatment plan from response cache")
+            return cached
+
+    started = time.perf_counter()
+    route = model_router.route(pt_input, evidence, provisional, _budget_ms(deadline))
+    prompt = _traced_prompt(pt_input, evidence)
+    print(f"Calling Claude API, {route}...")
+
+    message, tier = await model_router.generate(route.tier, lambda t: generate(prompt, t))
+    prompt_usage.record(message.usage)
+
+    plan = await plan_from_message(message, prompt, provisional, tier)
+    # A degraded plan would otherwise be served for the cache TTL to requests routed to the full tier
+    if not provisional and not route.degraded(tier):
+        response_cache.put(pt_input, evidence, retrieval.embedding, plan, time.perf_counter() - started)
+    return plan
+
+
+async def stream_rag_pipeline(pt_input: PTInput, ingest_policy: Optional[str] = None,
+                              latency_slo_ms: Optional[float] = None) -> AsyncIterator[Dict]:
+    """Yield pipeline events: retrieval results, then each plan section as soon as it is complete.
+
+    Events are dicts with an ``event`` key: ``retrieval`` (evidence citations),
+    ``section`` (one validated TreatmentPlanOutput field), ``error`` and ``done``.
+    ``ttfub_ms`` on the first section is the time to first useful byte, also
+    recorded as the ``ttfub`` stage of the trace for /api/v1/metrics. Plans
+    from the warm plan store or the response cache arrive all at once, their
+    sections flagged ``warm`` or ``cached``.
+    """
+    started = time.perf_counter()
+    deadline = _deadline(latency_slo_ms)
+    warm = await warm_evidence(pt_input)
+    if warm is not None:
+        retrieval, provisional, evidence = None, False, warm[1]
+    else:
+        retrieval, provisional = await retrieve_evidence(pt_input, ingest_policy)
+        evidence = retrieval.results
+    yield {
+        "event": "retrieval",
+        "provisional": provisional,
+        "citations": [c.model_dump() for c in evidence_citations(order_evidence(evidence))],
+    }
+    if warm is not None:
+        for event in _plan_events(await warm_plan(pt_input, *warm), started, warm=True):
+            yield event
+        return
+
+    cached = None
+    if not provisional:
+        with tracer.span("response_cache"):
+            cached = response_cache.get(pt_input, evidence, retrieval.embedding)
+    if cached is not None:
+        print("Serving treatment plan from response cache")
+        for event in _plan_events(cached, started, cached=True):
+            yield event
+        return
+
+    route = model_router.route(pt_input, evidence, provisional, _budget_ms(deadline))
+    tier = route.tier
+    prompt = _traced_prompt(pt_input, evidence)
+    print(f"Streaming from Claude API, {route}...")
+
+    sections = 0
+    fell_back = False
+
+    def section_event(name: str, value) -> Dict:
+        nonlocal sections
+        event = {"event": "section", "name": name, "value": SECTION_VALIDATORS[name].dump_python(value, mode="json")}
+        if sections == 0:
+            event["ttfub_ms"] = _ttfub_ms(started)
+        sections += 1
+        return event
+
+    # A tier that fails before the first section is retried once on its fallback;
+    # once sections have been sent the error stands. For streams the tier
+    # timeout bounds each read rather than the whole generation.
+    while True:
+        parser = TopLevelFieldParser()
+        completed: Dict = {}
+        malformed = False
+        generation_started = time.perf_counter()
+        first_token = True
+        try:
+            with tracer.span("llm_total") as llm_span:
+                async with tier.client().messages.stream(
+                    model=tier.model,
+                    max_tokens=tier.max_tokens,
+                    **prompt,
+                ) as stream:
+                    async for delta in stream:
+                        # JSON arrives as text, or as the forced plan tool call's input
+                        if delta.type == "text":
+                            chunk = delta.text
+                        elif delta.type == "input_json":
+                            chunk = delta.partial_json
+                        else:
+                            continue
+                        if first_token:
+                            tracer.record("llm_ttft", time.perf_counter() - generation_started)
+                            first_token = False
+                        if malformed:
+                            continue
+                        try:
+                            closed = parser.feed(chunk)
+                        except ValueError:
+                            malformed = True
+                            continue
+                        for name, value in closed:
+                            validator = SECTION_VALIDATORS.get(name)
+                            if validator is None:
+                                continue
+                            try:
+                                value = validator.validate_python(value)
+                            except ValidationError as e:
+                                print(f"Invalid plan section {name}, will request it again: {e}")
+                                continue
+                            completed[name] = value
+                            yield section_event(name, value)
+                    message = await stream.get_final_message()
+                llm_span.size = message.usage.output_tokens
+            break
+        except Exception as e:
+            if sections or fell_back:
+                model_router.failed(tier, e)
+                raise
+            fallback = model_router.fallback(tier, e)
+            if fallback is None:
+                raise
+            tier, fell_back = fallback, True
+    model_router.record(tier, time.perf_counter() - generation_started, message.usage)
+    prompt_usage.record(message.usage)
+
+    # Sections cut off at max_tokens, malformed or invalid are requested again on their own
+    streamed = dict(completed)
+    if missing_fields(completed):
+        await continue_plan(prompt, completed, tier)
+        for name, value in completed.items():
+            if name not in streamed:
+                yield section_event(name, value)
+
+    missing = missing_fields(completed)
+    clean = (parser.finished and not malformed and message.stop_reason != "max_tokens"
+             and parser.buffer.lstrip().startswith("{") and not missing_fields(streamed))
+    outcome = "failed" if missing else "clean" if clean else "repaired" if not missing_fields(streamed) else "continued"
+    plan_output_stats.record(outcome, message.stop_reason == "max_tokens", message.usage.output_tokens,
+                             kept_share(streamed, len(parser.buffer)))
+    if missing:
+        yield {"event": "error", "detail": f"Model response is missing sections: {', '.join(missing)}"}
+    elif not provisional and not route.degraded(tier):
+        plan = TreatmentPlanOutput(**completed)
+        response_cache.put(pt_input, evidence, retrieval.embedding, plan, time.perf_counter() - generation_started)
+    yield {
+        "event": "done",
+        "sections": sections,
+        "total_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
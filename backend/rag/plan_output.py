@@ -0,0 +1,135 @@
+import json
+from functools import lru_cache
+from typing import Any, Dict, List, Tuple
+from pydantic import TypeAdapter, ValidationError
+from models.schemas import TreatmentPlanOutput
+from rag.json_stream import TopLevelFieldParser
+
+PLAN_TOOL_NAME = "submit_treatment_plan"
+
+# Validators for each generated field; ``provisional`` is set by the pipeline, not the model
+SECTION_VALIDATORS = {
+    name: TypeAdapter(field.annotation)
+    for name, field in TreatmentPlanOutput.model_fields.items() if name != "provisional"
+}
+PLAN_FIELDS = list(SECTION_VALIDATORS)
+
+
+class PlanOutputError(ValueError):
+    """The model's output could not be completed into a valid treatment plan."""
+
+
+@lru_cache(maxsize=1)
+def plan_tool() -> Dict:
+    """Tool whose input schema is TreatmentPlanOutput, for a forced tool call.
+
+    Top-level fields are not marked required: a continuation request reuses
+    this exact tool (keeping the prompt cache warm) to supply only the fields
+    a truncated response is missing. Completeness is checked on our side.
+    """
+    schema = TreatmentPlanOutput.model_json_schema()
+    input_schema = {
+        "type": "object",
+        "properties": {name: schema["properties"][name] for name in PLAN_FIELDS},
+    }
+    if "$defs" in schema:
+        input_schema["$defs"] = schema["$defs"]
+    return {
+        "name": PLAN_TOOL_NAME,
+        "description": "Submit the structured, evidence-based treatment plan.",
+        "input_schema": input_schema,
+    }
+
+
+class ExtractedPlan:
+    """Validated fields recovered from one model response, and what had to be dropped to get them.
+
+    ``clean`` means the response was one complete, valid object and nothing
+    was skipped, dropped or cut off.
+    """
+
+    def __init__(self, fields: Dict[str, Any], dropped: List[str], truncated: bool, clean: bool, raw_chars: int):
+        self.fields = fields
+        self.dropped = dropped
+        self.truncated = truncated
+        self.clean = clean
+        self.raw_chars = raw_chars
+
+
+def fields_from_text(text: str) -> Tuple[Dict[str, Any], bool]:
+    """Top-level fields that closed in possibly malformed or truncated JSON text; returns (fields, complete).
+
+    Preamble and code fences before the opening brace are skipped; parsing
+    stops at the first value that is not valid JSON.
+    """
+    parser = TopLevelFieldParser()
+    fields: Dict[str, Any] = {}
+    try:
+        for name, value in parser.feed(text):
+            fields[name] = value
+    except ValueError:
+        return fields, False
+    return fields, parser.finished
+
+
+def extract_plan(message) -> ExtractedPlan:
+    """Recover the plan fields from a Message, whether a forced tool call or JSON text."""
+    truncated = message.stop_reason == "max_tokens"
+    tool_call = next((block for block in message.content
+                      if block.type == "tool_use" and block.name == PLAN_TOOL_NAME), None)
+    if tool_call is not None:
+        raw = dict(tool_call.input) if isinstance(tool_call.input, dict) else {}
+        raw_chars = len(json.dumps(raw))
+        if truncated and raw:
+            # Partial tool input is parsed leniently, so the last field may be cut short
+            raw.pop(next(reversed(raw)))
+        clean = not truncated
+    else:
+        text = "".join(block.text for block in message.content if block.type == "text")
+        raw, complete = fields_from_text(text)
+        raw_chars = len(text)
+        clean = complete and not truncated and text.lstrip().startswith("{") and text.rstrip().endswith("}")
+
+    fields, dropped = {}, []
+    for name, value in raw.items():
+        validator = SECTION_VALIDATORS.get(name)
+        if validator is None:
+            continue
+        try:
+            fields[name] = validator.validate_python(value)
+        except ValidationError:
+            dropped.append(name)
+    return ExtractedPlan(fields, dropped, truncated, clean and not dropped, raw_chars)
+
+
+def missing_fields(fields: Dict[str, Any]) -> List[str]:
+    return [name for name in PLAN_FIELDS if name not in fields]
+
+
+def dump_fields(fields: Dict[str, Any]) -> Dict[str, Any]:
+    return {name: SECTION_VALIDATORS[name].dump_python(value, mode="json") for name, value in fields.items()}
+
+
+def kept_share(fields: Dict[str, Any], raw_chars: int) -> float:
+    """Approximate share of a response's output that ``fields`` account for."""
+    if not raw_chars:
+        return 0.0
+    return min(1.0, len(json.dumps(dump_fields(fields))) / raw_chars)
+
+
+def continuation_prompt(prompt: Dict, fields: Dict[str, Any], missing: List[str]) -> Dict:
+    """The original request plus an instruction to supply only the missing fields.
+
+    Everything before the instruction is unchanged, so the system prompt,
+    tool and evidence are read back from the prompt cache.
+    """
+    instruction = (
+        "Your previous response was cut off. These fields are already complete:\n"
+        f"{json.dumps(dump_fields(fields))}\n\n"
+        f"Provide only the remaining fields, consistent with them: {', '.join(missing)}."
+    )
+    message = prompt["messages"][0]
+    return {
+        **prompt,
+        "messages": [{**message, "content": message["content"] + [{"type": "text", "text": instruction}]}],
+    }
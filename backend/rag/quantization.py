@@ -0,0 +1,85 @@
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+# Rows encoded per step when quantizing or scoring, bounding the float32 temporaries
+BLOCK_ROWS = 8192
+# Columns written by store_documents next to the float embedding (sql/quantized_embeddings.sql)
+QUANTIZED_COLUMNS = ("embedding_bits", "embedding_int8", "embedding_scale")
+
+
+def binary_codes(vectors: np.ndarray) -> np.ndarray:
+    """Sign bits of each vector packed eight to a byte, first dimension in the high bit: (n, dim / 8) uint8.
+
+    The same bits as pgvector's ``binary_quantize``.
+    """
+    return np.packbits(np.asarray(vectors) > 0, axis=-1)
+
+
+def int8_codes(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Symmetric per-vector int8 codes and scales, so ``vector ≈ codes * scale``."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    scales = np.abs(vectors).max(axis=-1) / 127
+    scales[scales == 0] = 1.0
+    codes = np.rint(vectors / scales[..., None]).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def hamming_distances(codes: np.ndarray, query_code: np.ndarray) -> np.ndarray:
+    """Differing sign bits between each packed code and the query's."""
+    if codes.shape[-1] % 8 == 0:
+        # Eight bytes per XOR and popcount instead of one
+        codes, query_code = codes.view(np.uint64), query_code.view(np.uint64)
+    return np.bitwise_count(np.bitwise_xor(codes, query_code)).sum(axis=-1, dtype=np.uint16)
+
+
+def int8_scores(codes: np.ndarray, scales: np.ndarray, query: np.ndarray) -> np.ndarray:
+    """Approximate dot products of the quantized vectors with a float query.
+
+    NumPy has no BLAS path for int8, so codes are upcast a block at a time.
+    """
+    query = np.asarray(query, dtype=np.float32)
+    scores = np.empty(len(codes), dtype=np.float32)
+    for i in range(0, len(codes), BLOCK_ROWS):
+        scores[i:i + BLOCK_ROWS] = codes[i:i + BLOCK_ROWS].astype(np.float32) @ query
+    return scores * scales
+
+
+def quantized_columns(embeddings: List[List[float]]) -> List[Dict]:
+    """Quantized column values for research_documents rows, in PostgREST's text forms.
+
+    ``embedding_bits`` is a hex ``bit(n)`` literal and ``embedding_int8`` a
+    hex ``bytea``: about 1/80 and 1/10 of the float vector's JSON.
+    """
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    codes, scales = int8_codes(vectors)
+    return [
+        {"embedding_bits": "x" + bits.tobytes().hex(), "embedding_int8": "\\x" + code.tobytes().hex(),
+         "embedding_scale": float(scale)}
+        for bits, code, scale in zip(binary_codes(vectors), codes, scales)
+    ]
+
+
+def dequantize(value: str, scale: float) -> np.ndarray:
+    """A float vector from an ``embedding_int8`` bytea (as PostgREST returns it) and its scale."""
+    return np.frombuffer(bytes.fromhex(value[2:]), dtype=np.int8).astype(np.float32) * scale
+
+
+def document_vectors(docs: List[Dict]) -> Optional[np.ndarray]:
+    """L2-normalized vectors of RPC rows carrying ``embedding`` or ``embedding_int8``, None if none do.
+
+    Rows without either (e.g. lexical-only matches) get a zero vector, which
+    never counts as a duplicate.
+    """
+    from rag.vectorstore import parse_embedding
+
+    vectors = [
+        np.asarray(parse_embedding(d["embedding"]), dtype=np.float32) if d.get("embedding") is not None
+        else dequantize(d["embedding_int8"], d["embedding_scale"]) if d.get("embedding_int8") else None
+        for d in docs
+    ]
+    dim = next((len(v) for v in vectors if v is not None), 0)
+    if not dim:
+        return None
+    matrix = np.stack([v if v is not None else np.zeros(dim, dtype=np.float32) for v in vectors])
+    matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+    return matrix
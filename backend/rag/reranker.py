@@ -0,0 +1,138 @@
+import time
+from functools import lru_cache
+from typing import Dict, List, Optional
+import numpy as np
+from app.core.config import settings
+from ingestion.pedro import base_pmid
+from rag.vectorstore import EVIDENCE_LEVEL_PRIORITY
+
+# Source prior in [0, 1]; the PEDro-style filtered search only returns RCTs,
+# systematic reviews and guidelines
+SOURCE_PRIORITY = {
+    "PubMed (High Quality)": 1.0,
+    "PubMed": 0.0,
+}
+
+
+@lru_cache(maxsize=1024)
+def _year(value) -> int:
+    year = str(value or "")[:4]
+    return int(year) if year.isdigit() else 0
+
+
+def candidate_features(docs: List[Dict]) -> Dict[str, np.ndarray]:
+    """Per-candidate scoring inputs as arrays: evidence priority, year (0 if unknown), source prior."""
+    evidence, source, n = EVIDENCE_LEVEL_PRIORITY.get, SOURCE_PRIORITY.get, len(docs)
+    return {
+        "evidence": np.fromiter((evidence(d.get("evidence_level", "standard"), 0) for d in docs), np.float32, n) / 4,
+        "year": np.fromiter((_year(d.get("year")) for d in docs), np.float32, n),
+        "source": np.fromiter((source(d.get("source"), 0.0) for d in docs), np.float32, n),
+    }
+
+
+class Reranker:
+    """Scores a candidate pool in one pass of array arithmetic, then picks a diverse top-k.
+
+    The score is a weighted sum of cosine similarity, evidence priority, recency
+    (exponential decay in publication age with ``recency_half_life`` years;
+    0 when the year is unknown) and a source prior. Candidates that are the
+    same PubMed article under ``hq_`` and plain PMIDs are collapsed to the best
+    scoring one. When candidate embeddings are available, the top-k is chosen by
+    maximal marginal relevance with ``mmr_lambda`` and anything at or above
+    ``duplicate_similarity`` to an already chosen abstract is dropped.
+    """
+
+    def __init__(self, similarity: float = 0.7, evidence: float = 0.3, recency: float = 0.0,
+                 source: float = 0.0, recency_half_life: float = 10.0, mmr_lambda: float = 1.0,
+                 duplicate_similarity: float = 1.0):
+        self.similarity = similarity
+        self.evidence = evidence
+        self.recency = recency
+        self.source = source
+        self.recency_half_life = recency_half_life
+        self.mmr_lambda = mmr_lambda
+        self.duplicate_similarity = duplicate_similarity
+
+    def score(self, similarity: np.ndarray, features: Dict[str, np.ndarray]) -> np.ndarray:
+        scores = similarity * self.similarity + features["evidence"] * self.evidence
+        if self.recency:
+            age = np.maximum(time.gmtime().tm_year - features["year"], 0)
+            recency = np.where(features["year"] > 0, np.exp2(-age / self.recency_half_life), 0.0)
+            scores = scores + recency * self.recency
+        if self.source:
+            scores = scores + features["source"] * self.source
+        return scores
+
+    @property
+    def uses_embeddings(self) -> bool:
+        return self.mmr_lambda < 1 or self.duplicate_similarity < 1
+
+    def rerank(self, docs: List[Dict], match_count: int, similarity: Optional[np.ndarray] = None,
+               features: Optional[Dict[str, np.ndarray]] = None, embeddings: Optional[np.ndarray] = None,
+               rows: Optional[np.ndarray] = None, relevance: Optional[np.ndarray] = None) -> List[Dict]:
+        """Return the best ``match_count`` docs with their ``similarity`` and ``combined_score``.
+
+        ``similarity`` and ``features`` are aligned with ``docs`` and derived
+        from them when not given. ``relevance``, if given, takes the place of
+        similarity in the score, as when vector and lexical ranks are fused. ``embeddings`` are L2-normalized; row ``i``
+        belongs to ``docs[i]``, or to ``docs[j]`` where ``rows[j] == i`` when
+        ``rows`` is given, so an index can pass its whole matrix without copying
+        it. MMR is skipped without embeddings.
+        """
+        if not docs:
+            return []
+        if similarity is None:
+            similarity = np.fromiter((d.get("similarity", 0) for d in docs), np.float32, len(docs))
+        scores = self.score(similarity if relevance is None else relevance,
+                            features if features is not None else candidate_features(docs))
+
+        use_mmr = embeddings is not None and self.uses_embeddings
+        # MMR only needs the head of the ranking; the tail can never be picked
+        needed = max(match_count * 4, 20) if use_mmr else match_count
+
+        # Best first, keeping one row per underlying PubMed article
+        seen = set()
+        ranked = []
+        for i in np.argsort(-scores, kind="stable"):
+            key = base_pmid(str(docs[i].get("pmid", "")))
+            if key not in seen:
+                seen.add(key)
+                ranked.append(i)
+                if len(ranked) == needed:
+                    break
+
+        chosen = ranked
+        if use_mmr:
+            head = np.array(ranked)
+            vectors = embeddings[rows[head] if rows is not None else head]
+            chosen = head[self._mmr(scores[head], vectors, match_count)]
+
+        return [
+            {**docs[i], "similarity": float(similarity[i]), "combined_score": float(scores[i])}
+            for i in chosen[:match_count]
+        ]
+
+    def _mmr(self, relevance: np.ndarray, embeddings: np.ndarray, k: int) -> List[int]:
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        max_overlap = np.zeros(len(relevance), dtype=np.float32)
+        available = np.ones(len(relevance), dtype=bool)
+        selected: List[int] = []
+        while len(selected) < k and available.any():
+            mmr = self.mmr_lambda * relevance - (1 - self.mmr_lambda) * max_overlap
+            best = int(np.argmax(np.where(available, mmr, -np.inf)))
+            selected.append(best)
+            available[best] = False
+            max_overlap = np.maximum(max_overlap, embeddings @ embeddings[best])
+            available &= max_overlap < self.duplicate_similarity
+        return selected
+
+
+reranker = Reranker(
+    similarity=settings.RERANK_SIMILARITY_WEIGHT,
+    evidence=settings.RERANK_EVIDENCE_WEIGHT,
+    recency=settings.RERANK_RECENCY_WEIGHT,
+    source=settings.RERANK_SOURCE_WEIGHT,
+    recency_half_life=settings.RERANK_RECENCY_HALF_LIFE,
+    mmr_lambda=settings.RERANK_MMR_LAMBDA,
+    duplicate_similarity=settings.RERANK_DUPLICATE_SIMILARITY,
+)
@@ -0,0 +1,158 @@
+import hashlib
+import json
+from typing import Dict, List, Optional
+from cachetools import TTLCache
+from app.core.config import settings
+from models.schemas import PTInput, TreatmentPlanOutput
+from rag.embedding_cache import normalize_text
+from rag.vectorstore import evidence_fingerprint, store_listeners
+
+
+def pain_bucket(pain_level: int) -> str:
+    if pain_level <= 3:
+        return "mild"
+    if pain_level <= 6:
+        return "moderate"
+    return "severe"
+
+
+def canonical_input(pt_input: PTInput) -> Dict:
+    """PTInput with normalized text, sorted lower-cased lists and bucketed pain."""
+
+    def canonical_list(items: List[str]) -> List[str]:
+        return sorted({normalize_text(i) for i in items if i.strip()})
+
+    return {
+        "diagnosis": normalize_text(pt_input.diagnosis),
+        "healing_stage": pt_input.healing_stage.value,
+        "pain": pain_bucket(pt_input.pain_level),
+        "symptoms": canonical_list(pt_input.symptoms),
+        "functional_limitations": canonical_list(pt_input.functional_limitations),
+        "pain_with_movement": canonical_list(pt_input.pain_with_movement),
+        "tenderness_to_palpation": canonical_list(pt_input.tenderness_to_palpation),
+        "constraints": canonical_list(pt_input.constraints),
+    }
+
+
+def semantic_scope(canonical: Dict) -> str:
+    """Every clinical field but the diagnosis, which must match exactly before its wording may differ."""
+    return json.dumps({k: v for k, v in canonical.items() if k != "diagnosis"}, sort_keys=True)
+
+
+class CacheEntry:
+    def __init__(self, canonical: Dict, plan: TreatmentPlanOutput, fingerprint: str,
+                 embedding: Optional[List[float]], latency: float):
+        self.canonical = canonical
+        self.plan = plan
+        self.fingerprint = fingerprint
+        import numpy as np  # deferred: only needed once the first plan is cached
+
+        self.embedding = np.asarray(embedding, dtype=np.float32) if embedding is not None else None
+        self.latency = latency
+
+
+class ResponseCache:
+    """Cache of generated treatment plans for repeated clinical presentations.
+
+    The exact tier is keyed on the canonicalized PTInput. The optional semantic
+    tier reuses a plan whose query embedding is within ``semantic_distance``
+    (cosine) of the new one, provided every other clinical field (stage,
+    pain bucket, symptoms, limitations, pain with movement, tenderness and
+    constraints) matches, so only the diagnosis wording may differ. Both
+    tiers require an unchanged evidence set.
+    """
+
+    def __init__(self, maxsize: int = 256, ttl: float = 6 * 3600, semantic_distance: float = 0.0,
+                 enabled: bool = True):
+        self.enabled = enabled
+        self.entries: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.semantic_distance = semantic_distance
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.saved_latency = 0.0
+
+    @staticmethod
+    def key(canonical: Dict) -> str:
+        return hashlib.sha256(json.dumps(canonical, sort_keys=True).encode()).hexdigest()
+
+    def get(self, pt_input: PTInput, evidence: List[Dict],
+            embedding: Optional[List[float]] = None) -> Optional[TreatmentPlanOutput]:
+        if not self.enabled:
+            return None
+        canonical = canonical_input(pt_input)
+        fingerprint = evidence_fingerprint(evidence)
+
+        entry = self.entries.get(self.key(canonical))
+        if entry is not None and entry.fingerprint == fingerprint:
+            self.exact_hits += 1
+            self.saved_latency += entry.latency
+            return entry.plan
+
+        if self.semantic_distance > 0 and embedding is not None:
+            entry = self._nearest(canonical, fingerprint, embedding)
+            if entry is not None:
+                self.semantic_hits += 1
+                self.saved_latency += entry.latency
+                return entry.plan
+
+        self.misses += 1
+        return None
+
+    def _nearest(self, canonical: Dict, fingerprint: str, embedding: List[float]) -> Optional[CacheEntry]:
+        import numpy as np
+
+        scope = semantic_scope(canonical)
+        candidates = [
+            e for e in self.entries.values()
+            if e.embedding is not None and e.fingerprint == fingerprint and semantic_scope(e.canonical) == scope
+        ]
+        if not candidates:
+            return None
+        query = np.asarray(embedding, dtype=np.float32)
+        matrix = np.stack([e.embedding for e in candidates])
+        similarity = matrix @ query / (np.linalg.norm(matrix, axis=1) * np.linalg.norm(query) + 1e-12)
+        best = int(np.argmax(similarity))
+        return candidates[best] if 1 - similarity[best] <= self.semantic_distance else None
+
+    def put(self, pt_input: PTInput, evidence: List[Dict], embedding: Optional[List[float]],
+            plan: TreatmentPlanOutput, latency: float) -> None:
+        if not self.enabled:
+            return
+        canonical = canonical_input(pt_input)
+        self.entries[self.key(canonical)] = CacheEntry(
+            canonical, plan, evidence_fingerprint(evidence), embedding, latency
+        )
+
+    def invalidate(self, query_term: str, rows: Optional[List[Dict]] = None) -> int:
+        """Drop entries whose diagnosis matches a query term that just received new documents."""
+        term = normalize_text(query_term)
+        if not term:
+            return 0
+        stale = [
+            key for key, entry in list(self.entries.items())
+            if term in entry.canonical["diagnosis"] or entry.canonical["diagnosis"] in term
+        ]
+        for key in stale:
+            self.entries.pop(key, None)
+        return len(stale)
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.exact_hits + self.semantic_hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": (self.exact_hits + self.semantic_hits) / lookups if lookups else 0.0,
+            "saved_latency_s": round(self.saved_latency, 3),
+        }
+
+
+response_cache = ResponseCache(
+    enabled=settings.RESPONSE_CACHE_ENABLED,
+    maxsize=settings.RESPONSE_CACHE_SIZE,
+    ttl=settings.RESPONSE_CACHE_TTL,
+    semantic_distance=settings.RESPONSE_CACHE_SEMANTIC_DISTANCE,
+)
+store_listeners.append(response_cache.invalidate)
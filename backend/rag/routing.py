@@ -0,0 +1,308 @@
+import asyncio
+import time
+from collections import Counter, deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+from app.core.clients import get_anthropic_client
+from app.core.config import settings
+from app.core.tracing import percentile, tracer
+from models.schemas import PTInput
+from rag.vectorstore import MIN_RESULTS
+
+TIER_ORDER = ("fast", "standard", "deep")
+HIGH_QUALITY_LEVELS = {"systematic_review", "guideline", "rct"}
+# Transient Anthropic statuses worth trying on another model: rate limited,
+# server errors and 529 overloaded
+FALLBACK_STATUS_CODES = {429, 500, 502, 503, 504, 529}
+# USD per million input and output tokens; cache reads bill at 0.1x input, writes at 1.25x
+MODEL_PRICES = {
+    "claude-haiku-4-5": (1.0, 5.0),
+    "claude-sonnet-4-5": (3.0, 15.0),
+    "claude-opus-4-5": (5.0, 25.0),
+}
+# Message Batches bill at half the listed prices
+BATCH_PRICE_FACTOR = 0.5
+# Observed generations needed before a tier's own p50 replaces its configured estimate
+MIN_LATENCY_SAMPLES = 5
+
+
+class ModelTier:
+    """One generation tier: its model, output limit, deadline and the tier to fall back to."""
+
+    def __init__(self, name: str, model: str, max_tokens: int, timeout: float, expected_ms: float,
+                 fallback: Optional[str] = None):
+        self.name = name
+        self.model = model
+        self.max_tokens = max_tokens
+        self.timeout = timeout
+        self.expected_ms = expected_ms
+        self.fallback = fallback or None
+
+    def __str__(self) -> str:
+        return f"{self.name} tier ({self.model})"
+
+    def client(self):
+        """The shared Anthropic client with this tier's timeout.
+
+        A tier with a fallback does not retry itself: trying the other model
+        is faster than backing off on an overloaded one.
+        """
+        options = {"timeout": self.timeout}
+        if self.fallback:
+            options["max_retries"] = 0
+        return get_anthropic_client().with_options(**options)
+
+
+class Route:
+    """A routing decision: the tier, and the signals that chose it."""
+
+    def __init__(self, tier: ModelTier, evidence: str, complexity: int, reasons: List[str],
+                 stepped_down: bool = False):
+        self.tier = tier
+        self.evidence = evidence
+        self.complexity = complexity
+        self.reasons = reasons
+        self.stepped_down = stepped_down
+
+    def degraded(self, tier: ModelTier) -> bool:
+        """Whether a plan from ``tier`` is below what the input routes to: stepped down for the budget, or a fallback."""
+        return self.stepped_down or tier is not self.tier
+
+    def __str__(self) -> str:
+        return f"{self.tier}: {', '.join(self.reasons)}"
+
+
+def input_complexity(pt_input: PTInput) -> int:
+    """One point for each sign that a presentation needs more than the textbook plan."""
+    return sum((
+        len(pt_input.symptoms) > 3,
+        len(pt_input.functional_limitations) > 3,
+        len(pt_input.pain_with_movement) > 2,
+        len(pt_input.tenderness_to_palpation) > 2,
+        bool(pt_input.constraints),
+        pt_input.pain_level >= 8,
+    ))
+
+
+def evidence_strength(evidence: List[Dict], strong_share: float = 0.6) -> str:
+    """``strong``, ``moderate`` or ``weak``, from the share of systematic reviews and RCTs retrieved."""
+    if len(evidence) < MIN_RESULTS:
+        return "weak"
+    high_quality = sum(d.get("evidence_level") in HIGH_QUALITY_LEVELS for d in evidence) / len(evidence)
+    if high_quality >= strong_share:
+        return "strong"
+    return "moderate" if high_quality > 0 else "weak"
+
+
+def message_cost(model: str, usage, batch: bool = False) -> float:
+    """USD cost of one message's usage (``batch`` for a Message Batches result), 0.0 for a model without a listed price."""
+    if model not in MODEL_PRICES:
+        return 0.0
+    input_price, output_price = MODEL_PRICES[model]
+    input_cost = ((usage.input_tokens or 0)
+                  + 0.1 * (getattr(usage, "cache_read_input_tokens", None) or 0)
+                  + 1.25 * (getattr(usage, "cache_creation_input_tokens", None) or 0)) * input_price
+    cost = (input_cost + (usage.output_tokens or 0) * output_price) / 1e6
+    return cost * BATCH_PRICE_FACTOR if batch else cost
+
+
+def fallback_reason(error: BaseException) -> Optional[str]:
+    """``timeout`` or ``overloaded`` if the error is worth retrying on another tier, else None."""
+    if isinstance(error, asyncio.TimeoutError):
+        return "timeout"
+    # Deferred: anthropic is kept off the import path of main, and is loaded by the time a call fails
+    import anthropic
+    if isinstance(error, anthropic.APITimeoutError):
+        return "timeout"
+    if isinstance(error, anthropic.APIConnectionError):
+        return "overloaded"
+    if isinstance(error, anthropic.APIStatusError) and error.status_code in FALLBACK_STATUS_CODES:
+        return "overloaded"
+    return None
+
+
+class TierStats:
+    """Latency, token and cost totals of the generations one tier served."""
+
+    def __init__(self, window: int = 200):
+        self.latencies: Deque[float] = deque(maxlen=window)
+        self.generations = 0
+        self.batch_generations = 0
+        self.input_tokens = 0
+        self.cache_read_input_tokens = 0
+        self.cache_creation_input_tokens = 0
+        self.output_tokens = 0
+        self.cost_usd = 0.0
+        self.failures: Counter = Counter()
+
+    def record(self, seconds: Optional[float], model: str, usage, batch: bool = False) -> None:
+        """Add one generation; Message Batches results (``batch``) have no latency worth routing on."""
+        if batch:
+            self.batch_generations += 1
+        else:
+            self.latencies.append(seconds)
+        self.generations += 1
+        self.input_tokens += usage.input_tokens or 0
+        self.cache_read_input_tokens += getattr(usage, "cache_read_input_tokens", None) or 0
+        self.cache_creation_input_tokens += getattr(usage, "cache_creation_input_tokens", None) or 0
+        self.output_tokens += usage.output_tokens or 0
+        self.cost_usd += message_cost(model, usage, batch)
+
+    def percentile_ms(self, q: float) -> Optional[float]:
+        """Nearest-rank latency percentile, as the tracing metrics compute it."""
+        return percentile(sorted(self.latencies), q) * 1000 if self.latencies else None
+
+    def p50_ms(self) -> Optional[float]:
+        return self.percentile_ms(0.50)
+
+    def stats(self) -> Dict[str, float]:
+        p50, p95 = self.p50_ms(), self.percentile_ms(0.95)
+        return {
+            "generations": self.generations,
+            "batch_generations": self.batch_generations,
+            "p50_ms": round(p50, 1) if p50 is not None else None,
+            "p95_ms": round(p95, 1) if p95 is not None else None,
+            "input_tokens": self.input_tokens,
+            "cache_read_input_tokens": self.cache_read_input_tokens,
+            "cache_creation_input_tokens": self.cache_creation_input_tokens,
+            "output_tokens": self.output_tokens,
+            "cost_usd": round(self.cost_usd, 4),
+            "cost_per_generation_usd": round(self.cost_usd / self.generations, 5) if self.generations else None,
+            "timeouts": self.failures["timeout"],
+            "overloaded": self.failures["overloaded"],
+            "errors": self.failures["error"],
+        }
+
+
+class ModelRouter:
+    """Chooses the generation tier per request and falls back when a tier fails.
+
+    With routing enabled, weak or sparse evidence (or a provisional answer)
+    and complex input go to the deep tier, strong systematic review/RCT
+    evidence for a simple presentation goes to the fast tier, and everything
+    else to the standard tier. A latency budget (the X-Latency-SLO-Ms header
+    less the time already spent) then steps down to the most capable tier
+    whose p50 fits. With routing disabled every plan uses the default tier.
+    Either way a timeout or overload is retried once on the tier's fallback.
+    """
+
+    def __init__(self, tiers: Dict[str, ModelTier], enabled: bool = False, default_tier: str = "deep",
+                 strong_evidence_share: float = 0.6, complex_input: int = 2):
+        self.tiers = tiers
+        self.enabled = enabled
+        self.default_tier = default_tier
+        self.strong_evidence_share = strong_evidence_share
+        self.complex_input = complex_input
+        self.tier_stats = {name: TierStats() for name in tiers}
+        self.routes: Counter = Counter()
+        self.fallbacks: Counter = Counter()
+
+    def default(self) -> ModelTier:
+        return self.tiers[self.default_tier]
+
+    def expected_ms(self, tier: ModelTier) -> float:
+        """The tier's observed p50 generation time, or its configured estimate until there are enough samples."""
+        stats = self.tier_stats[tier.name]
+        return stats.p50_ms() if len(stats.latencies) >= MIN_LATENCY_SAMPLES else tier.expected_ms
+
+    def route(self, pt_input: PTInput, evidence: List[Dict], provisional: bool = False,
+              budget_ms: Optional[float] = None) -> Route:
+        evidence_level = "weak" if provisional else evidence_strength(evidence, self.strong_evidence_share)
+        complexity = input_complexity(pt_input)
+        if not self.enabled:
+            route = Route(self.default(), evidence_level, complexity, ["routing disabled"])
+            self.routes[route.tier.name] += 1
+            return route
+
+        if evidence_level == "weak":
+            name, reasons = "deep", ["provisional evidence" if provisional else "weak evidence"]
+        elif complexity >= self.complex_input:
+            name, reasons = "deep", [f"complex input ({complexity})"]
+        elif evidence_level == "strong" and complexity == 0:
+            name, reasons = "fast", ["strong evidence", "simple input"]
+        else:
+            name, reasons = "standard", [f"{evidence_level} evidence", f"input complexity {complexity}"]
+
+        stepped_down = False
+        if budget_ms is not None:
+            position = TIER_ORDER.index(name)
+            while position > 0 and self.expected_ms(self.tiers[TIER_ORDER[position]]) > budget_ms:
+                position -= 1
+            if TIER_ORDER[position] != name:
+                name, stepped_down = TIER_ORDER[position], True
+                reasons.append(f"latency budget {budget_ms:.0f} ms")
+        route = Route(self.tiers[name], evidence_level, complexity, reasons, stepped_down)
+        self.routes[name] += 1
+        return route
+
+    def failed(self, tier: ModelTier, error: BaseException) -> Optional[str]:
+        """Record a failed generation; returns its fallback reason."""
+        reason = fallback_reason(error)
+        self.tier_stats[tier.name].failures[reason or "error"] += 1
+        return reason
+
+    def fallback(self, tier: ModelTier, error: BaseException) -> Optional[ModelTier]:
+        """Record a failed generation; return the tier to retry on, if the failure is transient and one is set."""
+        reason = self.failed(tier, error)
+        if reason is None or not tier.fallback:
+            return None
+        fallback = self.tiers[tier.fallback]
+        self.fallbacks[f"{tier.name}->{fallback.name}"] += 1
+        print(f"Falling back from the {tier} to the {fallback}: {reason}")
+        return fallback
+
+    def record(self, tier: ModelTier, seconds: float, usage) -> None:
+        """Record a completed generation, also as an ``llm_<tier>`` stage of the current trace."""
+        self.tier_stats[tier.name].record(seconds, tier.model, usage)
+        tracer.record(f"llm_{tier.name}", seconds, size=usage.output_tokens)
+
+    def record_batch(self, tier: ModelTier, usage) -> None:
+        """Record the tokens and cost of a Message Batches result; its latency is the batch's, not the model's."""
+        self.tier_stats[tier.name].record(None, tier.model, usage, batch=True)
+
+    async def generate(self, tier: ModelTier, create: Callable[[ModelTier], Awaitable]) -> Tuple[object, ModelTier]:
+        """Run ``create(tier)`` within the tier's deadline, once more on its fallback if it times out or is overloaded.
+
+        ``create`` returns an Anthropic Message; returns it with the tier that produced it.
+        """
+        started = time.perf_counter()
+        try:
+            message = await asyncio.wait_for(create(tier), tier.timeout)
+        except Exception as e:
+            fallback = self.fallback(tier, e)
+            if fallback is None:
+                raise
+            tier, started = fallback, time.perf_counter()
+            try:
+                message = await asyncio.wait_for(create(tier), tier.timeout)
+            except Exception as e:
+                self.failed(tier, e)
+                raise
+        self.record(tier, time.perf_counter() - started, message.usage)
+        return message, tier
+
+    def stats(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "routes": dict(self.routes),
+            "fallbacks": dict(self.fallbacks),
+            "tiers": {
+                name: {"model": tier.model, "max_tokens": tier.max_tokens, "timeout_s": tier.timeout,
+                       **self.tier_stats[name].stats()}
+                for name, tier in self.tiers.items()
+            },
+        }
+
+
+model_router = ModelRouter(
+    {
+        "fast": ModelTier("fast", settings.FAST_MODEL, settings.FAST_MAX_TOKENS, settings.FAST_TIMEOUT,
+                          settings.FAST_EXPECTED_MS, settings.FAST_FALLBACK),
+        "standard": ModelTier("standard", settings.STANDARD_MODEL, settings.STANDARD_MAX_TOKENS,
+                              settings.STANDARD_TIMEOUT, settings.STANDARD_EXPECTED_MS, settings.STANDARD_FALLBACK),
+        "deep": ModelTier("deep", settings.DEEP_MODEL, settings.DEEP_MAX_TOKENS, settings.DEEP_TIMEOUT,
+                          settings.DEEP_EXPECTED_MS, settings.DEEP_FALLBACK),
+    },
+    enabled=settings.MODEL_ROUTING_ENABLED,
+    strong_evidence_share=settings.ROUTING_STRONG_EVIDENCE_SHARE,
+    complex_input=settings.ROUTING_COMPLEX_INPUT,
+)
@@ -0,0 +1,92 @@
+from typing import Dict
+
+
+class PromptUsage:
+    """Running totals of Anthropic token usage, including prompt-cache reads and writes."""
+
+    def __init__(self):
+        self.requests = 0
+        self.input_tokens = 0
+        self.cache_read_input_tokens = 0
+        self.cache_creation_input_tokens = 0
+        self.output_tokens = 0
+
+    def record(self, usage) -> None:
+        self.requests += 1
+        self.input_tokens += usage.input_tokens or 0
+        self.cache_read_input_tokens += getattr(usage, "cache_read_input_tokens", None) or 0
+        self.cache_creation_input_tokens += getattr(usage, "cache_creation_input_tokens", None) or 0
+        self.output_tokens += usage.output_tokens or 0
+        print(f"Token usage: input={usage.input_tokens} "
+              f"cache_read={getattr(usage, 'cache_read_input_tokens', 0)} "
+              f"cache_write={getattr(usage, 'cache_creation_input_tokens', 0)} "
+              f"output={usage.output_tokens}")
+
+    def stats(self) -> Dict[str, float]:
+        prompt_tokens = self.input_tokens + self.cache_read_input_tokens + self.cache_creation_input_tokens
+        return {
+            "requests": self.requests,
+            "input_tokens": self.input_tokens,
+            "cache_read_input_tokens": self.cache_read_input_tokens,
+            "cache_creation_input_tokens": self.cache_creation_input_tokens,
+            "output_tokens": self.output_tokens,
+            "cache_read_ratio": self.cache_read_input_tokens / prompt_tokens if prompt_tokens else 0.0,
+        }
+
+
+prompt_usage = PromptUsage()
+
+
+class PlanOutputStats:
+    """How often generated plans needed repair, continuation or failed, and the output tokens that cost.
+
+    Outcomes: ``clean`` (valid as returned), ``repaired`` (complete once
+    preamble, fences or invalid fields were dropped), ``continued`` (missing
+    fields supplied by a continuation request) and ``failed`` (still incomplete).
+    ``wasted_output_tokens`` estimates output that was generated but discarded;
+    ``regeneration_avoided_tokens`` is output kept from truncated responses
+    that a full retry would have generated again.
+    """
+
+    OUTCOMES = ("clean", "repaired", "continued", "failed")
+
+    def __init__(self):
+        self.outcomes = {outcome: 0 for outcome in self.OUTCOMES}
+        self.truncated = 0
+        self.continuation_requests = 0
+        self.continuation_output_tokens = 0
+        self.wasted_output_tokens = 0
+        self.regeneration_avoided_tokens = 0
+
+    def record(self, outcome: str, truncated: bool, output_tokens: int, kept_share: float) -> None:
+        self.outcomes[outcome] += 1
+        self.truncated += truncated
+        if outcome == "failed":
+            self.wasted_output_tokens += output_tokens
+        else:
+            self.wasted_output_tokens += round(output_tokens * (1 - kept_share))
+            if outcome == "continued":
+                self.regeneration_avoided_tokens += round(output_tokens * kept_share)
+
+    def record_continuation(self, output_tokens: int, wasted: bool) -> None:
+        self.continuation_requests += 1
+        self.continuation_output_tokens += output_tokens
+        if wasted:
+            self.wasted_output_tokens += output_tokens
+
+    def stats(self) -> Dict[str, float]:
+        plans = sum(self.outcomes.values())
+        return {
+            "plans": plans,
+            **self.outcomes,
+            "truncated": self.truncated,
+            "failure_rate": self.outcomes["failed"] / plans if plans else 0.0,
+            "repair_rate": (self.outcomes["repaired"] + self.outcomes["continued"]) / plans if plans else 0.0,
+            "continuation_requests": self.continuation_requests,
+            "continuation_output_tokens": self.continuation_output_tokens,
+            "wasted_output_tokens": self.wasted_output_tokens,
+            "regeneration_avoided_tokens": self.regeneration_avoided_tokens,
+        }
+
+
+plan_output_stats = PlanOutputStats()
@@ -1,79 +1,368 @@
-from typing import List, Dict
-from supabase import create_client
+import hashlib
+import json
+from typing import Callable, List, Dict, Optional, Tuple
+from app.core.clients import get_supabase
 from app.core.config import settings
+from app.core.tracing import tracer
+from ingestion.pedro import base_pmid, pmid_variants
 from rag.embeddings import embed_texts, embed_query
 
-supabase = create_client(settings.SUPABASE_URL, settings.SUPABASE_KEY)
-
 SIMILARITY_THRESHOLD = 0.5
 MIN_RESULTS = 3
 
 EVIDENCE_LEVEL_PRIORITY = {
     "systematic_review": 4,
+    "guideline": 4,  # from the Practice Guideline publication type only
     "rct": 3,
     "clinical_trial": 2,
     "observational": 1,
     "standard": 0,
 }
 
+# Callbacks run with (query_term, rows) after new rows are stored, so in-process
+# caches and indexes can refresh or invalidate themselves
+store_listeners: List[Callable[[str, List[Dict]], None]] = []
+
+
+def parse_embedding(value) -> List[float]:
+    # pgvector columns come back from PostgREST as "[0.1,0.2,...]" strings
+    return json.loads(value) if isinstance(value, str) else value
+
+
+def evidence_fingerprint(evidence: List[Dict]) -> str:
+    """Stable hash of an evidence set, independent of ranking order."""
+    pmids = sorted(str(doc.get("pmid") or doc.get("id")) for doc in evidence)
+    return hashlib.sha256("|".join(pmids).encode()).hexdigest()[:16]
+
+
+def _notify_stored(query_term: str, rows: List[Dict]) -> None:
+    for listener in store_listeners:
+        try:
+            listener(query_term, rows)
+        except Exception as e:
+            print(f"Store listener error: {e}")
+
+
+def _document_row(article: Dict, embedding: List[float], query_term: str) -> Dict:
+    return {
+        "pmid": article["pmid"],
+        "title": article["title"],
+        "abstract": article["abstract"],
+        "authors": article["authors"],
+        "year": article["year"],
+        "url": article["url"],
+        "source": article.get("source", "PubMed"),
+        "embedding": embedding,
+        "query_term": article.get("query_term") or query_term,
+        "evidence_level": article.get("evidence_level", "standard"),
+        "source_db": article.get("source", "pubmed").lower(),
+    }
+
+
+async def store_documents(articles: List[Dict], query_term: str = "", batch_size: Optional[int] = None) -> Dict[str, int]:
+    """Embed and store research articles in Supabase vector store.
+
+    ``query_term`` applies to articles that do not carry their own ``query_term`` key.
+
+    An article is known if it is stored under either its plain or its ``hq_``
+    PMID, so the other variant of a stored article is skipped rather than
+    inserted as a duplicate.
+
+    Each batch costs one ``in_`` lookup for known PMIDs, one embedding call for
+    the new articles only, and one bulk upsert. With QUANTIZED_EMBEDDINGS_ENABLED
+    each row also carries its vector's sign bits and int8 codes. With CHUNK_INDEX_ENABLED the
+    articles' passages are embedded in the same call and upserted to
+    research_chunks, one more round-trip; if that fails the batch's new
+    documents are deleted again, so a later ingest stores them with their
+    passages instead of skipping them as known. Returns stored/skipped/failed
+    counts plus the number of passages, embedding calls and DB round-trips made.
+    """
+    from postgrest import ReturnMethod  # deferred with the clients, see app.core.clients
+
+    batch_size = batch_size or settings.STORE_BATCH_SIZE
+    counts = {"stored": 0, "skipped": 0, "failed": 0, "embed_calls": 0, "db_calls": 0, "chunks": 0}
+
+    # Collapse duplicates within the input, across the hq_ prefix, before touching the network
+    unique: Dict[str, Dict] = {}
+    for article in articles:
+        pmid = base_pmid(article["pmid"])
+        if pmid in unique:
+            counts["skipped"] += 1
+        else:
+            unique[pmid] = article
+    pending = list(unique.values())
+
+    for i in range(0, len(pending), batch_size):
+        batch = pending[i:i + batch_size]
+        new_articles = batch
+        try:
+            existing = await get_supabase().table("research_documents").select("pmid").in_(
+                "pmid", [variant for a in batch for variant in pmid_variants(a["pmid"])]
+            ).execute()
+            counts["db_calls"] += 1
+            known = {base_pmid(row["pmid"]) for row in existing.data}
+            new_articles = [a for a in batch if base_pmid(a["pmid"]) not in known]
+            counts["skipped"] += len(batch) - len(new_articles)
+            if not new_articles:
+                continue
+
+            # Documents and their passages share one embedding call
+            chunks, chunk_texts = _chunk_articles(new_articles) if settings.CHUNK_INDEX_ENABLED else ([], [])
+            embeddings = await embed_texts([f"{a['title']}. {a['abstract']}" for a in new_articles] + chunk_texts)
+            counts["embed_calls"] += 1
+            rows = [_document_row(a, e, query_term) for a, e in zip(new_articles, embeddings)]
+            if settings.QUANTIZED_EMBEDDINGS_ENABLED:
+                from rag.quantization import quantized_columns  # deferred: needs numpy
+                for row, columns in zip(rows, quantized_columns(embeddings[:len(rows)])):
+                    row.update(columns)
+            await get_supabase().table("research_documents").upsert(
+                rows, on_conflict="pmid", ignore_duplicates=True, returning=ReturnMethod.minimal
+            ).execute()
+            counts["db_calls"] += 1
+            if chunks:
+                # Chunks reference their documents, so they can only be written second
+                try:
+                    await _upsert_chunks(chunks, embeddings[len(new_articles):])
+                except Exception:
+                    # A stored document without passages would be skipped as known by every later ingest
+                    await _delete_documents([row["pmid"] for row in rows])
+                    counts["db_calls"] += 2
+                    raise
+                counts["db_calls"] += 1
+                counts["chunks"] += len(chunks)
+            counts["stored"] += len(rows)
+            for term in {row["query_term"] for row in rows}:
+                _notify_stored(term, [row for row in rows if row["query_term"] == term])
+        except Exception as e:
+            print(f"Error storing batch of {len(batch)} documents: {e}")
+            counts["failed"] += len(new_articles)
+
+    print(f"Stored {counts['stored']} new documents in vector store "
+          f"({counts['skipped']} already stored, {counts['failed']} failed)")
+    return counts
+
+
+def _chunk_articles(articles: List[Dict]) -> Tuple[List[Dict], List[str]]:
+    from rag.chunking import chunk_article, chunk_embedding_text
+
+    chunks, texts = [], []
+    for article in articles:
+        for chunk in chunk_article(article):
+            chunks.append(chunk)
+            texts.append(chunk_embedding_text(article, chunk))
+    return chunks, texts
+
+
+async def _delete_documents(pmids: List[str]) -> None:
+    """Remove documents whose passages failed to store (their chunks cascade)."""
+    try:
+        await get_supabase().table("research_documents").delete().in_("pmid", pmids).execute()
+    except Exception as e:
+        print(f"Error removing {len(pmids)} documents without passages, backfill_chunks.py will chunk them: {e}")
+
+
+async def _upsert_chunks(chunks: List[Dict], embeddings: List[List[float]]) -> None:
+    from postgrest import ReturnMethod
+
+    rows = [{**chunk, "embedding": embedding} for chunk, embedding in zip(chunks, embeddings)]
+    await get_supabase().table("research_chunks").upsert(
+        rows, on_conflict="pmid,chunk_index", ignore_duplicates=True, returning=ReturnMethod.minimal
+    ).execute()
 
-def store_documents(articles: List[Dict], query_term: str = "") -> None:
-    """Embed and store research articles in Supabase vector store."""
-    texts = [f"{a['title']}. {a['abstract']}" for a in articles]
-    embeddings = embed_texts(texts)
-
-    stored = 0
-    for article, embedding in zip(articles, embeddings):
-        # Check if article already exists by pmid
-        existing = supabase.table("research_documents").select("id").eq("pmid", article["pmid"]).execute()
-        if existing.data:
-            continue
-
-        supabase.table("research_documents").insert({
-            "pmid": article["pmid"],
-            "title": article["title"],
-            "abstract": article["abstract"],
-            "authors": article["authors"],
-            "year": article["year"],
-            "url": article["url"],
-            "source": article.get("source", "PubMed"),
-            "embedding": embedding,
-            "query_term": query_term,
-            "evidence_level": article.get("evidence_level", "standard"),
-            "source_db": article.get("source", "pubmed").lower(),
-        }).execute()
-        stored += 1
-
-    print(f"Stored {stored} new documents in vector store")
-
-
-def search_similar(query: str, match_count: int = 5) -> List[Dict]:
-    """Search for similar documents using cosine similarity, ranked by evidence quality."""
-    query_embedding = embed_query(query)
 
-    result = supabase.rpc("match_research_documents", {
-        "query_embedding": query_embedding,
-        "match_count": match_count * 2,  # Fetch more, then re-rank
-    }).execute()
+async def store_chunks(articles: List[Dict]) -> int:
+    """Chunk, embed and store passages for articles already in research_documents; returns the count."""
+    chunks, texts = _chunk_articles(articles)
+    if chunks:
+        await _upsert_chunks(chunks, await embed_texts(texts))
+    return len(chunks)
 
-    docs = result.data
 
-    # Re-rank by combining similarity score with evidence level priority
-    for doc in docs:
-        similarity = doc.get("similarity", 0)
-        evidence_priority = EVIDENCE_LEVEL_PRIORITY.get(doc.get("evidence_level", "standard"), 0)
-        # Weighted score: 70% similarity, 30% evidence quality
-        doc["combined_score"] = (similarity * 0.7) + (evidence_priority / 4 * 0.3)
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> Dict[str, float]:
+    """Reciprocal rank fusion of best-first PMID rankings: the sum of 1 / (k + rank) per PMID.
 
-    # Sort by combined score and return top match_count
-    docs.sort(key=lambda x: x["combined_score"], reverse=True)
-    return docs[:match_count]
+    Scaled to [0, 1], where 1 is first place in every ranking, so the fused
+    score can stand in for cosine similarity in the re-ranker.
+    """
+    scale = (k + 1) / len(rankings) if rankings else 1.0
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, pmid in enumerate(ranking, 1):
+            scores[pmid] = scores.get(pmid, 0.0) + scale / (k + rank)
+    return scores
+
+
+def fuse_candidates(vector_docs: List[Dict], lexical_docs: List[Dict]) -> Tuple[List[Dict], List[float]]:
+    """Union of vector and lexical candidates, with each one's fused rank score.
+
+    A document found both ways keeps the vector row (its similarity and
+    embedding) plus its ``lexical_score``.
+    """
+    vector_docs = sorted(vector_docs, key=lambda d: d.get("similarity", 0), reverse=True)
+    fused = reciprocal_rank_fusion(
+        [[d["pmid"] for d in vector_docs], [d["pmid"] for d in lexical_docs]], settings.RRF_K
+    )
+    docs = {d["pmid"]: d for d in lexical_docs}
+    for doc in vector_docs:
+        docs[doc["pmid"]] = {**docs.get(doc["pmid"], {}), **doc}
+    return list(docs.values()), [fused[pmid] for pmid in docs]
+
+
+def rerank(docs: List[Dict], match_count: int, relevance: Optional[List[float]] = None) -> List[Dict]:
+    """Re-rank RPC candidates by similarity, evidence level and the other configured signals.
+
+    See rag.reranker. ``relevance``, aligned with ``docs``, replaces similarity
+    in the score (e.g. a fused rank score). MMR de-duplication applies when the
+    rows carry their embeddings or int8 codes.
+    """
+    # Deferred: the reranker needs numpy, which is kept off the import path of main
+    import numpy as np
+    from rag.quantization import QUANTIZED_COLUMNS, document_vectors
+    from rag.reranker import reranker
+
+    # Float vectors or, from the quantized RPC, int8 codes; lexical-only candidates have neither
+    embeddings = document_vectors(docs) if reranker.uses_embeddings else None
+    if embeddings is not None:
+        docs = [{k: v for k, v in d.items() if k != "embedding" and k not in QUANTIZED_COLUMNS} for d in docs]
+    return reranker.rerank(docs, match_count, embeddings=embeddings,
+                           relevance=None if relevance is None else np.asarray(relevance, dtype=np.float32))
+
+
+class Retrieval:
+    """Query plan for one request: embeds the query once and reuses it for every search.
+
+    The sufficiency check and the final evidence list share one candidate set;
+    after dynamic ingestion only the RPC is re-run, never the embedding. With
+    CHUNK_INDEX_ENABLED the search runs over passages, and each result
+    document carries its matching ``passages``. With LEXICAL_INDEX_ENABLED the
+    document-level candidates are fused with BM25 matches, and the sufficiency
+    check is first put to the lexical index, which needs no embedding.
+    ``embed_calls`` and ``rpc_calls`` count the round-trips made by this request;
+    ``local_searches`` counts searches answered by the in-process index instead,
+    and ``lexical_searches`` the BM25 lookups.
+    """
+
+    def __init__(self, query: str, match_count: int = 5):
+        self.query = query
+        self.match_count = match_count
+        self.embedding: Optional[List[float]] = None
+        self.results: Optional[List[Dict]] = None
+        self.embed_calls = 0
+        self.rpc_calls = 0
+        self.local_searches = 0
+        self.lexical_searches = 0
+
+    async def search(self) -> List[Dict]:
+        """Return the re-ranked evidence, computing it on first use."""
+        if self.results is None:
+            await self.refresh()
+        return self.results
+
+    async def refresh(self) -> List[Dict]:
+        """Re-run the vector RPC (e.g. after new documents were stored)."""
+        if self.embedding is None:
+            with tracer.span("embed", size=len(self.query)):
+                self.embedding = await embed_query(self.query)
+            self.embed_calls += 1
+
+        if settings.CHUNK_INDEX_ENABLED:
+            self.results = await self._search_passages()
+            return self.results
+
+        lexical = self._lexical_candidates()
+        if settings.LOCAL_INDEX_ENABLED:
+            # Only imported when enabled: it pulls in numpy and registers its own store listener
+            from rag.local_index import local_index
+            if local_index.is_fresh():
+                with tracer.span("local_index_search", size=len(local_index)):
+                    self.results = local_index.search(self.embedding, self.match_count, lexical=lexical)
+                self.local_searches += 1
+                return self.results
+            local_index.start_refresh()
+
+        # Fetch a wider pool, then re-rank
+        rpc, params = "match_research_documents", {
+            "query_embedding": self.embedding,
+            "match_count": max(settings.RERANK_CANDIDATE_POOL, self.match_count * 2),
+        }
+        if settings.QUANTIZED_SEARCH != "none":
+            # Hamming prefilter over the sign bits, exact rescoring in the database; rows
+            # come back with int8 codes instead of float vectors
+            rpc = "match_research_documents_quantized"
+            params["rescore_count"] = max(settings.QUANTIZED_RESCORE, params["match_count"])
+        with tracer.span("vector_rpc") as span:
+            result = await get_supabase().rpc(rpc, params).execute()
+            span.size = len(result.data)
+        self.rpc_calls += 1
+
+        docs, relevance = fuse_candidates(result.data, lexical) if lexical else (result.data, None)
+        with tracer.span("rerank", size=len(docs)):
+            self.results = rerank(docs, self.match_count, relevance=relevance)
+        return self.results
+
+    def _lexical_index(self):
+        if not settings.LEXICAL_INDEX_ENABLED:
+            return None
+        # Only imported when enabled: it pulls in numpy and registers its own store listener
+        from rag.lexical_index import lexical_index
+        if lexical_index.is_fresh():
+            return lexical_index
+        lexical_index.start_refresh()
+        return None
+
+    def _lexical_candidates(self) -> List[Dict]:
+        index = self._lexical_index()
+        if index is None:
+            return []
+        with tracer.span("lexical_search", size=len(index)):
+            candidates = index.search(self.query, max(settings.LEXICAL_CANDIDATE_POOL, self.match_count * 2))
+        self.lexical_searches += 1
+        return candidates
+
+    def lexically_sufficient(self) -> bool:
+        """Whether the lexical index alone finds enough documents covering the query's terms."""
+        index = self._lexical_index()
+        if index is None:
+            return False
+        with tracer.span("lexical_check", size=len(index)):
+            return index.covered(self.query, MIN_RESULTS, settings.LEXICAL_MIN_COVERAGE)
+
+    async def _search_passages(self) -> List[Dict]:
+        """Top passages from the chunk index, grouped under their parent documents and re-ranked."""
+        from rag.chunking import group_passages
+
+        with tracer.span("vector_rpc") as span:
+            result = await get_supabase().rpc("match_research_chunks", {
+                "query_embedding": self.embedding,
+                "match_count": max(settings.CHUNK_CANDIDATE_POOL, self.match_count * 4),
+            }).execute()
+            span.size = len(result.data)
+        self.rpc_calls += 1
+        with tracer.span("rerank", size=len(result.data)):
+            return rerank(group_passages(result.data), self.match_count)
+
+    async def needs_more_research(self) -> bool:
+        """Check if we have sufficient relevant research for the query.
+
+        Sufficient when the lexical index finds enough covering documents;
+        otherwise when there are MIN_RESULTS results and the best vector
+        similarity among them reaches SIMILARITY_THRESHOLD.
+        """
+        if self.lexically_sufficient():
+            return False
+        results = await self.search()
+        if len(results) < MIN_RESULTS:
+            return True
+        # Fused results may lead with a lexical-only match, which has no similarity
+        top_similarity = max(d.get("similarity") or 0 for d in results)
+        return top_similarity < SIMILARITY_THRESHOLD
+
+
+async def search_similar(query: str, match_count: int = 5) -> List[Dict]:
+    """Search for similar documents using cosine similarity, ranked by evidence quality."""
+    return await Retrieval(query, match_count).search()
 
 
-def needs_more_research(query: str, match_count: int = 5) -> bool:
+async def needs_more_research(query: str, match_count: int = 5) -> bool:
     """Check if we have sufficient relevant research for a query."""
-    results = search_similar(query, match_count)
-    if len(results) < MIN_RESULTS:
-        return True
-    top_similarity = results[0].get("similarity", 0) if results else 0
-    return top_similarity < SIMILARITY_THRESHOLD
+    return await Retrieval(query, match_count).needs_more_research()
@@ -0,0 +1,229 @@
+import asyncio
+import re
+import time
+from typing import Dict, List, Optional, Set
+from app.core.clients import get_supabase
+from app.core.config import settings
+from models.schemas import PTInput, TreatmentPlanOutput
+from rag.vectorstore import evidence_fingerprint, store_listeners
+
+WORD = re.compile(r"[a-z0-9]+")
+# Search boilerplate in the curated condition strings (scripts/conditions.json),
+# and words that do not change a baseline plan
+IGNORED_WORDS = frozenset(
+    "rehabilitation rehab physical therapy physiotherapy treatment exercise running return to sport "
+    "a an and of the left right bilateral".split()
+)
+
+
+def condition_words(text: str) -> Set[str]:
+    return set(WORD.findall(text.lower())) - IGNORED_WORDS
+
+
+def condition_name(term: str) -> str:
+    """A curated search term without its boilerplate, e.g. ``ACL reconstruction`` for
+    ``ACL reconstruction rehabilitation physical therapy``."""
+    return " ".join(w for w in term.split() if w.lower() not in IGNORED_WORDS)
+
+
+def match_condition(diagnosis: str, conditions: List[str]) -> Optional[str]:
+    """The one condition a diagnosis names, if any.
+
+    Every word of the diagnosis must belong to the condition, and cover at
+    least half of it (and two words of longer ones), so ``ankle sprain`` maps
+    to ``lateral ankle sprain`` but ``ankle sprain with fracture``, ``elbow``
+    and an ambiguous ``pain`` map to nothing.
+    """
+    words = condition_words(diagnosis)
+    if not words:
+        return None
+    matches = []
+    for condition in conditions:
+        target = condition_words(condition)
+        if words <= target and len(words) >= min(2, len(target)) and 2 * len(words) >= len(target):
+            matches.append(condition)
+    return matches[0] if len(matches) == 1 else None
+
+
+def warm_key(condition: str, healing_stage: str) -> str:
+    return f"{condition.lower()}|{healing_stage}"
+
+
+def covers(words: Set[str], condition: str) -> bool:
+    """Whether a query term's words name a condition: one word set holds the other."""
+    target = condition_words(condition)
+    return words <= target or target <= words
+
+
+class WarmEntry:
+    """A precomputed baseline plan for one condition and healing stage, with the evidence it was built from."""
+
+    def __init__(self, condition: str, healing_stage: str, query: str, fingerprint: str,
+                 plan: TreatmentPlanOutput, model: str, created_at: float, generation_s: float):
+        self.condition = condition
+        self.healing_stage = healing_stage
+        self.query = query
+        self.fingerprint = fingerprint
+        self.plan = plan
+        self.model = model
+        self.created_at = created_at
+        self.generation_s = generation_s
+
+    def to_dict(self) -> Dict:
+        return {**{k: v for k, v in self.__dict__.items() if k != "plan"},
+                "plan": self.plan.model_dump(mode="json", exclude={"provisional"})}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "WarmEntry":
+        return cls(**{**data, "plan": TreatmentPlanOutput(**data["plan"])})
+
+
+class WarmPlanStore:
+    """Baseline treatment plans per curated condition and healing stage, kept in the warm_plans table.
+
+    scripts/precompute_plans.py fills the table after the weekly refresh; each
+    API process holds a copy in memory, reloaded in the background once it is
+    older than ``max_age`` seconds, so every machine serves the same plans. A
+    request whose diagnosis maps to a condition and whose healing stage has an
+    entry is answered by adapting it, if the entry's evidence fingerprint
+    still matches a fresh search for the baseline query. Rows stored for a
+    condition (by the refresh or by dynamic ingestion) drop its entries here
+    at once and from the table in a background flush, so the next precompute
+    regenerates them.
+    """
+
+    def __init__(self, enabled: bool = True, max_age: float = 300):
+        self.enabled = enabled
+        self.max_age = max_age
+        self.entries: Dict[str, WarmEntry] = {}
+        self.loaded_at: Optional[float] = None
+        self.refreshing: Optional[asyncio.Task] = None
+        self.adapted = 0
+        self.stale = 0
+        self.misses = 0
+        self.invalidated = 0
+        self._invalid: List[Set[str]] = []
+        self._flushing: Optional[asyncio.Task] = None
+
+    def is_fresh(self) -> bool:
+        return self.loaded_at is not None and time.time() - self.loaded_at < self.max_age
+
+    async def load(self) -> None:
+        """Replace the in-memory entries with the table's rows."""
+        result = await get_supabase().table("warm_plans").select("key,entry").execute()
+        entries = {row["key"]: WarmEntry.from_dict(row["entry"]) for row in result.data}
+        # Rows of conditions invalidated here but not yet deleted from the table
+        for words in self._invalid:
+            for key in [key for key, entry in entries.items() if covers(words, entry.condition)]:
+                del entries[key]
+        self.entries, self.loaded_at = entries, time.time()
+
+    async def ensure_fresh(self) -> None:
+        """Reload the entries if they are missing or older than ``max_age``."""
+        if self.is_fresh():
+            return
+        try:
+            await self.load()
+        except Exception as e:
+            # Keep what is loaded and retry after max_age rather than on every request
+            self.loaded_at = time.time()
+            print(f"Warm plans unavailable, keeping {len(self.entries)} loaded: {e}")
+
+    def start_refresh(self) -> asyncio.Task:
+        """Run ensure_fresh in the background, one at a time; lookups use the current entries until it is done."""
+        if self.refreshing is None or self.refreshing.done():
+            self.refreshing = asyncio.create_task(self.ensure_fresh())
+        return self.refreshing
+
+    def conditions(self) -> List[str]:
+        return sorted({e.condition for e in self.entries.values()})
+
+    def lookup(self, pt_input: PTInput) -> Optional[WarmEntry]:
+        """The entry for the input's condition and healing stage, if its diagnosis maps to one."""
+        if not self.enabled:
+            return None
+        if not self.is_fresh():
+            self.start_refresh()
+        condition = match_condition(pt_input.diagnosis, self.conditions())
+        entry = self.entries.get(warm_key(condition, pt_input.healing_stage.value)) if condition else None
+        if entry is None:
+            self.misses += 1
+        return entry
+
+    def current(self, entry: WarmEntry, evidence: List[Dict]) -> bool:
+        """Whether the baseline query still retrieves the evidence the entry was generated from."""
+        if evidence_fingerprint(evidence) == entry.fingerprint:
+            return True
+        print(f"Warm plan for {entry.condition} ({entry.healing_stage}) is stale: its evidence changed")
+        self.stale += 1
+        return False
+
+    async def put(self, entry: WarmEntry) -> None:
+        from postgrest import ReturnMethod
+
+        key = warm_key(entry.condition, entry.healing_stage)
+        await get_supabase().table("warm_plans").upsert(
+            {"key": key, "condition": entry.condition, "healing_stage": entry.healing_stage,
+             "entry": entry.to_dict()},
+            on_conflict="key", returning=ReturnMethod.minimal,
+        ).execute()
+        self.entries[key] = entry
+
+    async def remove(self, keys: List[str]) -> None:
+        await get_supabase().table("warm_plans").delete().in_("key", keys).execute()
+        for key in keys:
+            self.entries.pop(key, None)
+
+    def invalidate(self, query_term: str, rows: Optional[List[Dict]] = None) -> int:
+        """Drop every healing stage of the conditions a query term that just received new documents names.
+
+        Returns the entries dropped from memory; the table rows, including any
+        not loaded here, are deleted by the queued flush.
+        """
+        words = condition_words(query_term)
+        if not (self.enabled and words):
+            return 0
+        stale = [key for key, entry in self.entries.items() if covers(words, entry.condition)]
+        for key in stale:
+            del self.entries[key]
+        self._invalid.append(words)
+        if self._flushing is None or self._flushing.done():
+            self._flushing = asyncio.get_running_loop().create_task(self._delete_invalid())
+        return len(stale)
+
+    async def flush(self) -> None:
+        """Wait until the table rows of every condition queued by invalidate are deleted."""
+        if self._flushing is not None:
+            await self._flushing
+
+    async def _delete_invalid(self) -> None:
+        while self._invalid:
+            invalid = list(self._invalid)
+            try:
+                result = await get_supabase().table("warm_plans").select("key,condition").execute()
+                stale = [row["key"] for row in result.data
+                         if any(covers(words, row["condition"]) for words in invalid)]
+                if stale:
+                    await get_supabase().table("warm_plans").delete().in_("key", stale).execute()
+                    self.invalidated += len(stale)
+                    print(f"Invalidated {len(stale)} warm plans after new research")
+            except Exception as e:
+                # Their fingerprint check still keeps stale plans from being used
+                print(f"Warm plan invalidation failed, {len(invalid)} conditions left in the table: {e}")
+            del self._invalid[:len(invalid)]
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.adapted + self.stale + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self.entries),
+            "adapted": self.adapted,
+            "stale": self.stale,
+            "misses": self.misses,
+            "invalidated": self.invalidated,
+            "hit_rate": self.adapted / lookups if lookups else 0.0,
+        }
+
+
+warm_plans = WarmPlanStore(enabled=settings.WARM_PLANS_ENABLED, max_age=settings.WARM_PLANS_RELOAD_SECONDS)
+store_listeners.append(warm_plans.invalidate)
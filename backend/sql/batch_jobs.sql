@@ -0,0 +1,27 @@
+-- Batch analysis jobs (rag/batch.py).
+-- Each job's inputs, per-input results and, in message_batches mode, the
+-- Anthropic Message Batch it submitted are written here as they change, so
+-- a poll answered by another machine finds the job and a restart or Fly
+-- auto-stop does not lose it. Shutdown clears owner; the next process to
+-- start, or to be polled for the job, claims it by compare-and-set on
+-- updated_at and resumes it: a submitted Message Batch is polled again,
+-- other pending inputs are regenerated. A job whose owner stopped writing
+-- for BATCH_JOB_LEASE_SECONDS (a crash) is resumable too.
+
+create table if not exists batch_jobs (
+    id text primary key,
+    mode text not null,
+    ingest_policy text,
+    status text not null,
+    error text,
+    unique_queries integer not null default 0,
+    created_at double precision not null,
+    finished_at double precision,
+    updated_at double precision not null,
+    owner text,
+    inputs jsonb not null,
+    results jsonb not null,
+    message_batch jsonb
+);
+
+create index if not exists batch_jobs_unfinished_idx on batch_jobs (updated_at) where finished_at is null;
@@ -0,0 +1,63 @@
+-- Quantized document embeddings (QUANTIZED_EMBEDDINGS_ENABLED, QUANTIZED_SEARCH).
+-- store_documents writes each voyage-large-2 vector's sign bits (as
+-- binary_quantize would) and per-vector int8 codes with their scale next to
+-- the float embedding; rows stored before can be filled in with
+-- scripts/backfill_quantized.py. Needs pgvector 0.7 or later.
+--
+-- An HNSW scan returns at most hnsw.ef_search rows (40 by default), which
+-- would silently cap the Hamming candidates whatever rescore_count asks for.
+-- The search function raises ef_search to rescore_count for its own
+-- transaction; pgvector allows at most 1000, so QUANTIZED_RESCORE above 1000
+-- is capped there.
+
+alter table research_documents add column if not exists embedding_bits bit(1536);
+alter table research_documents add column if not exists embedding_int8 bytea;
+alter table research_documents add column if not exists embedding_scale real;
+
+create index if not exists research_documents_embedding_bits_idx
+    on research_documents using hnsw (embedding_bits bit_hamming_ops);
+
+-- Two-stage search: the rescore_count rows nearest by Hamming distance over
+-- the sign bits, re-ordered by exact cosine similarity. Rows carry int8 codes
+-- for client-side MMR rather than the float vector (~1/10 of the payload).
+create or replace function match_research_documents_quantized(
+    query_embedding vector(1536), match_count int, rescore_count int
+)
+returns table (
+    id research_documents.id%type,
+    pmid text,
+    title research_documents.title%type,
+    abstract research_documents.abstract%type,
+    authors research_documents.authors%type,
+    year research_documents.year%type,
+    url research_documents.url%type,
+    source research_documents.source%type,
+    evidence_level research_documents.evidence_level%type,
+    query_term research_documents.query_term%type,
+    embedding_int8 bytea,
+    embedding_scale real,
+    similarity float
+)
+language plpgsql
+as $$
+begin
+    -- Local to the request's transaction, so other searches keep the default
+    perform set_config('hnsw.ef_search', least(greatest(rescore_count, 40), 1000)::text, true);
+    return query
+    with candidates as (
+        select d.id
+        from research_documents d
+        where d.embedding_bits is not null
+        order by d.embedding_bits <~> binary_quantize(query_embedding)::bit(1536)
+        limit rescore_count
+    )
+    select
+        d.id, d.pmid, d.title, d.abstract, d.authors, d.year, d.url, d.source, d.evidence_level, d.query_term,
+        d.embedding_int8, d.embedding_scale,
+        1 - (d.embedding <=> query_embedding) as similarity
+    from research_documents d
+    join candidates c on c.id = d.id
+    order by d.embedding <=> query_embedding
+    limit match_count;
+end;
+$$;
@@ -0,0 +1,56 @@
+-- Passage-level evidence index (CHUNK_INDEX_ENABLED).
+-- Each abstract is split into labelled sections or sentence windows by
+-- rag/chunking.py; every passage links back to its parent research_documents
+-- row through pmid. Existing documents can be chunked with
+-- scripts/backfill_chunks.py.
+--
+-- An HNSW scan returns at most hnsw.ef_search rows (40 by default), so the
+-- search function raises it to match_count (CHUNK_CANDIDATE_POOL) for its own
+-- transaction; pgvector allows at most 1000.
+
+create table if not exists research_chunks (
+    id bigserial primary key,
+    pmid text not null references research_documents (pmid) on delete cascade,
+    chunk_index integer not null,
+    section text not null default '',
+    content text not null,
+    embedding vector(1536) not null,
+    unique (pmid, chunk_index)
+);
+
+create index if not exists research_chunks_embedding_idx
+    on research_chunks using hnsw (embedding vector_cosine_ops);
+
+-- Top passages by cosine similarity, each with its parent document's metadata
+create or replace function match_research_chunks(query_embedding vector(1536), match_count int)
+returns table (
+    pmid text,
+    chunk_index integer,
+    section text,
+    content text,
+    similarity float,
+    id research_documents.id%type,
+    title research_documents.title%type,
+    authors research_documents.authors%type,
+    year research_documents.year%type,
+    url research_documents.url%type,
+    source research_documents.source%type,
+    evidence_level research_documents.evidence_level%type,
+    query_term research_documents.query_term%type
+)
+language plpgsql
+as $$
+begin
+    -- Local to the request's transaction, so other searches keep the default
+    perform set_config('hnsw.ef_search', least(greatest(match_count, 40), 1000)::text, true);
+    return query
+    select
+        c.pmid, c.chunk_index, c.section, c.content,
+        1 - (c.embedding <=> query_embedding) as similarity,
+        d.id, d.title, d.authors, d.year, d.url, d.source, d.evidence_level, d.query_term
+    from research_chunks c
+    join research_documents d on d.pmid = c.pmid
+    order by c.embedding <=> query_embedding
+    limit match_count;
+end;
+$$;
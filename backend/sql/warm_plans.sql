@@ -0,0 +1,13 @@
+-- Precomputed baseline plans (WARM_PLANS_ENABLED).
+-- scripts/precompute_plans.py writes one row per curated condition and
+-- healing stage after the weekly refresh; every API machine reads the table
+-- every WARM_PLANS_RELOAD_SECONDS, so plans reach machines that never ran
+-- the precompute. Rows for a condition that receives new research are
+-- deleted by the store listener and regenerated by the next precompute.
+
+create table if not exists warm_plans (
+    key text primary key,
+    condition text not null,
+    healing_stage text not null,
+    entry jsonb not null
+);
@@ -0,0 +1,65 @@
+"""Chunk and embed the passages of documents stored before the chunk index existed.
+
+Needs the research_chunks table from backend/sql/research_chunks.sql. Documents
+that already have passages are skipped, so the script can be re-run safely.
+
+Run from backend/:  python3 ../scripts/backfill_chunks.py
+"""
+import sys
+sys.path.append("../backend")
+
+import argparse
+import asyncio
+import time
+from typing import List, Set
+
+from app.core.clients import close_clients, get_supabase
+from rag.vectorstore import store_chunks
+
+PAGE_SIZE = 1000
+
+
+async def chunked_pmids() -> Set[str]:
+    pmids, start = set(), 0
+    while True:
+        # chunk 0 exists for every chunked document, so this is one row per document;
+        # pages are ordered so they neither overlap nor skip rows
+        result = await get_supabase().table("research_chunks").select("pmid").eq(
+            "chunk_index", 0
+        ).order("id").range(start, start + PAGE_SIZE - 1).execute()
+        pmids.update(row["pmid"] for row in result.data)
+        if len(result.data) < PAGE_SIZE:
+            return pmids
+        start += PAGE_SIZE
+
+
+async def documents_to_chunk(done: Set[str]) -> List[dict]:
+    documents, start = [], 0
+    while True:
+        result = await get_supabase().table("research_documents").select("pmid,title,abstract").order("id").range(
+            start, start + PAGE_SIZE - 1
+        ).execute()
+        documents.extend(row for row in result.data if row["pmid"] not in done)
+        if len(result.data) < PAGE_SIZE:
+            return documents
+        start += PAGE_SIZE
+
+
+async def main(args):
+    started = time.perf_counter()
+    documents = await documents_to_chunk(await chunked_pmids())
+    print(f"{len(documents)} documents to chunk")
+
+    total = 0
+    for i in range(0, len(documents), args.batch_size):
+        total += await store_chunks(documents[i:i + args.batch_size])
+        print(f"Chunked {min(i + args.batch_size, len(documents))}/{len(documents)} documents ({total} passages)")
+
+    print(f"✅ Stored {total} passages in {time.perf_counter() - started:.1f}s")
+    await close_clients()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill the research_chunks passage index")
+    parser.add_argument("--batch-size", type=int, default=100)
+    asyncio.run(main(parser.parse_args()))
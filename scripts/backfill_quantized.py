@@ -0,0 +1,54 @@
+"""Write the quantized embedding columns of documents stored before they existed.
+
+Needs the columns from backend/sql/quantized_embeddings.sql. Only rows whose
+int8 codes are still null are read and written, so the script can be re-run
+safely. Codes come from the stored float vectors, so nothing is re-embedded.
+
+Run from backend/:  python3 ../scripts/backfill_quantized.py
+"""
+import sys
+sys.path.append("../backend")
+
+import argparse
+import asyncio
+import time
+
+from app.core.clients import close_clients, get_supabase
+from rag.quantization import quantized_columns
+from rag.vectorstore import parse_embedding
+
+PAGE_SIZE = 500
+
+
+async def main(args):
+    started = time.perf_counter()
+    slots = asyncio.Semaphore(args.concurrency)
+    total = 0
+
+    async def write(pmid: str, columns: dict) -> None:
+        async with slots:
+            await get_supabase().table("research_documents").update(columns).eq("pmid", pmid).execute()
+
+    while True:
+        # Always the first page: rows written here no longer match the filter
+        result = await get_supabase().table("research_documents").select("pmid,embedding").is_(
+            "embedding_int8", "null"
+        ).order("pmid").limit(PAGE_SIZE).execute()
+        if not result.data:
+            break
+        columns = quantized_columns([parse_embedding(row["embedding"]) for row in result.data])
+        # Every row has its own codes, so one update per row
+        await asyncio.gather(*(write(row["pmid"], c) for row, c in zip(result.data, columns)))
+        total += len(result.data)
+        print(f"Quantized {total} documents")
+        if len(result.data) < PAGE_SIZE:
+            break
+
+    print(f"✅ Quantized {total} embeddings in {time.perf_counter() - started:.1f}s")
+    await close_clients()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill the quantized embedding columns")
+    parser.add_argument("--concurrency", type=int, default=8, help="row updates in flight")
+    asyncio.run(main(parser.parse_args()))
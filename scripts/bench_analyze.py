@@ -0,0 +1,107 @@
+"""Load benchmark for POST /api/v1/analyze against local stub servers.
+
+Run from backend/:  python3 ../scripts/bench_analyze.py
+"""
+import sys
+sys.path.append("../backend")
+
+import asyncio
+import os
+import time
+import uuid
+
+import httpx
+from stubs import StubServer
+
+stub = StubServer(embed_latency=0.05, db_latency=0.02, llm_latency=0.5).start()
+stub.configure_env()
+os.environ["RESPONSE_CACHE_ENABLED"] = "false"  # measure generation, not cached plans
+
+from main import app  # noqa: E402  (settings must see the stub env first)
+
+PAYLOAD = {
+    "symptoms": ["knee pain", "swelling"],
+    "diagnosis": "ACL reconstruction",
+    "healing_stage": "subacute",
+    "functional_limitations": ["stairs"],
+    "pain_level": 4,
+}
+CONCURRENCY_LEVELS = [1, 2, 4, 8, 16]
+REQUESTS_PER_WORKER = 4
+
+
+async def run_level(client: httpx.AsyncClient, concurrency: int) -> float:
+    async def worker():
+        for _ in range(REQUESTS_PER_WORKER):
+            response = await client.post("/api/v1/analyze", json=PAYLOAD)
+            response.raise_for_status()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return concurrency * REQUESTS_PER_WORKER / elapsed
+
+
+async def health_latency_under_load(client: httpx.AsyncClient) -> float:
+    load = asyncio.gather(*(client.post("/api/v1/analyze", json=PAYLOAD) for _ in range(8)))
+    await asyncio.sleep(0.1)
+    start = time.perf_counter()
+    await client.get("/api/v1/health")
+    elapsed = time.perf_counter() - start
+    await load
+    return elapsed
+
+
+async def calls_per_request(client: httpx.AsyncClient) -> None:
+    stub.calls.clear()
+    await client.post("/api/v1/analyze", json=PAYLOAD)
+    print(f"Upstream calls for one warm request: embed={stub.calls['embed']} "
+          f"rpc={stub.calls['rpc']} llm={stub.calls['llm']}")
+    assert stub.calls["embed"] <= 1, "warm path must embed the query at most once"
+
+
+async def calls_per_cold_request(client: httpx.AsyncClient) -> None:
+    """With a cold query cache each request embeds its query exactly once.
+
+    Sufficient evidence costs one RPC, shared by the sufficiency check and the
+    evidence list; insufficient evidence ingests and re-runs only the RPC.
+    """
+    from rag.embeddings import query_cache
+
+    for label, similarity, rpc_calls in (("sufficient", 0.8, 1), ("ingesting", 0.3, 2)):
+        stub.match_similarity = similarity
+        query_cache.memory.clear()
+        stub.calls.clear()
+        # A diagnosis never seen before, so the disk tier misses too
+        payload = {**PAYLOAD, "diagnosis": f"{PAYLOAD['diagnosis']} {uuid.uuid4().hex[:8]}"}
+        response = await client.post("/api/v1/analyze", json=payload)
+        response.raise_for_status()
+        print(f"Upstream calls for one cold {label} request: query embed={stub.calls['embed_query']} "
+              f"rpc={stub.calls['rpc']}")
+        assert stub.calls["embed_query"] == 1, f"cold {label} request must embed its query exactly once"
+        assert stub.calls["rpc"] == rpc_calls, f"cold {label} request must run the RPC {rpc_calls} time(s)"
+    stub.match_similarity = 0.8
+
+
+async def main():
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+        await client.post("/api/v1/analyze", json=PAYLOAD)  # warm up connection pools
+        await calls_per_request(client)
+        await calls_per_cold_request(client)
+        baseline = None
+        print(f"{'concurrency':>12} {'req/s':>8} {'speedup':>8}")
+        for concurrency in CONCURRENCY_LEVELS:
+            rps = await run_level(client, concurrency)
+            baseline = baseline or rps
+            print(f"{concurrency:>12} {rps:>8.2f} {rps / baseline:>7.1f}x")
+        health = await health_latency_under_load(client)
+        from rag.embeddings import query_cache
+        from rag.usage import prompt_usage
+        print(f"\nQuery embedding cache: {query_cache.stats()}")
+        print(f"Prompt token usage: {prompt_usage.stats()}")
+        print(f"/api/v1/health latency with 8 analyses in flight: {health * 1000:.1f} ms")
+
+
+asyncio.run(main())
+stub.stop()
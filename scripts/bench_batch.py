@@ -0,0 +1,155 @@
+"""Batch analysis versus one /analyze request per patient, against local stub servers.
+
+A caseload of 32 patients across 8 conditions (4 patients per condition, who
+share a retrieval query) is analysed three ways: /analyze one request at a
+time, /analyze with BATCH_CONCURRENCY requests in flight, and one
+/analyze/batch job. Each run uses a fresh cohort, so no run gets embeddings
+or prompt-cache entries warmed by an earlier one. The Message Batches mode is
+run last for correctness; its wall time is just the stub's batch latency.
+
+Then each mode is stopped mid-job as a Fly auto-stop would, and picked up by
+a fresh process, whose state is empty but for the stub batch_jobs table:
+while the job runs another process answers polls from the table without
+taking it over; after shutdown a Message Batch job is resumed at startup and
+collected without being resubmitted or cancelled, and a concurrent job is
+resumed by its next poll and regenerates only the inputs left pending.
+
+Run from backend/:  python3 ../scripts/bench_batch.py
+"""
+import sys
+sys.path.append("../backend")
+
+import argparse
+import asyncio
+import os
+import time
+import uuid
+
+import httpx
+from stubs import StubServer
+
+stub = StubServer(embed_latency=0.05, db_latency=0.02, llm_latency=0.5, llm_latency_per_1k_input=0.1).start()
+stub.configure_env()
+os.environ["RESPONSE_CACHE_ENABLED"] = "false"  # measure generation, not cached plans
+os.environ["BATCH_POLL_SECONDS"] = "0.05"
+
+from app.core.config import settings  # noqa: E402
+from main import app  # noqa: E402
+from rag.batch import BatchAnalyzer, batch_analyzer  # noqa: E402
+from rag.usage import prompt_usage  # noqa: E402
+
+CONDITIONS = ["ACL reconstruction", "Achilles tendinopathy", "lateral ankle sprain", "rotator cuff tendinopathy",
+              "chronic low back pain", "patellofemoral pain", "plantar fasciitis", "neck pain"]
+
+
+def caseload(cohort: str, per_condition: int):
+    return [{
+        "symptoms": ["pain with loading", f"referral cohort {cohort}"],
+        "diagnosis": condition,
+        "healing_stage": "subacute",
+        "functional_limitations": ["stairs", "running"][: 1 + i % 2],
+        "pain_level": 3 + i,
+    } for condition in CONDITIONS for i in range(per_condition)]
+
+
+async def one_by_one(client: httpx.AsyncClient, patients, concurrency: int) -> None:
+    queue = list(patients)
+
+    async def worker():
+        while queue:
+            (await client.post("/api/v1/analyze", json=queue.pop())).raise_for_status()
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+
+async def batch(client: httpx.AsyncClient, patients, mode: str) -> None:
+    response = await client.post("/api/v1/analyze/batch", json={"inputs": patients, "mode": mode})
+    response.raise_for_status()
+    job_id = response.json()["job_id"]
+    while True:
+        status = (await client.get(f"/api/v1/analyze/batch/{job_id}")).json()
+        if status["status"] in ("completed", "failed"):
+            break
+        await asyncio.sleep(0.02)
+    assert status["completed"] == len(patients), status.get("error") or status["failed"]
+
+
+async def measure(label: str, run, patients) -> None:
+    stub.calls.clear()
+    before = prompt_usage.stats()
+    start = time.perf_counter()
+    await run(patients)
+    elapsed = time.perf_counter() - start
+    after = prompt_usage.stats()
+    uncached = (after["input_tokens"] + after["cache_creation_input_tokens"]
+                - before["input_tokens"] - before["cache_creation_input_tokens"])
+    cache_read = after["cache_read_input_tokens"] - before["cache_read_input_tokens"]
+    print(f"{label:>28} {elapsed:>7.2f}s {elapsed / len(patients) * 1000:>9.0f} {stub.calls['embed']:>6} "
+          f"{stub.calls['rpc']:>5} {stub.calls['llm'] + stub.calls['llm_batch']:>5} "
+          f"{uncached / len(patients):>9.0f} {cache_read / len(patients):>11.0f}")
+
+
+async def poll(client: httpx.AsyncClient, job_id: str):
+    while True:
+        status = (await client.get(f"/api/v1/analyze/batch/{job_id}")).json()
+        if status["status"] in ("completed", "failed"):
+            return status
+        await asyncio.sleep(0.02)
+
+
+async def restart(client: httpx.AsyncClient, patients, mode: str, stop_when) -> None:
+    """Stop a job once ``stop_when(row)`` holds for its batch_jobs row, then finish it in a fresh process."""
+    stub.calls.clear()
+    response = await client.post("/api/v1/analyze/batch", json={"inputs": patients, "mode": mode})
+    job_id = response.json()["job_id"]
+    while not stop_when(stub.batch_jobs[job_id]):
+        await asyncio.sleep(0.01)
+    other = await BatchAnalyzer().get(job_id)
+    assert other is not None and other.task is None, "a running job was taken over"
+    await batch_analyzer.shutdown()
+    done_before = sum(r["status"] == "completed" for r in stub.batch_jobs[job_id]["results"])
+    generations = stub.calls["llm"]
+
+    # A new process: nothing in memory, a new owner id
+    batch_analyzer.jobs.clear()
+    batch_analyzer.instance = uuid.uuid4().hex
+    resumed = await batch_analyzer.resume() if mode == "message_batches" else 0
+    status = await poll(client, job_id)
+    assert status["completed"] == len(patients), status.get("error") or status["failed"]
+    print(f"{mode:>16}: stopped at {done_before}/{len(patients)} done, read by another process while "
+          f"{other.status}; resumed {'at startup' if resumed else 'by its poll'}, "
+          f"{stub.calls['llm'] - generations} generations after restart, {stub.calls['llm_batch']} Message Batch "
+          f"submitted, {stub.calls['llm_batch_cancel']} cancelled; {status['completed']}/{len(patients)} completed")
+
+
+async def main(args):
+    concurrency = settings.BATCH_CONCURRENCY
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        await client.post("/api/v1/analyze", json=caseload("warm-up", 1)[0])  # warm up connection pools
+        n = len(caseload("x", args.per_condition))
+        print(f"{n} patients, {len(CONDITIONS)} distinct queries, BATCH_CONCURRENCY={concurrency}")
+        print(f"{'path':>28} {'wall':>8} {'ms/patient':>9} {'embed':>6} {'rpc':>5} {'llm':>5} "
+              f"{'uncached':>9} {'cache read':>11}  (tokens per patient)")
+        await measure("/analyze, sequential", lambda p: one_by_one(client, p, 1), caseload("a", args.per_condition))
+        await measure(f"/analyze, {concurrency} in flight", lambda p: one_by_one(client, p, concurrency),
+                      caseload("b", args.per_condition))
+        await measure("/analyze/batch concurrent", lambda p: batch(client, p, "concurrent"),
+                      caseload("c", args.per_condition))
+        await measure("/analyze/batch msg batches", lambda p: batch(client, p, "message_batches"),
+                      caseload("d", args.per_condition))
+
+        print("\nRestart mid-job")
+        await restart(client, caseload("e", args.per_condition), "message_batches",
+                      lambda row: row["message_batch"] is not None)
+        await restart(client, caseload("f", args.per_condition), "concurrent",
+                      lambda row: sum(r["status"] == "completed" for r in row["results"]) >= 8)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--per-condition", type=int, default=4)
+    try:
+        asyncio.run(main(parser.parse_args()))
+    finally:
+        stub.stop()
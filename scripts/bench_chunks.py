@@ -0,0 +1,150 @@
+"""Prompt size and generation latency: whole abstracts versus chunk-index passages.
+
+Stores 60 articles with full-length structured abstracts through
+store_documents with the chunk index on, then for each query retrieves the
+top 5 documents at passage granularity. The prompt built from the selected
+passages is compared with one carrying the same 5 documents' whole
+abstracts, so both cite exactly the same evidence.
+
+Against the stub, generation latency is modelled as a fixed 2 s plus a
+prefill cost per 1k uncached input tokens. With --live the two prompts are
+sent to the real Anthropic API instead (ANTHROPIC_API_KEY must be set), and
+token counts come from its count_tokens endpoint.
+
+Run from backend/:  python3 ../scripts/bench_chunks.py [--live]
+"""
+import sys
+sys.path.append("../backend")
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import time
+
+from stubs import StubServer
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--live", action="store_true", help="time generation against the real Anthropic API")
+parser.add_argument("--articles", type=int, default=60)
+parser.add_argument("--queries", type=int, default=10)
+parser.add_argument("--prefill-ms-per-1k", type=float, default=150.0)
+args = parser.parse_args()
+
+live_key = os.environ.get("ANTHROPIC_API_KEY")
+stub = StubServer(embed_latency=0.0, db_latency=0.0, llm_latency=2.0, embed_dim=256,
+                  llm_latency_per_1k_input=args.prefill_ms_per_1k / 1000).start()
+stub.configure_env()
+os.environ["CHUNK_INDEX_ENABLED"] = "true"
+os.environ["RESPONSE_CACHE_ENABLED"] = "false"
+if args.live:
+    os.environ["ANTHROPIC_API_KEY"] = live_key or ""
+    os.environ.pop("ANTHROPIC_BASE_URL", None)
+
+from app.core.clients import get_anthropic_client  # noqa: E402
+from models.schemas import HealingStage, PTInput  # noqa: E402
+from rag.pipeline import build_prompt, build_query  # noqa: E402
+from rag.vectorstore import Retrieval, store_documents  # noqa: E402
+
+CONDITIONS = ["Achilles tendinopathy", "patellofemoral pain", "lateral ankle sprain", "rotator cuff tendinopathy",
+              "chronic low back pain", "ACL reconstruction", "plantar fasciitis", "lateral epicondylalgia",
+              "neck pain", "hip osteoarthritis"]
+SENTENCES = {
+    "BACKGROUND": ["{c} is a common musculoskeletal condition with a substantial burden on function and work.",
+                   "Exercise therapy is widely recommended, but the optimal dose and progression remain unclear.",
+                   "Few trials have compared loading strategies over follow-up longer than twelve weeks."],
+    "OBJECTIVE": ["To compare the effectiveness of progressive loading with usual care for people with {c}."],
+    "METHODS": ["We randomised {n} participants aged 18 to 65 years to progressive loading or usual physiotherapy.",
+                "The intervention consisted of supervised sessions twice weekly with a daily home programme.",
+                "The primary outcome was pain on a 0 to 10 numeric rating scale at {w} weeks.",
+                "Secondary outcomes included patient-reported function, global rating of change and return to sport.",
+                "Analyses followed the intention-to-treat principle using linear mixed models."],
+    "RESULTS": ["Pain improved more with progressive loading (mean difference {d} points, 95% CI 0.4 to 1.9).",
+                "Function scores favoured the loading group at {w} weeks but not at one year.",
+                "Adherence to the home programme was {a}% and no serious adverse events were reported.",
+                "Return to sport was achieved by {a}% of the loading group compared with {b}% with usual care."],
+    "CONCLUSIONS": ["Progressive loading produced small to moderate improvements in pain and function in {c}.",
+                    "Clinicians should consider graded loading with clear progression criteria as first-line care."],
+}
+
+
+def abstract_for(condition: str, rng: random.Random) -> str:
+    values = {"c": condition, "n": rng.randint(40, 300), "w": rng.choice([6, 12, 26]),
+              "d": round(rng.uniform(0.5, 2.0), 1), "a": rng.randint(55, 90), "b": rng.randint(30, 60)}
+    return " ".join(f"{label}: " + " ".join(s.format(**values) for s in sentences)
+                    for label, sentences in SENTENCES.items())
+
+
+def make_articles(count: int):
+    rng = random.Random(0)
+    articles = []
+    for i in range(count):
+        condition = CONDITIONS[i % len(CONDITIONS)]
+        articles.append({
+            "pmid": str(50_000_000 + i), "title": f"Progressive loading for {condition}: a randomised trial ({i})",
+            "abstract": abstract_for(condition, rng), "authors": ["Smith J", "Doe A"], "year": str(2005 + i % 20),
+            "url": f"https://pubmed.ncbi.nlm.nih.gov/{50_000_000 + i}/", "source": "PubMed",
+            "evidence_level": ["systematic_review", "rct", "standard"][i % 3], "query_term": condition,
+        })
+    return articles
+
+
+def patient(condition: str) -> PTInput:
+    return PTInput(symptoms=["pain with loading"], diagnosis=condition,
+                   healing_stage=HealingStage.chronic, functional_limitations=["running"], pain_level=5)
+
+
+def prompt_chars(prompt) -> int:
+    blocks = prompt["system"] + prompt["messages"][0]["content"]
+    return sum(len(block["text"]) for block in blocks)
+
+
+async def prompt_tokens(prompt) -> int:
+    if not args.live:
+        return prompt_chars(prompt) // 4  # the stub's estimate
+    result = await get_anthropic_client().messages.count_tokens(model="claude-opus-4-5", **prompt)
+    return result.input_tokens
+
+
+async def generation_ms(prompt) -> float:
+    start = time.perf_counter()
+    await get_anthropic_client().messages.create(model="claude-opus-4-5", max_tokens=4096, **prompt)
+    return (time.perf_counter() - start) * 1000
+
+
+async def main():
+    articles = make_articles(args.articles)
+    counts = await store_documents(articles)
+    print(f"Stored {counts['stored']} documents as {counts['chunks']} passages "
+          f"({counts['embed_calls']} embed calls, {counts['db_calls']} DB round-trips)")
+    by_pmid = {a["pmid"]: a for a in articles}
+
+    rows = {mode: {"evidence": [], "tokens": [], "ms": [], "coverage": []} for mode in ("abstracts", "passages")}
+    for condition in CONDITIONS[:args.queries]:
+        pt_input = patient(condition)
+        retrieval = Retrieval(build_query(pt_input), match_count=5)
+        evidence = await retrieval.search()
+        whole = [{**by_pmid[doc["pmid"]]} for doc in evidence]
+        for mode, docs in (("passages", evidence), ("abstracts", whole)):
+            prompt = build_prompt(pt_input, docs)
+            evidence_text = prompt["messages"][0]["content"][0]["text"]
+            rows[mode]["evidence"].append(len(evidence_text) // 4)
+            rows[mode]["tokens"].append(await prompt_tokens(prompt))
+            rows[mode]["coverage"].append(sum(f"URL: {doc['url']}" in evidence_text for doc in evidence) / len(evidence))
+            rows[mode]["ms"].append(await generation_ms(prompt))
+
+    label = "live" if args.live else f"modelled, {args.prefill_ms_per_1k:.0f} ms per 1k prefill tokens"
+    print(f"{args.queries} queries, top 5 documents each; generation latency {label}")
+    print(f"{'prompt':>10} {'evidence tokens':>16} {'input tokens':>13} {'generation p50':>15} {'citation coverage':>18}")
+    for mode, r in rows.items():
+        print(f"{mode:>10} {statistics.mean(r['evidence']):>16.0f} {statistics.mean(r['tokens']):>13.0f} "
+              f"{statistics.median(r['ms']):>13.0f}ms "
+              f"{statistics.mean(r['coverage']):>17.0%}")
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    finally:
+        stub.stop()
@@ -0,0 +1,66 @@
+"""Cold-start benchmark: wall time and peak RSS of ``python -c "import main"``.
+
+Each sample is a fresh interpreter, as on a machine scaled up from zero. The
+second row also builds every outbound client, the work a first request adds
+on top of the import.
+
+Run from backend/:  python3 ../scripts/bench_cold_start.py [--backend DIR]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+SNIPPETS = {
+    "import main": "import main",
+    # Trees from before lazy clients build them during the import; the getters are then absent
+    "import main + clients": (
+        "import importlib, main\n"
+        "try:\n"
+        "    clients = importlib.import_module('app.core.clients')\n"
+        "except ImportError:\n"
+        "    clients = None\n"
+        "for name in ('get_http_client', 'get_anthropic_client', 'get_supabase'):\n"
+        "    getattr(clients, name, lambda: None)()\n"
+    ),
+}
+
+ENV = {
+    "SUPABASE_URL": "http://127.0.0.1:1",
+    "SUPABASE_KEY": "bench",
+    "VOYAGE_API_KEY": "bench",
+    "ANTHROPIC_API_KEY": "bench",
+}
+
+
+def sample(snippet: str, cwd: str):
+    """Run one fresh interpreter; returns (wall seconds, peak RSS in MB)."""
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-c", snippet], cwd=cwd, env={**os.environ, **ENV})
+    _, status, usage = os.wait4(proc.pid, 0)
+    elapsed = time.perf_counter() - start
+    if status != 0:
+        raise RuntimeError(f"snippet failed with status {status}")
+    # ru_maxrss is in kilobytes on Linux
+    return elapsed, usage.ru_maxrss / 1024
+
+
+def main(args):
+    backend = os.path.abspath(args.backend)
+    print(f"{args.runs} runs per row, backend at {backend}")
+    print(f"{'':>22} {'median wall':>12} {'min wall':>10} {'peak RSS':>10}")
+    for label, snippet in SNIPPETS.items():
+        sample(snippet, backend)  # warm the filesystem cache
+        results = [sample(snippet, backend) for _ in range(args.runs)]
+        walls = [wall for wall, _ in results]
+        rss = max(rss for _, rss in results)
+        print(f"{label:>22} {statistics.median(walls) * 1000:>10.0f}ms {min(walls) * 1000:>8.0f}ms {rss:>8.1f}MB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backend", default=".", help="backend directory to import main from")
+    parser.add_argument("--runs", type=int, default=10)
+    main(parser.parse_args())
@@ -0,0 +1,69 @@
+"""Cold-diagnosis ingestion benchmark against stubbed E-utilities, Voyage and PostgREST.
+
+Compares the previous serial flow (PubMed then PEDro, fixed 0.5 s sleeps and a
+store per source) with the concurrent, rate-limited dynamic_ingest. Then
+checks that storing the other hq_/plain variant of already stored articles
+inserts nothing.
+
+Run from backend/:  python3 ../scripts/bench_dynamic_ingest.py
+"""
+import sys
+sys.path.append("../backend")
+
+import asyncio
+import time
+
+from stubs import StubServer
+
+stub = StubServer(embed_latency=0.1, db_latency=0.02, ncbi_latency=0.3).start()
+stub.configure_env()
+
+from ingestion.pedro import HQ_PMID_PREFIX, base_pmid, fetch_pedro_research  # noqa: E402
+from ingestion.pubmed import fetch_research  # noqa: E402
+from rag.pipeline import dynamic_ingest  # noqa: E402
+from rag.vectorstore import store_documents  # noqa: E402
+
+DIAGNOSIS = "Achilles tendinopathy"
+
+
+async def serial_ingest(diagnosis: str):
+    """The previous flow: one source after the other, each with its own store."""
+    articles = await fetch_research(diagnosis + " physical therapy rehabilitation treatment", max_results=8)
+    await asyncio.sleep(0.5)
+    await store_documents(articles, query_term=diagnosis)
+    articles = await fetch_pedro_research(diagnosis + " physiotherapy", max_results=8)
+    await asyncio.sleep(0.5)
+    await store_documents(articles, query_term=diagnosis)
+
+
+async def measure(label, ingest):
+    stub.documents.clear()
+    stub.calls.clear()
+    await asyncio.sleep(1)  # let the NCBI limiter refill between runs
+    start = time.perf_counter()
+    await ingest(DIAGNOSIS)
+    elapsed = time.perf_counter() - start
+    print(f"{label:>10} {elapsed:>8.2f}s {stub.calls['ncbi']:>6} {stub.calls['embed']:>6} "
+          f"{stub.calls['db_select'] + stub.calls['db_write']:>6} {len(stub.documents):>6}")
+
+
+async def check_stored_variants():
+    """A later run returning the other variant of a stored article must not insert it again."""
+    stored = list(stub.documents.values())
+    variants = [{**row, "pmid": base_pmid(row["pmid"]) if row["pmid"].startswith(HQ_PMID_PREFIX)
+                 else HQ_PMID_PREFIX + row["pmid"]} for row in stored]
+    counts = await store_documents(variants, query_term=DIAGNOSIS)
+    assert counts["stored"] == 0 and counts["skipped"] == len(variants) and len(stub.documents) == len(stored), counts
+    print(f"\nRe-storing the other variant of {len(variants)} stored articles: "
+          f"{counts['stored']} stored, {counts['skipped']} skipped: ok")
+
+
+async def main():
+    print(f"{'flow':>10} {'latency':>9} {'ncbi':>6} {'embed':>6} {'db':>6} {'rows':>6}")
+    await measure("serial", serial_ingest)
+    await measure("concurrent", dynamic_ingest)
+    await check_stored_variants()
+
+
+asyncio.run(main())
+stub.stop()
@@ -0,0 +1,70 @@
+"""Peak memory and throughput of the streaming efetch parser versus whole-document parsing.
+
+Writes a synthetic efetch fixture (structured abstracts, publication types) of
+ARTICLE_COUNT records, then parses it with the previous ET.fromstring +
+descendant-search approach and with ingestion.efetch.parse_efetch.
+
+Run from backend/:  python3 ../scripts/bench_efetch_parser.py
+"""
+import sys
+sys.path.append("../backend")
+
+import os
+import time
+import tracemalloc
+import xml.etree.ElementTree as ET
+
+from stubs import efetch_xml
+
+from ingestion.efetch import parse_efetch
+
+ARTICLE_COUNT = 20_000
+FIXTURE = "/tmp/efetch_fixture.xml"
+
+
+def dom_parse(path: str) -> int:
+    """The previous approach: whole response in memory, first AbstractText only."""
+    with open(path, "rb") as f:
+        root = ET.fromstring(f.read())
+    count = 0
+    for article in root.findall(".//PubmedArticle"):
+        title = article.find(".//ArticleTitle").text
+        abstract = article.find(".//AbstractText").text
+        authors = [a.find("LastName").text for a in article.findall(".//Author")]
+        year_el = article.find(".//PubDate/Year")
+        year = year_el.text if year_el is not None else ""
+        pmid = article.find(".//PMID").text
+        count += bool(title and abstract and authors and pmid)
+    return count
+
+
+def streaming_parse(path: str) -> int:
+    with open(path, "rb") as f:
+        return sum(1 for _ in parse_efetch(f))
+
+
+def measure(label: str, parse) -> None:
+    tracemalloc.start()
+    start = time.perf_counter()
+    count = parse(FIXTURE)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:>10} {count:>8} {count / elapsed:>12.0f} {peak / 1e6:>10.1f}")
+
+
+def main():
+    if not os.path.exists(FIXTURE):
+        with open(FIXTURE, "w") as f:
+            f.write(efetch_xml([str(30_000_000 + i) for i in range(ARTICLE_COUNT)]))
+    print(f"Fixture: {ARTICLE_COUNT} articles, {os.path.getsize(FIXTURE) / 1e6:.1f} MB\n")
+    print(f"{'parser':>10} {'articles':>8} {'articles/s':>12} {'peak MB':>10}")
+    measure("dom", dom_parse)
+    measure("streaming", streaming_parse)
+
+    sample = next(parse_efetch(open(FIXTURE, "rb")))
+    print(f"\nSample abstract: {sample['abstract'][:120]}...")
+    print(f"Publication types: {sample['publication_types']}")
+
+
+main()
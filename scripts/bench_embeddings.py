@@ -0,0 +1,77 @@
+"""Bulk document embedding benchmark against the local Voyage stub.
+
+Embeds 3,000 abstracts (10% repeated) the old way, in a single request, and
+then through the batch embedder at several concurrency settings. A final run
+has the stub throttle 10% of requests with 429s, to show that retries recover
+and that output order survives them.
+
+Run from backend/:  python3 ../scripts/bench_embeddings.py
+"""
+import sys
+sys.path.append("../backend")
+
+import argparse
+import asyncio
+import time
+
+from stubs import StubServer, fake_embedding
+
+# Small vectors keep the stub's own JSON encoding from dominating the timings
+stub = StubServer(embed_latency=0.1, embed_latency_per_text=0.002, embed_dim=64).start()
+stub.configure_env()
+
+from rag.embeddings import _embed, batch_embedder  # noqa: E402
+
+ABSTRACT = ("Progressive loading improved pain and function in runners with tendinopathy "
+            "compared with usual care at twelve weeks. ") * 10
+
+
+def make_texts(count: int, duplicate_share: float):
+    unique = int(count * (1 - duplicate_share))
+    return [f"Trial {i % unique}. {ABSTRACT}" for i in range(count)]
+
+
+def check_order(texts, embeddings):
+    for text, embedding in zip(texts, embeddings):
+        assert embedding == fake_embedding(text, stub.embed_dim), "embedding returned out of order"
+
+
+async def measure(label, texts, concurrency):
+    batch_embedder.concurrency = concurrency
+    batch_embedder._slots = None
+    stub.calls.clear()
+    start = time.perf_counter()
+    embeddings = await batch_embedder.embed(texts)
+    elapsed = time.perf_counter() - start
+    check_order(texts, embeddings)
+    print(f"{label:>22} {elapsed:>8.2f}s {len(texts) / elapsed:>10.0f} {stub.calls['embed']:>9} "
+          f"{stub.calls['embed_texts']:>12} {stub.calls['embed_throttled']:>10}")
+
+
+async def main(args):
+    texts = make_texts(args.texts, args.duplicates)
+    print(f"{len(texts)} texts, {len(set(texts))} unique")
+    print(f"{'':>22} {'wall':>9} {'texts/s':>10} {'requests':>9} {'texts sent':>12} {'throttled':>10}")
+
+    try:
+        await _embed(texts, input_type="document")
+        print(f"{'single request':>22} accepted")
+    except Exception as e:
+        print(f"{'single request':>22} failed: {e.__class__.__name__} {getattr(e, 'response', None) and e.response.status_code}")
+
+    for concurrency in args.concurrency:
+        await measure(f"batched, concurrency {concurrency}", texts, concurrency)
+
+    stub.embed_failure_rate = 0.1
+    await measure("10% throttled, c=4", texts, 4)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--texts", type=int, default=3000)
+    parser.add_argument("--duplicates", type=float, default=0.1)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8])
+    try:
+        asyncio.run(main(parser.parse_args()))
+    finally:
+        stub.stop()
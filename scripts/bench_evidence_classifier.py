@@ -0,0 +1,102 @@
+"""Throughput and accuracy of ingestion.evidence versus the keyword scans it replaces.
+
+Accuracy is measured on a labelled fixture (scripts/evidence_fixture.json by
+default), JSON of the form::
+
+    {"articles": [{"label": "rct", "title": "...", "abstract": "...",
+                   "publication_types": ["Journal Article", ...], "note": "..."}]}
+
+``publication_types`` is optional, as it is for citations PubMed has not
+indexed yet. Each classifier is scored overall, and the text-only and
+publication-type classifications are reported separately. Throughput is
+measured on the fixture's abstracts padded to a typical abstract length.
+
+Run from backend/:  python3 ../scripts/bench_evidence_classifier.py [--fixture PATH]
+"""
+import sys
+sys.path.append("../backend")
+
+import argparse
+import json
+import os
+import time
+from collections import Counter
+
+from ingestion.evidence import EVIDENCE_LEVELS, classify_evidence_level, classify_evidence_levels, level_from_text
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "evidence_fixture.json")
+FILLER = ("Participants completed outcome measures at baseline, six weeks and twelve months, "
+          "and adherence was recorded in exercise diaries. ")
+
+
+def legacy_classify(title: str, abstract: str) -> str:
+    """The previous classifier, copied in ingestion/pubmed.py and ingestion/pedro.py."""
+    text = (title + " " + abstract).lower()
+    if any(k in text for k in ["systematic review", "meta-analysis", "cochrane"]):
+        return "systematic_review"
+    elif any(k in text for k in ["randomized controlled", "randomised controlled", "rct", "randomized trial"]):
+        return "rct"
+    elif any(k in text for k in ["clinical trial", "controlled trial"]):
+        return "clinical_trial"
+    elif any(k in text for k in ["cohort study", "case control", "observational"]):
+        return "observational"
+    else:
+        return "standard"
+
+
+def accuracy(articles, verbose: bool) -> None:
+    classifiers = {
+        "legacy keywords": lambda a: legacy_classify(a["title"], a["abstract"]),
+        "text only": lambda a: level_from_text(a["title"], a["abstract"]),
+        "publication types": lambda a: classify_evidence_level(a["title"], a["abstract"], a.get("publication_types")),
+    }
+    print(f"{'classifier':>20} {'correct':>9} {'accuracy':>9}  per label (correct/total)")
+    totals = Counter(a["label"] for a in articles)
+    for name, classify in classifiers.items():
+        correct: Counter = Counter()
+        for article in articles:
+            level = classify(article)
+            correct[article["label"]] += level == article["label"]
+            if verbose and level != article["label"]:
+                print(f"{'':>20}   {article['title'][:60]!r}: {level}, labelled {article['label']}")
+        per_label = " ".join(f"{level}={correct[level]}/{totals[level]}" for level in EVIDENCE_LEVELS if totals[level])
+        n = sum(correct.values())
+        print(f"{name:>20} {n:>4}/{len(articles):<4} {n / len(articles):>9.1%}  {per_label}")
+
+
+def throughput(articles, count: int, padding: int) -> None:
+    docs = [{**a, "abstract": f"{a['abstract']} {FILLER * padding}"} for a in articles]
+    docs = [docs[i % len(docs)] for i in range(count)]
+    text_only = [{"title": d["title"], "abstract": d["abstract"]} for d in docs]
+    chars = sum(len(d["title"]) + len(d["abstract"]) for d in docs) / len(docs)
+    runs = {
+        "legacy keywords": lambda: [legacy_classify(d["title"], d["abstract"]) for d in docs],
+        "text, per article": lambda: [level_from_text(d["title"], d["abstract"]) for d in docs],
+        "text, batch": lambda: classify_evidence_levels(text_only),
+        "with types, batch": lambda: classify_evidence_levels(docs),
+    }
+    print(f"\n{count} articles of ~{chars:.0f} characters")
+    print(f"{'classifier':>20} {'articles/s':>12} {'us/article':>11}")
+    for name, run in runs.items():
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        print(f"{name:>20} {count / elapsed:>12,.0f} {elapsed / count * 1e6:>11.1f}")
+
+
+def main(args):
+    with open(args.fixture) as f:
+        articles = json.load(f)["articles"]
+    typed = sum(bool(a.get("publication_types")) for a in articles)
+    print(f"Fixture: {len(articles)} labelled articles, {typed} with publication types\n")
+    accuracy(articles, args.verbose)
+    throughput(articles, args.count, args.padding)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--fixture", default=FIXTURE)
+    parser.add_argument("--count", type=int, default=50_000)
+    parser.add_argument("--padding", type=int, default=10, help="filler sentences added to each abstract")
+    parser.add_argument("--verbose", action="store_true", help="list misclassified articles")
+    main(parser.parse_args())
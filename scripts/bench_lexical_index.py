@@ -0,0 +1,183 @@
+"""Build time, memory and query latency of the BM25 lexical index, and what hybrid retrieval saves.
+
+A synthetic corpus of --docs abstracts is drawn from a Zipf-distributed
+vocabulary, with a share of documents about each condition in
+scripts/conditions.json. It is indexed with rag.lexical_index (compressed-row
+postings) and with a dict-of-dicts inverted index for comparison, then
+queried with build_query-style queries.
+
+The second part runs the sufficiency check against the local stubs with the
+vector RPC returning only weak matches (similarity 0.45), as happens when
+dense similarity ranks exact clinical terms low: vector-only retrieval asks
+for dynamic ingestion, the lexical check answers from the index without a
+vector search. Queries for conditions with no indexed documents must still
+ask for ingestion.
+
+Run from backend/:  python3 ../scripts/bench_lexical_index.py [--docs 100000]
+"""
+import sys
+sys.path.append("../backend")
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import statistics
+import time
+import tracemalloc
+from collections import Counter
+
+import numpy as np
+from stubs import StubServer
+
+stub = StubServer(embed_latency=0.05, db_latency=0.02, match_similarity=0.45).start()
+stub.configure_env()
+os.environ["LEXICAL_INDEX_ENABLED"] = "true"
+
+from app.core.config import settings  # noqa: E402
+from rag.lexical_index import LexicalIndex, lexical_index, tokenize  # noqa: E402
+from rag.vectorstore import Retrieval  # noqa: E402
+
+CONDITIONS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "conditions.json")
+STAGES = ["acute", "subacute", "chronic"]
+# Conditions with no documents in the synthetic corpus
+UNSEEN = ["scaphoid fracture", "de quervain tenosynovitis", "thoracic outlet syndrome",
+          "medial collateral ligament sprain", "greater trochanteric pain syndrome"]
+SYMPTOMS = ["pain", "swelling", "stiffness", "weakness", "instability", "reduced range of motion"]
+
+
+def load_conditions():
+    with open(CONDITIONS_FILE) as f:
+        conditions = json.load(f)
+    # Strip the search boilerplate, e.g. "ACL reconstruction rehabilitation physical therapy"
+    boilerplate = {"rehabilitation", "physical", "therapy", "physiotherapy", "treatment", "exercise"}
+    names = {" ".join(w for w in c.split() if w.lower() not in boilerplate) for v in conditions.values() for c in v}
+    return sorted(n for n in names if n)
+
+
+def corpus(n: int, conditions, seed: int = 7):
+    rng = np.random.default_rng(seed)
+    vocabulary = np.array([f"w{i}" for i in range(40_000)])
+    weights = 1 / np.arange(1, len(vocabulary) + 1) ** 1.05
+    weights /= weights.sum()
+    common = "patients rehabilitation exercise therapy pain function outcome study trial stage weeks".split()
+    words = rng.choice(len(vocabulary), size=(n, 230), p=weights)
+    docs = []
+    for i in range(n):
+        text = list(vocabulary[words[i]])
+        text[::9] = [common[j % len(common)] for j in range(len(text[::9]))]
+        title = " ".join(text[:12])
+        if i % 4 == 0:
+            # A quarter of the corpus is about one of the curated conditions
+            condition = conditions[i // 4 % len(conditions)]
+            title = f"{condition} {STAGES[i % 3]} {title}"
+            symptom = SYMPTOMS[i // 4 // len(conditions) % len(SYMPTOMS)]
+            text[20:20] = f"{condition} {symptom}".split()
+        docs.append({"pmid": str(40_000_000 + i), "title": title, "abstract": " ".join(text[12:]),
+                     "authors": ["Smith J"], "year": "2020", "url": "", "source": "PubMed",
+                     "evidence_level": "standard"})
+    return docs
+
+
+def build_query(condition: str, rng: random.Random) -> str:
+    return f"{condition} {rng.choice(STAGES)} stage rehabilitation {' '.join(rng.sample(SYMPTOMS, 2))}"
+
+
+def dict_index(docs):
+    """Inverted index as dict term -> {doc number: tf}, for comparison."""
+    index = {}
+    for number, doc in enumerate(docs):
+        for term, count in Counter(tokenize(f"{doc['title']} {doc['abstract']}")).items():
+            index.setdefault(term, {})[number] = count
+    return index
+
+
+def measure_build(label: str, build):
+    start = time.perf_counter()
+    build()
+    elapsed = time.perf_counter() - start
+    # Memory is traced on a second build: tracing slows allocation-heavy code several times over
+    tracemalloc.start()
+    index = build()
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:>24} {elapsed:>9.1f}s {retained / 1e6:>11.1f}")
+    return index
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return samples[len(samples) // 2], samples[min(len(samples) - 1, math.ceil(len(samples) * 0.95) - 1)]
+
+
+def query_latency(index: LexicalIndex, queries):
+    for label, run in (("search (pool 50)", lambda q: index.search(q, 50)),
+                       ("sufficiency check", lambda q: index.covered(q, 3, settings.LEXICAL_MIN_COVERAGE))):
+        samples = []
+        for query in queries:
+            start = time.perf_counter()
+            run(query)
+            samples.append((time.perf_counter() - start) * 1000)
+        p50, p95 = percentiles(samples)
+        print(f"{label:>24} {p50:>9.2f} {p95:>9.2f}")
+
+
+async def sufficiency(covered, unseen) -> None:
+    print(f"\nSufficiency check with weak vector matches (similarity 0.45 < 0.5): "
+          f"{len(covered)} indexed conditions, {len(unseen)} with no documents")
+    print(f"{'retrieval':>24} {'ingest (indexed)':>17} {'ingest (unseen)':>16} {'vector RPCs':>12} {'p50 ms':>8}")
+    for label, enabled in (("vector only", False), ("lexical + vector", True)):
+        settings.LEXICAL_INDEX_ENABLED = enabled
+        stub.calls.clear()
+        ingest, samples = Counter(), []
+        for group, queries in (("covered", covered), ("unseen", unseen)):
+            for query in queries:
+                start = time.perf_counter()
+                ingest[group] += await Retrieval(query).needs_more_research()
+                samples.append((time.perf_counter() - start) * 1000)
+        print(f"{label:>24} {ingest['covered']:>8}/{len(covered):<8} {ingest['unseen']:>7}/{len(unseen):<8} "
+              f"{stub.calls['rpc']:>12} {statistics.median(samples):>8.1f}")
+
+
+async def main(args):
+    conditions = load_conditions()
+    print(f"Building {args.docs} synthetic abstracts...")
+    docs = corpus(args.docs, conditions)
+    tokens = sum(len(tokenize(f"{d['title']} {d['abstract']}")) for d in docs[:1000]) / 1000
+    print(f"{len(conditions)} conditions, ~{tokens:.0f} indexed tokens per abstract\n")
+
+    print(f"{'index':>24} {'build':>10} {'retained MB':>11}")
+    measure_build("dict of dicts", lambda: dict_index(docs))
+    index = measure_build("compressed-row postings", lambda: (lambda i: (i.build(docs), i)[1])(LexicalIndex()))
+    postings = index.offsets.nbytes + index.doc_ids.nbytes + index.frequencies.nbytes
+    print(f"{'':>24} {len(index.terms)} terms, {postings / 1e6:.1f} MB of posting data")
+
+    added = corpus(1000, conditions, seed=11)
+    for doc in added:
+        doc["pmid"] = "new" + doc["pmid"]
+    start = time.perf_counter()
+    index.add("", added)
+    print(f"{'incremental add':>24} {(time.perf_counter() - start) * 1000 / len(added):>9.3f} ms per document")
+
+    rng = random.Random(3)
+    queries = [build_query(rng.choice(conditions), rng) for _ in range(args.queries)]
+    print(f"\n{args.queries} queries like {queries[0]!r}")
+    print(f"{'query':>24} {'p50 ms':>9} {'p95 ms':>9}")
+    query_latency(index, queries)
+
+    # The sufficiency comparison uses the module index, sized to the demo corpus
+    lexical_index.build(docs[:args.stub_docs])
+    await sufficiency(queries[:40], [build_query(c, rng) for c in UNSEEN for _ in range(2)])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--docs", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--stub-docs", type=int, default=20_000)
+    try:
+        asyncio.run(main(parser.parse_args()))
+    finally:
+        stub.stop()
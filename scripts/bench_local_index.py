@@ -0,0 +1,87 @@
+"""Local in-process vector index versus the match_research_documents RPC.
+
+Times top-5 search (including the evidence re-rank) over synthetic corpora of
+1k, 10k and 100k voyage-large-2-sized vectors, in float32 and float16. The RPC
+column is measured against the local PostgREST stub, so it is the HTTP and
+serialization floor only; real Supabase adds the pgvector scan on top.
+
+Run from backend/:  python3 ../scripts/bench_local_index.py
+"""
+import sys
+sys.path.append("../backend")
+
+import asyncio
+import statistics
+import time
+
+import numpy as np
+from stubs import EMBEDDING_DIM, StubServer, fake_embedding, make_document
+
+stub = StubServer(db_latency=0.0).start()
+stub.configure_env()
+
+from rag.local_index import LocalIndex  # noqa: E402
+from rag.vectorstore import Retrieval  # noqa: E402
+
+SIZES = [1_000, 10_000, 100_000]
+QUERIES = 50
+
+
+def p50_ms(fn, repeats: int = QUERIES) -> float:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+async def rpc_p50_ms(query_embedding) -> float:
+    timings = []
+    for _ in range(QUERIES):
+        retrieval = Retrieval("bench", match_count=5)
+        retrieval.embedding = query_embedding
+        start = time.perf_counter()
+        await retrieval.refresh()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+async def check_snapshot() -> None:
+    """Round-trip a small corpus through Supabase snapshot, save and mmap load."""
+    for i in range(50):
+        doc = make_document(i)
+        doc.pop("id"), doc.pop("similarity")
+        stub.documents[doc["pmid"]] = {**doc, "embedding": fake_embedding(doc["title"])}
+    index = LocalIndex("/tmp/bench_local_index")
+    await index.snapshot()
+    reloaded = LocalIndex("/tmp/bench_local_index")
+    assert reloaded.load() and reloaded.is_fresh() and len(reloaded) == 50
+    top = reloaded.search(fake_embedding("Exercise therapy trial 7"), match_count=1, pool=1)[0]
+    assert top["title"] == "Exercise therapy trial 7", top["title"]
+    print("Snapshot, save and memory-mapped load: ok\n")
+
+
+async def main():
+    await check_snapshot()
+    rng = np.random.default_rng(0)
+    query = rng.standard_normal(EMBEDDING_DIM).astype(np.float32)
+    rpc = await rpc_p50_ms(query.tolist())
+
+    print(f"{'docs':>8} {'dtype':>8} {'build s':>8} {'MB':>8} {'local p50 ms':>13} {'RPC p50 ms':>11}")
+    for size in SIZES:
+        docs = [{"pmid": str(i), "evidence_level": ["systematic_review", "rct", "standard"][i % 3]}
+                for i in range(size)]
+        embeddings = rng.standard_normal((size, EMBEDDING_DIM), dtype=np.float32)
+        for dtype in ("float32", "float16"):
+            index = LocalIndex("/tmp/unused", dtype=dtype)
+            start = time.perf_counter()
+            index.build(docs, embeddings)
+            build = time.perf_counter() - start
+            local = p50_ms(lambda: index.search(query, match_count=5))
+            print(f"{size:>8} {dtype:>8} {build:>8.2f} {index.matrix.nbytes / 1e6:>8.0f} {local:>13.2f} {rpc:>11.2f}")
+        del embeddings, index
+
+
+asyncio.run(main())
+stub.stop()
@@ -0,0 +1,120 @@
+"""Plan output failures and wasted tokens: strict json.loads versus tolerant extraction with continuation.
+
+The stub model truncates a share of its plans as if at max_tokens and wraps a
+share of its JSON-text plans in prose and a code fence. For each output
+handling, 200 plans are generated:
+
+  legacy json.loads     the previous fence-stripping parse; a failure is a 500
+                        and the clinician resubmits, paying for the whole plan again
+  json + continuation   tolerant extraction of JSON text, missing fields requested
+  tool + continuation   forced tool call with the TreatmentPlanOutput schema
+
+Run from backend/:  python3 ../scripts/bench_plan_output.py [--truncate 0.1] [--preamble 0.1]
+"""
+import sys
+sys.path.append("../backend")
+
+import argparse
+import asyncio
+import json
+import time
+
+from stubs import StubServer, make_document
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--plans", type=int, default=200)
+parser.add_argument("--truncate", type=float, default=0.1, help="share of responses cut off at max_tokens")
+parser.add_argument("--preamble", type=float, default=0.1, help="share of JSON-text responses wrapped in prose")
+args = parser.parse_args()
+
+stub = StubServer(embed_latency=0.0, db_latency=0.0, llm_latency=0.05,
+                  llm_truncate_rate=args.truncate, llm_preamble_rate=args.preamble).start()
+stub.configure_env()
+
+from app.core.config import settings  # noqa: E402
+from models.schemas import HealingStage, PTInput, TreatmentPlanOutput  # noqa: E402
+from rag.pipeline import build_prompt, generate, plan_from_message  # noqa: E402
+from rag.plan_output import PlanOutputError  # noqa: E402
+from rag.usage import plan_output_stats  # noqa: E402
+
+PATIENT = PTInput(symptoms=["knee pain"], diagnosis="ACL reconstruction", healing_stage=HealingStage.subacute,
+                  functional_limitations=["stairs"], pain_level=4)
+EVIDENCE = [make_document(i, similarity=0.8) for i in range(5)]
+MAX_RESUBMITS = 5
+
+
+def legacy_parse(response_text: str) -> TreatmentPlanOutput:
+    """The previous parse: strip one code fence, json.loads, construct."""
+    clean = response_text.strip()
+    if clean.startswith("```"):
+        clean = clean.split("```")[1]
+        if clean.startswith("json"):
+            clean = clean[4:]
+    return TreatmentPlanOutput(**json.loads(clean.strip()))
+
+
+async def legacy_plan(totals) -> None:
+    for attempt in range(MAX_RESUBMITS):
+        message = await generate(build_prompt(PATIENT, EVIDENCE))
+        totals["calls"] += 1
+        totals["output"] += message.usage.output_tokens
+        try:
+            legacy_parse(message.content[0].text)
+            return
+        except Exception:
+            totals["errors"] += 1
+            totals["wasted"] += message.usage.output_tokens
+    totals["failed"] += 1
+
+
+async def tolerant_plan(totals) -> None:
+    for attempt in range(MAX_RESUBMITS):
+        prompt = build_prompt(PATIENT, EVIDENCE)
+        message = await generate(prompt)
+        calls = stub.calls["llm"]
+        try:
+            await plan_from_message(message, prompt)
+            return
+        except PlanOutputError:
+            totals["errors"] += 1
+        finally:
+            totals["output"] += message.usage.output_tokens
+            totals["calls"] += 1 + stub.calls["llm"] - calls
+    totals["failed"] += 1
+
+
+async def run(label: str, mode: str, plan) -> None:
+    settings.PLAN_OUTPUT_MODE = mode
+    plan_output_stats.__init__()
+    stub.calls.clear()
+    totals = {"calls": 0, "output": 0, "errors": 0, "wasted": 0, "failed": 0}
+    start = time.perf_counter()
+    for _ in range(args.plans):
+        await plan(totals)
+    elapsed = time.perf_counter() - start
+    stats = plan_output_stats.stats()
+    output = totals["output"] + stats["continuation_output_tokens"]
+    wasted = totals["wasted"] + stats["wasted_output_tokens"]
+    print(f"{label:>20} {totals['errors'] / args.plans:>10.1%} {totals['calls'] / args.plans:>10.2f} "
+          f"{output / args.plans:>11.0f} {wasted / args.plans:>11.1f} {elapsed / args.plans * 1000:>9.1f}")
+    if stats["plans"]:
+        print(f"{'':>20} outcomes: clean={stats['clean']} repaired={stats['repaired']} "
+              f"continued={stats['continued']} failed={stats['failed']}, "
+              f"regeneration avoided {stats['regeneration_avoided_tokens'] / args.plans:.0f} tokens/plan")
+
+
+async def main():
+    print(f"{args.plans} plans, {args.truncate:.0%} truncated, {args.preamble:.0%} of JSON text with preamble; "
+          f"a full plan is 900 output tokens")
+    print(f"{'output handling':>20} {'500s':>10} {'LLM calls':>10} {'out tokens':>11} {'wasted':>11} {'ms/plan':>9}"
+          "  (per plan)")
+    await run("legacy json.loads", "json", legacy_plan)
+    await run("json + continuation", "json", tolerant_plan)
+    await run("tool + continuation", "tool", tolerant_plan)
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    finally:
+        stub.stop()
@@ -0,0 +1,141 @@
+"""Quantized two-stage search versus exact search in the local vector index.
+
+Builds a synthetic corpus of --size voyage-large-2-sized vectors (clustered
+around topic centres with a shared offset, so nearest neighbours are
+meaningful and the sign bits are not trivially balanced) and queries it
+with perturbed topic centres. For the exact float32 index and for the binary
+and int8 prefilters at several rescore depths it reports the memory of what
+the first stage scans, encode time, search p50, recall@10 of the rescored
+shortlist against exact search, and overlap of the re-ranked top 5.
+
+Then compares the RPC payload of 50 rows carrying float vectors or int8
+codes, and runs one retrieval through the match_research_documents_quantized
+stub to check the RPC path end to end.
+
+Run from backend/:  python3 ../scripts/bench_quantized_search.py [--size 100000]
+"""
+import sys
+sys.path.append("../backend")
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+
+import numpy as np
+from stubs import EMBEDDING_DIM, StubServer, fake_embedding, make_document, quantized_row
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--size", type=int, default=100_000)
+parser.add_argument("--queries", type=int, default=50)
+parser.add_argument("--topics", type=int, default=500)
+args = parser.parse_args()
+
+stub = StubServer(db_latency=0.0).start()
+stub.configure_env()
+os.environ["QUANTIZED_SEARCH"] = "binary"
+
+from app.core.config import settings  # noqa: E402
+from rag.local_index import LocalIndex  # noqa: E402
+from rag.quantization import QUANTIZED_COLUMNS  # noqa: E402
+from rag.vectorstore import Retrieval  # noqa: E402
+
+RESCORE = [100, 200, 400, 800]
+K = 10
+
+
+def corpus(size: int, rng: np.random.Generator):
+    """Normalized (size, dim) vectors around ``args.topics`` centres, plus queries near those centres."""
+    offset = rng.standard_normal(EMBEDDING_DIM, dtype=np.float32) * 0.6
+    centres = rng.standard_normal((args.topics, EMBEDDING_DIM), dtype=np.float32) + offset
+    matrix = np.empty((size, EMBEDDING_DIM), dtype=np.float32)
+    for i in range(0, size, 10_000):
+        n = min(10_000, size - i)
+        block = centres[rng.integers(0, args.topics, n)] + rng.standard_normal((n, EMBEDDING_DIM), dtype=np.float32)
+        matrix[i:i + n] = block / np.linalg.norm(block, axis=1, keepdims=True)
+    queries = centres[rng.integers(0, args.topics, args.queries)]
+    queries = queries + rng.standard_normal(queries.shape, dtype=np.float32)
+    return matrix, queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+def p50_ms(fn, queries) -> float:
+    timings = []
+    for query in queries:
+        start = time.perf_counter()
+        fn(query)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def top_rows(index: LocalIndex, query: np.ndarray) -> set:
+    rows, similarity = index.nearest(query, K)
+    return set(rows.tolist())
+
+
+def payload_bytes() -> None:
+    rows = []
+    for i in range(50):
+        doc = make_document(i)
+        rows.append((doc, fake_embedding(doc["title"])))
+    # PostgREST returns a vector column as its text form, "[0.0123,...]"
+    floats = json.dumps([{**doc, "embedding": json.dumps(vector)} for doc, vector in rows])
+    codes = json.dumps([{**doc, **quantized_row(vector)} for doc, vector in rows])
+    print(f"\nRPC payload for 50 rows: {len(floats) / 1024:.0f} KB with float vectors, "
+          f"{len(codes) / 1024:.0f} KB with int8 codes ({len(floats) / len(codes):.1f}x smaller)")
+
+
+async def check_rpc() -> None:
+    retrieval = Retrieval("bench", match_count=5)
+    retrieval.embedding = fake_embedding("bench")
+    results = await retrieval.refresh()
+    assert len(results) == 5 and not any(set(QUANTIZED_COLUMNS) & doc.keys() for doc in results)
+    print(f"Quantized RPC retrieval (QUANTIZED_SEARCH={settings.QUANTIZED_SEARCH}): "
+          f"{len(results)} documents, codes stripped after MMR: ok")
+
+
+async def main():
+    rng = np.random.default_rng(0)
+    start = time.perf_counter()
+    matrix, queries = corpus(args.size, rng)
+    print(f"{args.size} vectors x {EMBEDDING_DIM} dims, {args.topics} topics, "
+          f"{args.queries} queries ({time.perf_counter() - start:.0f}s to generate)\n")
+    docs = [{"pmid": str(i), "evidence_level": ["systematic_review", "rct", "standard"][i % 3]}
+            for i in range(args.size)]
+
+    exact = LocalIndex("/tmp/unused")
+    exact.build(docs, matrix, normalized=True)
+    truth = [top_rows(exact, q) for q in queries]
+    reranked = [[d["pmid"] for d in exact.search(q, match_count=5)] for q in queries]
+    exact_ms = p50_ms(lambda q: exact.search(q, match_count=5), queries)
+    print(f"{'index':>8} {'rescore':>8} {'scan MB':>8} {'encode s':>9} {'p50 ms':>8} {'recall@10':>10} {'top-5':>6}")
+    print(f"{'float32':>8} {'-':>8} {matrix.nbytes / 1e6:>8.0f} {'-':>9} {exact_ms:>8.2f} {1.0:>10.3f} {1.0:>6.2f}")
+
+    for quantization in ("binary", "int8"):
+        index = LocalIndex("/tmp/unused", quantization=quantization)
+        start = time.perf_counter()
+        index.build(docs, matrix, normalized=True)
+        encode = time.perf_counter() - start
+        scanned = index.codes.nbytes + (index.scales.nbytes if index.scales is not None else 0)
+        for rescore in RESCORE:
+            index.rescore = rescore
+            recall = statistics.mean(len(top_rows(index, q) & t) / K for q, t in zip(queries, truth))
+            overlap = statistics.mean(
+                len({d["pmid"] for d in index.search(q, match_count=5)} & set(r)) / 5
+                for q, r in zip(queries, reranked)
+            )
+            ms = p50_ms(lambda q: index.search(q, match_count=5), queries)
+            print(f"{quantization:>8} {rescore:>8} {scanned / 1e6:>8.0f} {encode:>9.2f} {ms:>8.2f} "
+                  f"{recall:>10.3f} {overlap:>6.2f}")
+        del index
+
+    payload_bytes()
+    await check_rpc()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    finally:
+        stub.stop()
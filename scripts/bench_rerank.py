@@ -0,0 +1,88 @@
+"""Re-ranking cost for a 500-candidate pool.
+
+Compares the previous per-document Python loop with the NumPy reranker:
+building features from the row dicts (the RPC path), with precomputed
+features (the local index path), and with MMR over 1536-dim embeddings.
+
+Run from backend/:  python3 ../scripts/bench_rerank.py
+"""
+import sys
+sys.path.append("../backend")
+
+import argparse
+import statistics
+import time
+
+import numpy as np
+from stubs import EMBEDDING_DIM, StubServer, make_document
+
+StubServer().configure_env()
+
+from rag.reranker import Reranker, candidate_features  # noqa: E402
+from rag.vectorstore import EVIDENCE_LEVEL_PRIORITY  # noqa: E402
+
+
+def legacy_rerank(docs, match_count):
+    """The previous implementation: fixed 0.7/0.3 weights, scored one dict at a time."""
+    for doc in docs:
+        similarity = doc.get("similarity", 0)
+        evidence_priority = EVIDENCE_LEVEL_PRIORITY.get(doc.get("evidence_level", "standard"), 0)
+        doc["combined_score"] = (similarity * 0.7) + (evidence_priority / 4 * 0.3)
+    docs.sort(key=lambda x: x["combined_score"], reverse=True)
+    return docs[:match_count]
+
+
+def make_pool(size: int):
+    rng = np.random.default_rng(0)
+    docs = []
+    for i in range(size):
+        doc = make_document(i % (size // 2), similarity=0.9)
+        doc["similarity"] = float(rng.uniform(0.4, 0.9))
+        doc["year"] = str(1995 + i % 30)
+        if i >= size // 2:  # second half repeats the first under hq_ PMIDs
+            doc["pmid"] = f"hq_{doc['pmid']}"
+            doc["source"] = "PubMed (High Quality)"
+        docs.append(doc)
+    embeddings = rng.standard_normal((size, EMBEDDING_DIM)).astype(np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return docs, embeddings
+
+
+def p50_us(fn, repeats: int) -> float:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1e6
+
+
+def main(args):
+    docs, embeddings = make_pool(args.candidates)
+    similarity = np.array([d["similarity"] for d in docs], dtype=np.float32)
+    features = candidate_features(docs)
+    plain = Reranker(recency=0.1, source=0.05)
+    diverse = Reranker(recency=0.1, source=0.05, mmr_lambda=0.7, duplicate_similarity=0.97)
+
+    rows = [
+        ("legacy Python loop", lambda: legacy_rerank([dict(d) for d in docs], 5)),
+        ("copy of the pool only", lambda: [dict(d) for d in docs]),
+        ("features from dicts", lambda: plain.rerank(docs, 5)),
+        ("precomputed features", lambda: plain.rerank(docs, 5, similarity=similarity, features=features)),
+        ("score only", lambda: plain.score(similarity, features)),
+        ("precomputed + MMR", lambda: diverse.rerank(docs, 5, similarity=similarity, features=features,
+                                                     embeddings=embeddings)),
+    ]
+    print(f"{args.candidates} candidates, top 5, median of {args.repeats}")
+    for label, fn in rows:
+        print(f"{label:>24} {p50_us(fn, args.repeats):>10.1f} us")
+
+    top = diverse.rerank(docs, 5, similarity=similarity, features=features, embeddings=embeddings)
+    assert len({d["pmid"].removeprefix("hq_") for d in top}) == 5, "hq_ duplicates survived"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--candidates", type=int, default=500)
+    parser.add_argument("--repeats", type=int, default=2000)
+    main(parser.parse_args())
@@ -0,0 +1,189 @@
+"""Latency and cost of model-tier routing for POST /api/v1/analyze against the local stubs.
+
+The stub models answer in proportion to their real generation speed
+(--deep-latency seconds per plan for the deep tier, 0.5x and 0.2x that for
+the standard and fast tiers). The workload mixes simple presentations,
+presentations with one complicating factor and complex ones; a --weak share
+of requests retrieves only standard-level evidence. Scenarios:
+
+  deep only            routing disabled: every plan on the deep tier (the previous behaviour)
+  routed               evidence strength and input complexity choose the tier
+  routed + SLO         the same, with an X-Latency-SLO-Ms header on every request
+                       (tiers expect the stub latencies until they have their own p50)
+  overloaded, retries  deep tier answering --overload of requests 529, no fallback (SDK retries)
+  overloaded, fallback the same with the deep tier falling back to the standard tier
+
+Every response is validated against TreatmentPlanOutput. Finally the
+overloaded, fallback scenario runs again with the response cache on, checking
+that only plans from the tier a request was routed to are cached, and that a
+route stepped down for its latency budget counts as degraded too.
+
+Run from backend/:  python3 ../scripts/bench_routing.py [--requests 120] [--slo-ms 1500]
+"""
+import sys
+sys.path.append("../backend")
+
+import argparse
+import asyncio
+import os
+import random
+import time
+from collections import Counter
+
+import httpx
+from stubs import StubServer
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--requests", type=int, default=120)
+parser.add_argument("--concurrency", type=int, default=8)
+parser.add_argument("--deep-latency", type=float, default=2.0, help="stub seconds per deep-tier plan")
+parser.add_argument("--weak", type=float, default=0.2, help="share of requests with only standard-level evidence")
+parser.add_argument("--slo-ms", type=float, default=1500)
+parser.add_argument("--overload", type=float, default=0.3, help="share of deep-tier requests answered 529")
+args = parser.parse_args()
+
+stub = StubServer(embed_latency=0.02, db_latency=0.01).start()
+stub.configure_env()
+os.environ["RESPONSE_CACHE_ENABLED"] = "false"  # measure generation, not cached plans
+
+from app.core.config import settings  # noqa: E402
+from main import app  # noqa: E402
+from models.schemas import PTInput, TreatmentPlanOutput  # noqa: E402
+from rag.response_cache import response_cache  # noqa: E402
+from rag.routing import TierStats, model_router  # noqa: E402
+
+MODEL_LATENCY = {settings.DEEP_MODEL: args.deep_latency, settings.STANDARD_MODEL: args.deep_latency * 0.5,
+                 settings.FAST_MODEL: args.deep_latency * 0.2}
+stub.model_latency = MODEL_LATENCY
+# The configured EXPECTED_MS are real-model latencies; SLO routing here must expect the stub's
+for tier in model_router.tiers.values():
+    tier.expected_ms = MODEL_LATENCY[tier.model] * 1000
+DIAGNOSES = ["ACL reconstruction", "lateral ankle sprain", "plantar fasciitis", "Achilles tendinopathy",
+             "patellofemoral pain", "rotator cuff tendinopathy", "low back pain", "knee osteoarthritis"]
+
+
+def patient(rng: random.Random, kind: str) -> dict:
+    payload = {
+        "symptoms": ["pain", "swelling"],
+        "diagnosis": rng.choice(DIAGNOSES),
+        "healing_stage": rng.choice(["acute", "subacute", "chronic"]),
+        "functional_limitations": ["stairs"],
+        "pain_level": rng.randint(2, 6),
+    }
+    if kind == "moderate":
+        payload["constraints"] = ["no gym access"]
+    elif kind == "complex":
+        payload.update(symptoms=["pain", "swelling", "weakness", "night pain", "instability"], pain_level=8,
+                       constraints=["diabetes", "post-op restrictions"], functional_limitations=[
+                           "stairs", "sleep", "work", "running", "lifting"])
+    return payload
+
+
+def workload(n: int, seed: int = 5):
+    rng = random.Random(seed)
+    kinds = rng.choices(["simple", "moderate", "complex"], weights=[60, 25, 15], k=n)
+    return [(patient(rng, kind), rng.random() < args.weak) for kind in kinds]
+
+
+def reset_router(enabled: bool, deep_fallback: str) -> None:
+    model_router.enabled = enabled
+    model_router.tiers["deep"].fallback = deep_fallback or None
+    model_router.tier_stats = {name: TierStats() for name in model_router.tiers}
+    model_router.routes.clear()
+    model_router.fallbacks.clear()
+
+
+async def run(client: httpx.AsyncClient, label: str, requests, headers=None):
+    latencies, failures = [], Counter()
+    slots = asyncio.Semaphore(args.concurrency)
+
+    async def one(payload, weak):
+        async with slots:
+            start = time.perf_counter()
+            response = await client.post("/api/v1/analyze", json=payload, headers=headers)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                failures["http"] += 1
+                return
+            try:
+                TreatmentPlanOutput(**response.json())
+            except Exception:
+                failures["schema"] += 1
+
+    # The stub's evidence mix is global, so weak-evidence requests run as their own phase
+    for weak in (False, True):
+        stub.evidence_levels = ("standard",) if weak else ("systematic_review", "rct", "standard")
+        await asyncio.gather(*(one(p, w) for p, w in requests if w == weak))
+
+    latencies.sort()
+    stats = model_router.stats()
+    cost = sum(t["cost_usd"] for t in stats["tiers"].values())
+    tiers = " ".join(f"{name}={t['generations']}" for name, t in stats["tiers"].items() if t["generations"])
+    fallbacks = sum(stats["fallbacks"].values())
+    print(f"{label:>22} {latencies[len(latencies) // 2] * 1000:>8.0f} "
+          f"{latencies[max(0, -(-len(latencies) * 95 // 100) - 1)] * 1000:>8.0f} "
+          f"{cost / len(requests) * 1000:>9.2f} {failures['http']:>6} {failures['schema']:>7} {fallbacks:>9}  {tiers}")
+
+
+async def check_degraded_not_cached(client: httpx.AsyncClient, requests) -> None:
+    """Fallback and stepped-down plans must not be served from the cache to requests routed to the full tier."""
+    puts = Counter()
+    put = response_cache.put
+
+    def counted_put(*a, **kw):
+        puts["put"] += 1
+        put(*a, **kw)
+
+    response_cache.put, response_cache.enabled = counted_put, True
+    response_cache.entries.clear()
+    reset_router(False, settings.DEEP_FALLBACK)
+    await run(client, "fallback, cached", requests)
+    response_cache.put, response_cache.enabled = put, False
+    stats = model_router.stats()
+    deep, fallbacks = stats["tiers"]["deep"]["generations"], sum(stats["fallbacks"].values())
+    assert fallbacks and puts["put"] == deep, (puts, deep, fallbacks)
+
+    model_router.enabled = True
+    complex_payload = next(p for p, weak in requests if p["pain_level"] == 8 and not weak)
+    evidence = [{"evidence_level": "rct"}] * 5
+    full = model_router.route(PTInput(**complex_payload), evidence)
+    stepped = model_router.route(PTInput(**complex_payload), evidence, budget_ms=1)
+    assert not full.degraded(full.tier) and stepped.degraded(stepped.tier), (full, stepped)
+    print(f"\nResponse cache: {puts['put']} plans cached = {deep} deep-tier generations, "
+          f"{fallbacks} fallback plans not cached; stepped-down route ({stepped.tier.name}) degraded: ok")
+
+
+async def main():
+    requests = workload(args.requests)
+    kinds = Counter("weak evidence" if weak else
+                    "complex" if p["pain_level"] == 8 else "moderate" if p.get("constraints") else "simple"
+                    for p, weak in requests)
+    print(f"{len(requests)} requests at concurrency {args.concurrency}: {dict(kinds)}")
+    print(f"Stub generation time: " + ", ".join(f"{m} {s:.1f}s" for m, s in MODEL_LATENCY.items()) + "\n")
+    print(f"{'scenario':>22} {'p50 ms':>8} {'p95 ms':>8} {'m$/plan':>9} {'errors':>6} {'invalid':>7} "
+          f"{'fallbacks':>9}  generations per tier")
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        await client.post("/api/v1/analyze", json=requests[0][0])  # warm up connection pools
+
+        reset_router(False, settings.DEEP_FALLBACK)
+        await run(client, "deep only", requests)
+        reset_router(True, settings.DEEP_FALLBACK)
+        await run(client, "routed", requests)
+        reset_router(True, settings.DEEP_FALLBACK)
+        await run(client, f"routed + SLO {args.slo_ms:.0f} ms", requests, {"X-Latency-SLO-Ms": str(args.slo_ms)})
+
+        stub.overload_rate = {settings.DEEP_MODEL: args.overload}
+        reset_router(False, "")
+        await run(client, "overloaded, retries", requests)
+        reset_router(False, settings.DEEP_FALLBACK)
+        await run(client, "overloaded, fallback", requests)
+        await check_degraded_not_cached(client, requests)
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    finally:
+        stub.stop()
@@ -0,0 +1,67 @@
+"""Round-trip benchmark for store_documents against the local PostgREST stub.
+
+Compares the old per-article select + insert loop with the batched
+dedupe-first path for a 500-article ingest where 40% is already stored.
+
+Run from backend/:  python3 ../scripts/bench_store.py
+"""
+import sys
+sys.path.append("../backend")
+
+import asyncio
+import time
+
+from stubs import StubServer, make_document
+
+stub = StubServer(embed_latency=0.05, db_latency=0.005).start()
+stub.configure_env()
+
+from app.core.clients import get_supabase  # noqa: E402
+from rag.embeddings import embed_texts  # noqa: E402
+from rag.vectorstore import store_documents  # noqa: E402
+
+ARTICLE_COUNT = 500
+ALREADY_STORED = 200
+
+
+async def per_article_store(articles, query_term=""):
+    """The previous implementation: embed everything, then 2 calls per article."""
+    embeddings = await embed_texts([f"{a['title']}. {a['abstract']}" for a in articles])
+    for article, embedding in zip(articles, embeddings):
+        existing = await get_supabase().table("research_documents").select("id").eq("pmid", article["pmid"]).execute()
+        if existing.data:
+            continue
+        await get_supabase().table("research_documents").insert({**article, "embedding": embedding}).execute()
+
+
+def seed(articles):
+    stub.documents.clear()
+    for article in articles[:ALREADY_STORED]:
+        stub.documents[article["pmid"]] = article
+    stub.calls.clear()
+
+
+async def measure(label, store, articles):
+    seed(articles)
+    start = time.perf_counter()
+    await store(articles, query_term="bench")
+    elapsed = time.perf_counter() - start
+    db_calls = stub.calls["db_select"] + stub.calls["db_write"]
+    print(f"{label:>14} {elapsed:>8.2f}s {db_calls:>10} {stub.calls['embed']:>12} {stub.calls['embed_texts']:>12}")
+
+
+async def main():
+    articles = []
+    for i in range(ARTICLE_COUNT):
+        doc = make_document(i)
+        doc.pop("id"), doc.pop("similarity")
+        articles.append(doc)
+
+    print(f"{ARTICLE_COUNT} articles, {ALREADY_STORED} already stored")
+    print(f"{'path':>14} {'time':>9} {'db calls':>10} {'embed calls':>12} {'texts embedded':>12}")
+    await measure("per-article", per_article_store, articles)
+    await measure("batched", store_documents, articles)
+
+
+asyncio.run(main())
+stub.stop()
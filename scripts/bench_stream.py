@@ -0,0 +1,68 @@
+"""Time-to-first-useful-byte for /analyze/stream versus total latency of /analyze.
+
+Also checks that the stream's time to first useful byte reaches /api/v1/metrics
+as the ``ttfub`` stage.
+
+Run from backend/:  python3 ../scripts/bench_stream.py
+"""
+import sys
+sys.path.append("../backend")
+
+import asyncio
+import os
+import json
+import time
+
+import httpx
+from stubs import StubServer, free_port, serve_in_thread
+
+stub = StubServer(embed_latency=0.05, db_latency=0.02, llm_latency=2.0).start()
+stub.configure_env()
+os.environ["RESPONSE_CACHE_ENABLED"] = "false"  # measure generation, not cached plans
+
+from main import app  # noqa: E402
+
+PAYLOAD = {
+    "symptoms": ["knee pain", "swelling"],
+    "diagnosis": "ACL reconstruction",
+    "healing_stage": "subacute",
+    "functional_limitations": ["stairs"],
+    "pain_level": 4,
+}
+
+
+APP_PORT = free_port()
+app_server, app_thread = serve_in_thread(app, APP_PORT)
+
+
+async def main():
+    # A real server rather than ASGITransport, which buffers streamed bodies
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{APP_PORT}", timeout=60) as client:
+        start = time.perf_counter()
+        response = await client.post("/api/v1/analyze", json=PAYLOAD)
+        response.raise_for_status()
+        blocking = time.perf_counter() - start
+
+        start = time.perf_counter()
+        first_event = first_section = None
+        async with client.stream("POST", "/api/v1/analyze/stream", json=PAYLOAD) as response:
+            async for line in response.aiter_lines():
+                event = json.loads(line)
+                now = time.perf_counter() - start
+                first_event = first_event or now
+                if event["event"] == "section" and first_section is None:
+                    first_section = now
+                print(f"{now * 1000:>8.0f} ms  {event['event']:<10} {event.get('name', '')}")
+        streamed = time.perf_counter() - start
+        ttfub = (await client.get("/api/v1/metrics")).json()["stages"]["ttfub"]
+
+    print(f"\n/analyze total:                 {blocking * 1000:>6.0f} ms")
+    print(f"/analyze/stream retrieval event: {first_event * 1000:>6.0f} ms")
+    print(f"/analyze/stream first section:   {first_section * 1000:>6.0f} ms")
+    print(f"/analyze/stream total:           {streamed * 1000:>6.0f} ms")
+    print(f"/api/v1/metrics ttfub stage:     {ttfub['p50_ms']:>6.0f} ms p50 over {ttfub['count']} stream")
+
+
+asyncio.run(main())
+app_server.should_exit = True
+stub.stop()
@@ -0,0 +1,97 @@
+"""Cost of always-on request tracing, and the /api/v1/metrics breakdown it produces.
+
+Times a span inside and outside a trace and a metrics() summary over a full
+ring buffer, then runs /api/v1/analyze against the local stubs and prints the
+per-stage percentiles with the tracing overhead as a share of request time.
+
+Run from backend/:  python3 ../scripts/bench_tracing.py
+"""
+import sys
+sys.path.append("../backend")
+
+import argparse
+import asyncio
+import os
+import time
+
+import httpx
+from stubs import StubServer
+
+stub = StubServer(embed_latency=0.05, db_latency=0.02, llm_latency=0.5, llm_latency_per_1k_input=0.1).start()
+stub.configure_env()
+os.environ["RESPONSE_CACHE_ENABLED"] = "false"  # measure generation, not cached plans
+
+from app.core.tracing import Tracer, tracer  # noqa: E402
+from main import app  # noqa: E402
+
+PAYLOAD = {
+    "symptoms": ["knee pain", "swelling"],
+    "diagnosis": "ACL reconstruction",
+    "healing_stage": "subacute",
+    "functional_limitations": ["stairs"],
+    "pain_level": 4,
+}
+
+
+def ns_per_span(local: Tracer, spans: int, traced: bool) -> float:
+    scope = local.trace("bench") if traced else None
+    if scope:
+        scope.__enter__()
+    start = time.perf_counter()
+    for _ in range(spans):
+        with local.span("stage") as span:
+            span.size = 1
+    elapsed = time.perf_counter() - start
+    if scope:
+        scope.__exit__(None, None, None)
+    return elapsed / spans * 1e9
+
+
+def metrics_ms(local: Tracer, traces: int, spans: int) -> float:
+    for _ in range(traces):
+        with local.trace("analyze"):
+            for i in range(spans):
+                with local.span(f"stage_{i}"):
+                    pass
+    start = time.perf_counter()
+    local.metrics()
+    return (time.perf_counter() - start) * 1000
+
+
+async def main(args):
+    local = Tracer(buffer_size=args.buffer)
+    inside = ns_per_span(local, 200_000, traced=True)
+    outside = ns_per_span(local, 200_000, traced=False)
+    print(f"span inside a trace:  {inside:>7.0f} ns")
+    print(f"span outside a trace: {outside:>7.0f} ns")
+    print(f"metrics() over {args.buffer} traces x 15 spans: {metrics_ms(local, args.buffer, 15):.1f} ms")
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+        await client.post("/api/v1/analyze", json=PAYLOAD)  # warm up connection pools
+        tracer.traces.clear()
+        for _ in range(args.requests):
+            (await client.post("/api/v1/analyze", json=PAYLOAD)).raise_for_status()
+        metrics = (await client.get("/api/v1/metrics")).json()
+
+    print(f"\n{args.requests} /analyze requests against the stubs")
+    print(f"{'stage':>20} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'mean size':>10}")
+    for stage, s in {**metrics["traces"], **metrics["stages"]}.items():
+        print(f"{stage:>20} {s['count']:>6} {s['p50_ms']:>9.2f} {s['p95_ms']:>9.2f} {s['p99_ms']:>9.2f} "
+              f"{s.get('mean_size', ''):>10}")
+
+    spans = sum(len(trace.spans) for trace in tracer.traces) / len(tracer.traces)
+    request_ms = metrics["traces"]["analyze"]["p50_ms"]
+    overhead_ms = (spans * inside + 2 * inside) / 1e6  # the trace scope costs about two spans
+    print(f"\n{spans:.0f} spans per request: ~{overhead_ms * 1000:.0f} us of tracing per "
+          f"{request_ms:.0f} ms request ({overhead_ms / request_ms:.4%})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--buffer", type=int, default=2000)
+    try:
+        asyncio.run(main(parser.parse_args()))
+    finally:
+        stub.stop()
@@ -0,0 +1,170 @@
+"""Latency and cost of warm plans for POST /api/v1/analyze against the local stubs.
+
+Baseline plans for the 20 curated conditions x 3 healing stages are
+precomputed on the deep tier first and stored in the stub warm_plans table;
+the API's store is then emptied and reloaded from the table, as on a machine
+that never ran the precompute. The stub models answer in proportion to
+their real generation speed (--deep-latency seconds per full plan, 0.5x for
+the standard tier) and to the share of a full plan they return, so an
+adaptation that rewrites three sections costs a fraction of a plan. The
+workload is --curated of presentations whose diagnosis names a curated
+condition, the rest conditions outside the list. Scenarios:
+
+  live      warm plans disabled: retrieval and a deep-tier plan per request (the previous behaviour)
+  adapt     curated diagnoses answered from the warm plan plus a standard-tier delta for the patient
+
+Then new research is stored for one condition, as the weekly refresh would:
+its plans are dropped here and from the table, its requests run live, and the next precompute
+regenerates only those plans. Every response is validated against
+TreatmentPlanOutput.
+
+Run from backend/:  python3 ../scripts/bench_warm_plans.py [--requests 120] [--curated 0.8]
+"""
+import sys
+sys.path.append("../backend")
+
+import argparse
+import asyncio
+import os
+import random
+import time
+from collections import Counter
+
+import httpx
+from stubs import StubServer
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--requests", type=int, default=120)
+parser.add_argument("--concurrency", type=int, default=8)
+parser.add_argument("--deep-latency", type=float, default=2.0, help="stub seconds per full deep-tier plan")
+parser.add_argument("--curated", type=float, default=0.8, help="share of requests for a curated condition")
+args = parser.parse_args()
+
+stub = StubServer(embed_latency=0.02, db_latency=0.01, output_scaled_latency=True).start()
+stub.configure_env()
+os.environ["RESPONSE_CACHE_ENABLED"] = "false"  # measure generation, not cached plans
+os.environ["WARM_PLANS_ENABLED"] = "true"
+
+from app.core.config import settings  # noqa: E402
+from main import app  # noqa: E402
+from models.schemas import TreatmentPlanOutput  # noqa: E402
+from precompute_plans import precompute  # noqa: E402
+from rag.routing import TierStats, model_router  # noqa: E402
+from rag.vectorstore import store_documents  # noqa: E402
+from rag.warm_plans import warm_plans  # noqa: E402
+
+stub.model_latency = {settings.DEEP_MODEL: args.deep_latency, settings.STANDARD_MODEL: args.deep_latency * 0.5,
+                      settings.FAST_MODEL: args.deep_latency * 0.2}
+# How clinicians write the curated conditions, and conditions outside the list
+CURATED = ["ACL reconstruction", "rotator cuff tear", "ankle sprain", "patellofemoral pain", "lumbar disc herniation",
+           "Achilles tendinopathy", "knee osteoarthritis", "plantar fasciitis", "tennis elbow", "frozen shoulder",
+           "meniscus tear", "IT band syndrome", "hamstring strain", "low back pain", "right carpal tunnel syndrome"]
+UNCURATED = ["whiplash associated disorder", "De Quervain tenosynovitis", "sacroiliac joint dysfunction",
+             "ACL reconstruction with meniscus repair"]
+INVALIDATED = "Achilles tendinopathy exercise treatment"
+
+
+def workload(n: int, seed: int = 7):
+    rng = random.Random(seed)
+    requests = []
+    for _ in range(n):
+        curated = rng.random() < args.curated
+        request = {
+            "symptoms": rng.sample(["pain", "swelling", "stiffness", "weakness", "night pain"], 2),
+            "diagnosis": rng.choice(CURATED if curated else UNCURATED),
+            "healing_stage": rng.choice(["acute", "subacute", "chronic"]),
+            "functional_limitations": rng.sample(["stairs", "running", "sleep", "lifting"], 1),
+            "pain_level": rng.randint(2, 8),
+            "constraints": rng.choice([[], [], ["no gym access"]]),
+        }
+        requests.append(request)
+    return requests
+
+
+def reset_stats() -> None:
+    model_router.tier_stats = {name: TierStats() for name in model_router.tiers}
+    for counter in ("adapted", "stale", "misses", "invalidated"):
+        setattr(warm_plans, counter, 0)
+
+
+async def run(client: httpx.AsyncClient, label: str, requests):
+    latencies, failures = [], Counter()
+    slots = asyncio.Semaphore(args.concurrency)
+
+    async def one(payload):
+        async with slots:
+            start = time.perf_counter()
+            response = await client.post("/api/v1/analyze", json=payload)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                failures["http"] += 1
+                return
+            try:
+                TreatmentPlanOutput(**response.json())
+            except Exception:
+                failures["schema"] += 1
+
+    reset_stats()
+    await asyncio.gather(*(one(p) for p in requests))
+    latencies.sort()
+    tiers = model_router.stats()["tiers"]
+    cost = sum(t["cost_usd"] for t in tiers.values())
+    output_tokens = sum(t["output_tokens"] for t in tiers.values())
+    warm = warm_plans.stats()
+    print(f"{label:>14} {latencies[len(latencies) // 2] * 1000:>8.0f} "
+          f"{latencies[max(0, -(-len(latencies) * 95 // 100) - 1)] * 1000:>8.0f} "
+          f"{cost / len(requests) * 1000:>9.2f} {output_tokens / len(requests):>10.0f} "
+          f"{warm['adapted']:>5} {warm['stale'] + warm['misses']:>6} "
+          f"{failures['http']:>6} {failures['schema']:>7}")
+
+
+async def main():
+    requests = workload(args.requests)
+    curated = sum(p["diagnosis"] in CURATED for p in requests)
+    print(f"{len(requests)} requests at concurrency {args.concurrency}, {curated} for curated conditions")
+
+    started = time.perf_counter()
+    stats = await precompute(concurrency=args.concurrency)
+    print(f"Precompute: {stats['generated']} warm plans in {time.perf_counter() - started:.1f}s "
+          f"({stub.calls['llm']} generations)")
+    # Another machine: nothing in memory until the store reloads the table
+    warm_plans.entries, warm_plans.loaded_at = {}, None
+    await warm_plans.ensure_fresh()
+    print(f"Reloaded {len(warm_plans.entries)} warm plans from {len(stub.warm_plans)} warm_plans rows\n")
+
+    print(f"{'scenario':>14} {'p50 ms':>8} {'p95 ms':>8} {'m$/plan':>9} {'out tok/pl':>10} "
+          f"{'warm':>5} {'live':>6} {'errors':>6} {'invalid':>7}")
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        await client.post("/api/v1/analyze", json=requests[0])  # warm up connection pools
+
+        warm_plans.enabled = False
+        await run(client, "live", requests)
+        warm_plans.enabled = True
+        await run(client, "adapt", requests)
+
+        # New research for one condition, stored as the weekly refresh stores it
+        entries, rows = len(warm_plans.entries), len(stub.warm_plans)
+        await store_documents([{
+            "pmid": "39999999", "title": "Heavy slow resistance for Achilles tendinopathy",
+            "abstract": "Randomized controlled trial of heavy slow resistance training.", "authors": ["Doe A"],
+            "year": "2026", "url": "https://pubmed.ncbi.nlm.nih.gov/39999999/", "source": "PubMed",
+            "evidence_level": "rct",
+        }], query_term=INVALIDATED)
+        await warm_plans.flush()
+        print(f"\nNew research for '{INVALIDATED}': {entries - len(warm_plans.entries)} warm plans dropped, "
+              f"{rows - len(stub.warm_plans)} rows deleted")
+        achilles = [p for p in requests if p["diagnosis"] == "Achilles tendinopathy"]
+        await run(client, "adapt, dropped", achilles)
+        calls = stub.calls["llm"]
+        stats = await precompute(concurrency=args.concurrency)
+        print(f"Precompute after refresh: {stats['generated']} regenerated, {stats['current']} current "
+              f"({stub.calls['llm'] - calls} generations)")
+        await run(client, "adapt, rebuilt", achilles)
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    finally:
+        stub.stop()
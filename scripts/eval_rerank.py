@@ -0,0 +1,191 @@
+"""Offline evaluation of evidence re-rankers on labelled queries.
+
+A fixture is JSON of the form::
+
+    {"queries": [{"query": "...",
+                  "candidates": [{"pmid": "...", "similarity": 0.81, "evidence_level": "rct",
+                                  "year": "2019", "source": "PubMed", "embedding": [...]}, ...],
+                  "relevant": {"<pmid>": 2, "<pmid>": 1}}]}
+
+``relevant`` grades each PubMed article (plain PMID, 2 = directly applicable,
+1 = related); unlisted candidates count as 0. ``embedding`` is optional and
+enables MMR. Each ranker is scored on nDCG@k, precision@k and the share of
+its top-k that repeats an article already shown (by PMID or by near-identical
+abstract), with repeats earning no gain.
+
+  --capture queries.txt --out fixture.json   pull candidate pools from the
+      live vector store for labelling (fill in "relevant" by hand)
+  --fixture fixture.json                     evaluate on a labelled fixture
+
+Without --fixture a synthetic set is generated; it only exercises the harness
+and says nothing about real retrieval quality.
+
+Run from backend/:  python3 ../scripts/eval_rerank.py [--fixture PATH]
+"""
+import sys
+sys.path.append("../backend")
+
+import argparse
+import asyncio
+import json
+import math
+import random
+from typing import Dict, List
+
+import numpy as np
+
+from rag.reranker import Reranker
+
+DUPLICATE_SIMILARITY = 0.97
+
+
+def base(pmid: str) -> str:
+    return pmid[3:] if pmid.startswith("hq_") else pmid
+
+
+def legacy_ranker(candidates: List[Dict], k: int) -> List[Dict]:
+    """The previous ranking: 0.7 * similarity + 0.3 * evidence priority / 4, no de-duplication."""
+    from rag.vectorstore import EVIDENCE_LEVEL_PRIORITY
+    return sorted(
+        candidates,
+        key=lambda d: d["similarity"] * 0.7 + EVIDENCE_LEVEL_PRIORITY.get(d["evidence_level"], 0) / 4 * 0.3,
+        reverse=True,
+    )[:k]
+
+
+def reranker_ranker(reranker: Reranker):
+    def rank(candidates: List[Dict], k: int) -> List[Dict]:
+        embeddings = None
+        if all("embedding" in c for c in candidates):
+            embeddings = np.array([c["embedding"] for c in candidates], dtype=np.float32)
+            embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+        return reranker.rerank(candidates, k, embeddings=embeddings)
+    return rank
+
+
+RANKERS = {
+    "legacy 0.7/0.3": legacy_ranker,
+    "weighted + collapse": reranker_ranker(Reranker()),
+    "+ recency": reranker_ranker(Reranker(recency=0.1)),
+    "+ recency + source": reranker_ranker(Reranker(recency=0.1, source=0.05)),
+    "+ MMR 0.7": reranker_ranker(Reranker(recency=0.1, source=0.05, mmr_lambda=0.7,
+                                          duplicate_similarity=DUPLICATE_SIMILARITY)),
+    "+ MMR 0.5": reranker_ranker(Reranker(recency=0.1, source=0.05, mmr_lambda=0.5,
+                                          duplicate_similarity=DUPLICATE_SIMILARITY)),
+}
+
+
+def evaluate(ranking: List[Dict], relevant: Dict[str, int], k: int) -> Dict[str, float]:
+    seen_pmids, seen_vectors = set(), []
+    gains, repeats = [], 0
+    for doc in ranking:
+        pmid = base(str(doc["pmid"]))
+        vector = np.asarray(doc["embedding"], dtype=np.float32) if "embedding" in doc else None
+        if vector is not None:
+            vector = vector / max(float(np.linalg.norm(vector)), 1e-12)
+        repeat = pmid in seen_pmids or (
+            vector is not None and any(float(vector @ v) >= DUPLICATE_SIMILARITY for v in seen_vectors)
+        )
+        repeats += repeat
+        gains.append(0 if repeat else relevant.get(pmid, 0))
+        seen_pmids.add(pmid)
+        if vector is not None:
+            seen_vectors.append(vector)
+
+    dcg = sum((2 ** g - 1) / math.log2(i + 2) for i, g in enumerate(gains))
+    ideal = sorted(relevant.values(), reverse=True)[:k]
+    idcg = sum((2 ** g - 1) / math.log2(i + 2) for i, g in enumerate(ideal))
+    return {
+        "ndcg": dcg / idcg if idcg else 0.0,
+        "precision": sum(g > 0 for g in gains) / k,
+        "repeats": repeats / k,
+    }
+
+
+def synthetic_fixture(queries: int, candidates: int, dim: int = 64, seed: int = 0) -> Dict:
+    """Candidate pools with graded relevance, hq_ twins and near-duplicate abstracts."""
+    rng = np.random.default_rng(seed)
+    levels = ["systematic_review", "rct", "clinical_trial", "observational", "standard"]
+    fixture = {"queries": []}
+    for q in range(queries):
+        topic = rng.standard_normal(dim)
+        pool, relevant = [], {}
+        for i in range(candidates):
+            grade = int(rng.choice([0, 1, 2], p=[0.6, 0.25, 0.15]))
+            pmid = str(20_000_000 + q * 1000 + i)
+            vector = topic * (0.4 + 0.3 * grade) + rng.standard_normal(dim)
+            # Better evidence and newer papers are somewhat more likely to be the useful ones
+            level = levels[int(np.clip(rng.normal(3 - 1.2 * grade, 1.0), 0, 4))]
+            year = int(np.clip(rng.normal(2008 + 5 * grade, 6), 1990, 2025))
+            doc = {"pmid": pmid, "evidence_level": level, "year": str(year), "source": "PubMed",
+                   "embedding": vector.tolist()}
+            if grade:
+                relevant[pmid] = grade
+            pool.append(doc)
+            if rng.random() < 0.15:  # same article again via the high-quality search
+                pool.append({**doc, "pmid": f"hq_{pmid}", "source": "PubMed (High Quality)"})
+            if rng.random() < 0.1:  # a near-identical abstract under another PMID
+                twin = vector + rng.standard_normal(dim) * 0.02
+                pool.append({**doc, "pmid": str(int(pmid) + 500), "embedding": twin.tolist()})
+        for doc in pool:
+            v = np.asarray(doc["embedding"])
+            doc["similarity"] = float(v @ topic / (np.linalg.norm(v) * np.linalg.norm(topic)))
+        random.Random(q).shuffle(pool)
+        fixture["queries"].append({"query": f"synthetic query {q}", "candidates": pool, "relevant": relevant})
+    return fixture
+
+
+async def capture(queries_path: str, out_path: str, pool: int) -> None:
+    from app.core.clients import get_supabase
+    from rag.embeddings import embed_query
+    from rag.vectorstore import parse_embedding
+
+    fixture = {"queries": []}
+    with open(queries_path) as f:
+        queries = [line.strip() for line in f if line.strip()]
+    for query in queries:
+        embedding = await embed_query(query)
+        result = await get_supabase().rpc("match_research_documents", {
+            "query_embedding": embedding, "match_count": pool,
+        }).execute()
+        candidates = [
+            {**row, "embedding": parse_embedding(row["embedding"])} if row.get("embedding") else row
+            for row in result.data
+        ]
+        fixture["queries"].append({"query": query, "candidates": candidates, "relevant": {}})
+        print(f"{query}: {len(candidates)} candidates")
+    with open(out_path, "w") as f:
+        json.dump(fixture, f, indent=1)
+    print(f"Wrote {out_path}; grade the 'relevant' PMIDs for each query before evaluating")
+
+
+def main(args):
+    if args.capture:
+        asyncio.run(capture(args.capture, args.out, args.pool))
+        return
+    if args.fixture:
+        with open(args.fixture) as f:
+            fixture = json.load(f)
+    else:
+        fixture = synthetic_fixture(args.queries, args.pool)
+        print("Synthetic fixture: exercises the harness only, not real retrieval quality")
+
+    labelled = [q for q in fixture["queries"] if q["relevant"]]
+    print(f"{len(labelled)} labelled queries, top {args.k}")
+    print(f"{'ranker':>22} {'nDCG@k':>8} {'P@k':>6} {'repeats':>8}")
+    for name, rank in RANKERS.items():
+        results = [evaluate(rank([dict(c) for c in q["candidates"]], args.k), q["relevant"], args.k)
+                   for q in labelled]
+        mean = {m: sum(r[m] for r in results) / len(results) for m in results[0]}
+        print(f"{name:>22} {mean['ndcg']:>8.3f} {mean['precision']:>6.2f} {mean['repeats']:>8.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--fixture", help="labelled fixture JSON")
+    parser.add_argument("--capture", help="file of queries, one per line, to capture candidate pools for")
+    parser.add_argument("--out", default="rerank_fixture.json")
+    parser.add_argument("--pool", type=int, default=50, help="candidates per query")
+    parser.add_argument("--queries", type=int, default=100, help="synthetic queries")
+    parser.add_argument("-k", type=int, default=5)
+    main(parser.parse_args())
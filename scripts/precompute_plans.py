@@ -0,0 +1,70 @@
+import sys
+sys.path.append("../backend")
+
+import argparse
+import asyncio
+import os
+from collections import Counter
+from datetime import datetime
+from typing import Dict
+from ingestion.engine import load_conditions
+from models.schemas import HealingStage
+from rag.pipeline import precompute_warm_plan
+from rag.warm_plans import condition_name, warm_key, warm_plans
+
+CONDITIONS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "conditions.json")
+
+
+async def precompute(conditions_file: str = CONDITIONS_FILE, concurrency: int = 4, regenerate: bool = False) -> Dict:
+    """Generate the warm plans missing for each curated condition and healing stage.
+
+    Entries dropped because new research was stored for their condition are
+    missing, so they are regenerated; ``regenerate`` redoes every entry.
+    Entries for conditions no longer in the list are removed.
+    """
+    names = [condition_name(term) for term in load_conditions(conditions_file)["pubmed"]]
+    keys = {warm_key(name, stage.value) for name in names for stage in HealingStage}
+    # Deletions queued by the refresh's new research must land before the table is read
+    await warm_plans.flush()
+    await warm_plans.load()
+    removed = [key for key in warm_plans.entries if key not in keys]
+    if removed:
+        await warm_plans.remove(removed)
+
+    todo = [(name, stage) for name in names for stage in HealingStage
+            if regenerate or warm_key(name, stage.value) not in warm_plans.entries]
+    stats = Counter(current=len(keys) - len(todo), removed=len(removed))
+    slots = asyncio.Semaphore(concurrency)
+
+    async def one(name: str, stage: HealingStage) -> None:
+        async with slots:
+            try:
+                entry = await precompute_warm_plan(name, stage)
+            except Exception as e:
+                stats["failed"] += 1
+                print(f"Warm plan for {name} ({stage.value}) failed: {e}")
+                return
+            if entry is None:
+                stats["insufficient_evidence"] += 1
+            else:
+                stats["generated"] += 1
+                print(f"Warm plan for {name} ({stage.value}): {entry.generation_s:.1f}s on {entry.model}")
+
+    await asyncio.gather(*(one(name, stage) for name, stage in todo))
+    return stats
+
+
+async def main(args):
+    print(f"Precomputing warm plans, started {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    stats = await precompute(args.conditions, args.concurrency, args.all)
+    print(f"Warm plans: {stats['generated']} generated, {stats['current']} already current, "
+          f"{stats['insufficient_evidence']} without enough evidence, {stats['failed']} failed, "
+          f"{stats['removed']} removed ({len(warm_plans.entries)} in the warm_plans table)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute baseline plans per curated condition and healing stage")
+    parser.add_argument("--conditions", default=CONDITIONS_FILE, help="JSON file of conditions per source")
+    parser.add_argument("--concurrency", type=int, default=4, help="plans generated at once")
+    parser.add_argument("--all", action="store_true", help="regenerate current plans too")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,81 @@
+"""Re-score the evidence level of every stored document with ingestion.evidence.
+
+research_documents does not store publication types, so by default levels are
+re-derived from title and abstract. With --publication-types each page's
+PubMed records are re-fetched through efetch (one POST per page, inside the
+shared NCBI rate limit) so their PublicationTypeList decides where present.
+Only rows whose level changes are written, with one update per level per page.
+
+Run from backend/:  python3 ../scripts/reclassify_evidence.py [--publication-types] [--dry-run]
+"""
+import sys
+sys.path.append("../backend")
+
+import argparse
+import asyncio
+import time
+from collections import Counter
+from typing import Dict, List
+
+from app.core.clients import close_clients, get_supabase
+from ingestion.efetch import stream_articles
+from ingestion.evidence import classify_evidence_levels
+from ingestion.pedro import base_pmid
+
+PAGE_SIZE = 1000
+
+
+async def publication_types(rows: List[Dict]) -> Dict[str, List[str]]:
+    pmids = sorted({base_pmid(row["pmid"]) for row in rows})
+    return {article["pmid"]: article["publication_types"] async for article in stream_articles(pmids)}
+
+
+async def reclassify_page(rows: List[Dict], args, transitions: Counter) -> int:
+    if args.publication_types:
+        types = await publication_types(rows)
+        for row in rows:
+            row["publication_types"] = types.get(base_pmid(row["pmid"]))
+
+    changed: Dict[str, List[str]] = {}
+    for row, level in zip(rows, classify_evidence_levels(rows)):
+        if level != row["evidence_level"]:
+            transitions[(row["evidence_level"], level)] += 1
+            changed.setdefault(level, []).append(row["pmid"])
+
+    if not args.dry_run:
+        for level, pmids in changed.items():
+            await get_supabase().table("research_documents").update({"evidence_level": level}).in_(
+                "pmid", pmids
+            ).execute()
+    return sum(len(pmids) for pmids in changed.values())
+
+
+async def main(args):
+    started = time.perf_counter()
+    transitions: Counter = Counter()
+    scanned = changed = start = 0
+    while True:
+        # Offset paging stays stable: updates never touch the ordering column
+        result = await get_supabase().table("research_documents").select(
+            "pmid,title,abstract,evidence_level"
+        ).order("pmid").range(start, start + PAGE_SIZE - 1).execute()
+        if result.data:
+            changed += await reclassify_page(result.data, args, transitions)
+            scanned += len(result.data)
+            print(f"Scanned {scanned} documents, {changed} reclassified")
+        if len(result.data) < PAGE_SIZE:
+            break
+        start += PAGE_SIZE
+
+    for (old, new), count in transitions.most_common():
+        print(f"  {old:>18} -> {new:<18} {count}")
+    action = "would change" if args.dry_run else "changed"
+    print(f"✅ {action} {changed}/{scanned} evidence levels in {time.perf_counter() - started:.1f}s")
+    await close_clients()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-score stored evidence levels")
+    parser.add_argument("--publication-types", action="store_true", help="re-fetch PubMed publication types")
+    parser.add_argument("--dry-run", action="store_true", help="report changes without writing them")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,611 @@
+"""Local stand-ins for Voyage, Supabase/PostgREST, NCBI E-utilities and Anthropic used by the bench_* scripts.
+
+Every stub sleeps for a configurable latency so benchmarks measure how the
+backend overlaps network waits rather than how fast the stubs are.
+"""
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import socket
+import tempfile
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl
+
+import jiter
+import uvicorn
+from xml.sax.saxutils import escape
+
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import StreamingResponse
+
+EMBEDDING_DIM = 1536
+SAMPLE_PLAN_TOKENS = 900
+# The instruction rag.plan_output.continuation_prompt ends a continuation request with
+CONTINUATION = re.compile(r"Provide only the remaining fields, consistent with them: (.+)\.$")
+# ...and rag.pipeline.ADAPT_INSTRUCTION a warm plan adaptation, answered with ADAPTED_FIELDS
+ADAPTATION = "Provide only the fields that must change for this patient"
+ADAPTED_FIELDS = ("exercise_protocol", "progression_criteria", "recovery_timeline")
+# Voyage rejects requests with more items than this
+VOYAGE_MAX_TEXTS = 1000
+
+SAMPLE_PLAN = {
+    "differential_diagnosis": ["ACL graft laxity", "Patellofemoral pain", "Meniscal tear"],
+    "gold_standard": "Progressive quadriceps and hip strengthening with criterion-based return to sport [1].",
+    "special_tests": [{
+        "name": "Lachman test",
+        "procedure": "Stabilise the femur and translate the tibia anteriorly at 20-30 degrees of flexion.",
+        "positive_finding": "Increased anterior translation without a firm end feel",
+        "indicates": "ACL insufficiency",
+    }],
+    "treatment_plan": "Restore range of motion, then progress closed-chain strengthening [1].",
+    "manual_therapy": [{"technique": "Patellar mobilisation", "target": "Patellofemoral joint", "rationale": "Restore glide [1]"}],
+    "exercise_protocol": [{
+        "name": "Quadriceps sets", "description": "Tighten the thigh with the knee straight.",
+        "sets": "3", "reps": "10", "frequency": "Daily", "notes": "Progress to straight leg raises",
+    }],
+    "progression_criteria": ["Full extension", "No effusion"],
+    "contraindications": ["Open-chain loading before 6 weeks"],
+    "recovery_timeline": "Return to sport at 9-12 months.",
+    "citations": [{
+        "title": "ACL rehabilitation review", "authors": ["Smith J"], "year": "2022",
+        "url": "https://pubmed.ncbi.nlm.nih.gov/1/", "source": "PubMed",
+    }],
+}
+
+
+def fake_embedding(text: str, dim: int = EMBEDDING_DIM) -> List[float]:
+    """Deterministic unit vector derived from the text hash."""
+    seed = hashlib.sha256(text.encode()).digest()
+    raw = [((seed[i % len(seed)] * (i + 1)) % 251) / 251 - 0.5 for i in range(dim)]
+    norm = math.sqrt(sum(v * v for v in raw)) or 1.0
+    return [v / norm for v in raw]
+
+
+EVIDENCE_MIX = ("systematic_review", "rct", "standard")
+
+
+def make_document(i: int, similarity: float = 0.8, evidence_levels=EVIDENCE_MIX) -> Dict:
+    return {
+        "id": i,
+        "pmid": str(10_000_000 + i),
+        "title": f"Exercise therapy trial {i}",
+        "abstract": "Randomized controlled trial of progressive loading. " * 8,
+        "authors": ["Smith J", "Doe A"],
+        "year": "2021",
+        "url": f"https://pubmed.ncbi.nlm.nih.gov/{10_000_000 + i}/",
+        "source": "PubMed",
+        "evidence_level": evidence_levels[i % len(evidence_levels)],
+        "similarity": similarity - i * 0.01,
+    }
+
+
+def quantized_row(vector: List[float]) -> Dict:
+    """int8 codes and scale of a vector as match_research_documents_quantized returns them."""
+    scale = max(abs(v) for v in vector) / 127 or 1.0
+    return {"embedding_int8": "\\x" + bytes(round(v / scale) & 0xFF for v in vector).hex(), "embedding_scale": scale}
+
+
+def matches(row: Dict, params) -> bool:
+    """Whether a row passes PostgREST eq, is.null and lt filters, as the batch_jobs queries use them."""
+    for column, condition in params.items():
+        if column == "select":
+            continue
+        op, _, value = condition.partition(".")
+        field = row.get(column)
+        if op == "eq" and str(field) != value:
+            return False
+        if op == "is" and field is not None:
+            return False
+        if op == "lt" and (field is None or field >= float(value)):
+            return False
+    return True
+
+
+def efetch_xml(pmids: List[str]) -> str:
+    """PubMed efetch XML for the given IDs with structured abstracts and publication types."""
+    articles = []
+    for pmid in pmids:
+        n = int(pmid)
+        pub_type = ["Systematic Review", "Randomized Controlled Trial", "Journal Article"][n % 3]
+        year = 2000 + n % 25
+        pub_date = f"<MedlineDate>{year} Dec-{year + 1} Jan</MedlineDate>" if n % 5 == 0 else f"<Year>{year}</Year>"
+        articles.append(f"""<PubmedArticle><MedlineCitation><PMID Version="1">{pmid}</PMID><Article>
+<Journal><JournalIssue><PubDate>{pub_date}</PubDate></JournalIssue></Journal>
+<ArticleTitle>{escape(f"Loading programme for tendinopathy {pmid}")}</ArticleTitle>
+<Abstract>
+<AbstractText Label="BACKGROUND">Tendinopathy is common in runners &amp; athletes.</AbstractText>
+<AbstractText Label="METHODS">Participants were allocated to progressive loading or usual care.</AbstractText>
+<AbstractText Label="RESULTS">Pain and function improved at 12 weeks.</AbstractText>
+<AbstractText Label="CONCLUSIONS">Progressive loading is recommended.</AbstractText>
+</Abstract>
+<AuthorList><Author><LastName>Smith</LastName><ForeName>Jane</ForeName></Author>
+<Author><LastName>Doe</LastName><ForeName>Alex</ForeName></Author></AuthorList>
+<PublicationTypeList><PublicationType>{pub_type}</PublicationType></PublicationTypeList>
+</Article></MedlineCitation></PubmedArticle>""")
+    return "<?xml version=\"1.0\"?>\n<PubmedArticleSet>" + "".join(articles) + "</PubmedArticleSet>"
+
+
+class StubServer:
+    """Runs the stub FastAPI app with uvicorn on a background thread."""
+
+    def __init__(self, embed_latency: float = 0.05, db_latency: float = 0.02,
+                 llm_latency: float = 0.5, ncbi_latency: float = 0.3, match_similarity: float = 0.8,
+                 new_per_search: int = 5, embed_latency_per_text: float = 0.0, embed_failure_rate: float = 0.0,
+                 embed_dim: int = EMBEDDING_DIM, llm_latency_per_1k_input: float = 0.0,
+                 llm_truncate_rate: float = 0.0, llm_preamble_rate: float = 0.0,
+                 model_latency: Optional[Dict[str, float]] = None, overload_rate: Optional[Dict[str, float]] = None,
+                 output_scaled_latency: bool = False):
+        self.embed_latency = embed_latency
+        self.embed_latency_per_text = embed_latency_per_text
+        self.embed_failure_rate = embed_failure_rate
+        self.embed_dim = embed_dim
+        self.db_latency = db_latency
+        self.llm_latency = llm_latency
+        # Prefill cost per 1k uncached input tokens, for prompt-size comparisons
+        self.llm_latency_per_1k_input = llm_latency_per_1k_input
+        # Share of plans cut off as if by max_tokens, and of JSON-text plans wrapped in prose and a fence
+        self.llm_truncate_rate = llm_truncate_rate
+        self.llm_preamble_rate = llm_preamble_rate
+        # Per-model generation time (default llm_latency) and share of requests answered 529 overloaded
+        self.model_latency = model_latency or {}
+        self.overload_rate = overload_rate or {}
+        # Scale generation time by the response's share of a full plan, so partial answers finish sooner
+        self.output_scaled_latency = output_scaled_latency
+        # Evidence levels the match RPC cycles through
+        self.evidence_levels = EVIDENCE_MIX
+        self.ncbi_latency = ncbi_latency
+        self.match_similarity = match_similarity
+        self.calls: Counter = Counter()
+        self.documents: Dict[str, Dict] = {}
+        self.cached_prefixes: set = set()
+        self.history: Dict[str, List[str]] = {}
+        self.chunks: Dict = {}
+        self.batches: Dict[str, Dict] = {}
+        self.warm_plans: Dict[str, Dict] = {}
+        self.batch_jobs: Dict[str, Dict] = {}
+        self.new_per_search = new_per_search
+        self.port = free_port()
+        self.app = self._build_app()
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def configure_env(self) -> None:
+        """Point the backend settings at this server; call before importing backend modules."""
+        os.environ["SUPABASE_URL"] = self.url
+        os.environ["SUPABASE_KEY"] = "stub"
+        os.environ["VOYAGE_API_KEY"] = "stub"
+        os.environ["VOYAGE_BASE_URL"] = f"{self.url}/v1"
+        os.environ["ANTHROPIC_API_KEY"] = "stub"
+        os.environ["ANTHROPIC_BASE_URL"] = self.url
+        os.environ["NCBI_EUTILS_URL"] = f"{self.url}/eutils"
+        os.environ["EMBEDDING_CACHE_PATH"] = os.path.join(tempfile.mkdtemp(), "embeddings.sqlite3")
+
+    def start(self) -> "StubServer":
+        self._server, self._thread = serve_in_thread(self.app, self.port)
+        return self
+
+    def stop(self) -> None:
+        if self._server:
+            self._server.should_exit = True
+            self._thread.join(timeout=5)
+
+    def _build_app(self) -> FastAPI:
+        app = FastAPI()
+
+        @app.post("/v1/embeddings")
+        async def embeddings(request: Request):
+            body = await request.json()
+            self.calls["embed"] += 1
+            if body.get("input_type") == "query":
+                self.calls["embed_query"] += 1
+            if len(body["input"]) > VOYAGE_MAX_TEXTS:
+                return _json({"detail": f"input list exceeds {VOYAGE_MAX_TEXTS} items"}, 400)
+            if random.random() < self.embed_failure_rate:
+                self.calls["embed_throttled"] += 1
+                return _json({"detail": "rate limit exceeded"}, 429)
+            self.calls["embed_texts"] += len(body["input"])
+            await asyncio.sleep(self.embed_latency + self.embed_latency_per_text * len(body["input"]))
+            return _json({
+                "object": "list",
+                "data": [
+                    {"object": "embedding", "embedding": fake_embedding(t, self.embed_dim), "index": i}
+                    for i, t in enumerate(body["input"])
+                ],
+                "model": body["model"],
+                "usage": {"total_tokens": sum(len(t) // 4 for t in body["input"])},
+            })
+
+        @app.post("/rest/v1/rpc/match_research_documents")
+        async def match(request: Request):
+            body = await request.json()
+            self.calls["rpc"] += 1
+            await asyncio.sleep(self.db_latency)
+            return [make_document(i, self.match_similarity, self.evidence_levels) for i in range(body["match_count"])]
+
+        @app.post("/rest/v1/rpc/match_research_documents_quantized")
+        async def match_quantized(request: Request):
+            body = await request.json()
+            self.calls["rpc"] += 1
+            await asyncio.sleep(self.db_latency)
+            docs = [make_document(i, self.match_similarity, self.evidence_levels) for i in range(body["match_count"])]
+            return [{**doc, **quantized_row(fake_embedding(doc["title"], self.embed_dim))} for doc in docs]
+
+        @app.get("/rest/v1/research_documents")
+        async def select(request: Request):
+            self.calls["db_select"] += 1
+            await asyncio.sleep(self.db_latency)
+            pmid_filter = request.query_params.get("pmid", "")
+            op, _, value = pmid_filter.partition(".")
+            if op == "eq":
+                wanted = {value}
+            elif op == "in":
+                wanted = {v.strip('"') for v in value.strip("()").split(",") if v}
+            else:
+                # Full-table page, e.g. a local index snapshot; vectors serialized like pgvector
+                offset = int(request.query_params.get("offset", 0))
+                limit = int(request.query_params.get("limit", len(self.documents)))
+                rows = list(self.documents.values())[offset:offset + limit]
+                return _json([
+                    {"id": offset + i, **row, "embedding": json.dumps(row["embedding"])}
+                    for i, row in enumerate(rows)
+                ])
+            return [{"id": i, "pmid": p} for i, p in enumerate(self.documents) if p in wanted]
+
+        @app.post("/rest/v1/research_documents")
+        async def insert(request: Request):
+            body = await request.json()
+            rows = body if isinstance(body, list) else [body]
+            self.calls["db_write"] += 1
+            self.calls["db_rows"] += len(rows)
+            await asyncio.sleep(self.db_latency)
+            for row in rows:
+                self.documents[row["pmid"]] = row
+            return _json([] if "return=minimal" in request.headers.get("prefer", "") else rows, 201)
+
+        @app.patch("/rest/v1/research_documents")
+        async def update(request: Request):
+            body = await request.json()
+            op, _, value = request.query_params.get("pmid", "").partition(".")
+            wanted = {v.strip('"') for v in value.strip("()").split(",") if v} if op == "in" else {value}
+            self.calls["db_write"] += 1
+            await asyncio.sleep(self.db_latency)
+            for pmid in wanted & self.documents.keys():
+                self.documents[pmid].update(body)
+            return _json([])
+
+        @app.delete("/rest/v1/research_documents")
+        async def delete(request: Request):
+            op, _, value = request.query_params.get("pmid", "").partition(".")
+            wanted = {v.strip('"') for v in value.strip("()").split(",") if v} if op == "in" else {value}
+            self.calls["db_write"] += 1
+            await asyncio.sleep(self.db_latency)
+            for pmid in wanted & self.documents.keys():
+                del self.documents[pmid]
+            # research_chunks.pmid cascades
+            for key in [key for key in self.chunks if key[0] in wanted]:
+                del self.chunks[key]
+            return _json([])
+
+        @app.post("/rest/v1/research_chunks")
+        async def insert_chunks(request: Request):
+            rows = await request.json()
+            self.calls["db_write"] += 1
+            self.calls["chunk_rows"] += len(rows)
+            await asyncio.sleep(self.db_latency)
+            for row in rows:
+                self.chunks[(row["pmid"], row["chunk_index"])] = row
+            return _json([], 201)
+
+        @app.get("/rest/v1/research_chunks")
+        async def select_chunks(request: Request):
+            self.calls["db_select"] += 1
+            await asyncio.sleep(self.db_latency)
+            index_filter = request.query_params.get("chunk_index", "")
+            rows = [r for r in self.chunks.values() if not index_filter or f"eq.{r['chunk_index']}" == index_filter]
+            offset = int(request.query_params.get("offset", 0))
+            limit = int(request.query_params.get("limit", len(rows)))
+            return _json([{"pmid": r["pmid"]} for r in rows[offset:offset + limit]])
+
+        @app.get("/rest/v1/warm_plans")
+        async def select_warm_plans(request: Request):
+            self.calls["db_select"] += 1
+            await asyncio.sleep(self.db_latency)
+            columns = request.query_params.get("select", "*").split(",")
+            return _json([{k: v for k, v in row.items() if columns == ["*"] or k in columns}
+                          for row in self.warm_plans.values()])
+
+        @app.post("/rest/v1/warm_plans")
+        async def upsert_warm_plans(request: Request):
+            body = await request.json()
+            self.calls["db_write"] += 1
+            await asyncio.sleep(self.db_latency)
+            for row in body if isinstance(body, list) else [body]:
+                self.warm_plans[row["key"]] = row
+            return _json([], 201)
+
+        @app.delete("/rest/v1/warm_plans")
+        async def delete_warm_plans(request: Request):
+            op, _, value = request.query_params.get("key", "").partition(".")
+            wanted = {v.strip('"') for v in value.strip("()").split(",") if v} if op == "in" else {value}
+            self.calls["db_write"] += 1
+            await asyncio.sleep(self.db_latency)
+            for key in wanted & self.warm_plans.keys():
+                del self.warm_plans[key]
+            return _json([])
+
+        @app.get("/rest/v1/batch_jobs")
+        async def select_batch_jobs(request: Request):
+            self.calls["db_select"] += 1
+            await asyncio.sleep(self.db_latency)
+            return _json([row for row in self.batch_jobs.values() if matches(row, request.query_params)])
+
+        @app.post("/rest/v1/batch_jobs")
+        async def upsert_batch_jobs(request: Request):
+            body = await request.json()
+            self.calls["db_write"] += 1
+            await asyncio.sleep(self.db_latency)
+            for row in body if isinstance(body, list) else [body]:
+                self.batch_jobs[row["id"]] = row
+            return _json([], 201)
+
+        @app.patch("/rest/v1/batch_jobs")
+        async def update_batch_jobs(request: Request):
+            body = await request.json()
+            self.calls["db_write"] += 1
+            await asyncio.sleep(self.db_latency)
+            rows = [row for row in self.batch_jobs.values() if matches(row, request.query_params)]
+            for row in rows:
+                row.update(body)
+            return _json(rows)
+
+        @app.delete("/rest/v1/batch_jobs")
+        async def delete_batch_jobs(request: Request):
+            self.calls["db_write"] += 1
+            await asyncio.sleep(self.db_latency)
+            for key in [k for k, row in self.batch_jobs.items() if matches(row, request.query_params)]:
+                del self.batch_jobs[key]
+            return _json([])
+
+        @app.post("/rest/v1/rpc/match_research_chunks")
+        async def match_chunks(request: Request):
+            body = await request.json()
+            self.calls["rpc"] += 1
+            await asyncio.sleep(self.db_latency)
+            query = body["query_embedding"]
+            scored = sorted(
+                ((sum(a * b for a, b in zip(query, row["embedding"])), row) for row in self.chunks.values()),
+                key=lambda pair: pair[0], reverse=True,
+            )[:body["match_count"]]
+            parent_fields = ("title", "authors", "year", "url", "source", "evidence_level", "query_term")
+            return _json([
+                {**{k: row[k] for k in ("pmid", "chunk_index", "section", "content")}, "similarity": similarity,
+                 **{k: self.documents[row["pmid"]].get(k) for k in parent_fields}}
+                for similarity, row in scored
+            ])
+
+        @app.get("/eutils/esearch.fcgi")
+        async def esearch(term: str, retmax: int = 20, usehistory: str = "", mindate: str = ""):
+            self.calls["ncbi"] += 1
+            await asyncio.sleep(self.ncbi_latency)
+            if usehistory == "y":
+                # Date-windowed searches find new_per_search fresh IDs, unique to the term and window
+                start = 40_000_000 + int(hashlib.md5(f"{term}|{mindate}".encode()).hexdigest()[:5], 16) * 1000
+                webenv = f"MCID_{len(self.history)}"
+                self.history[webenv] = [str(start + i) for i in range(self.new_per_search)]
+                return {"esearchresult": {"count": str(self.new_per_search), "webenv": webenv,
+                                          "querykey": "1", "idlist": []}}
+            # High-quality searches overlap half of the plain results, as on real PubMed
+            offset = retmax // 2 if "[pt]" in term else 0
+            return {"esearchresult": {"idlist": [str(30_000_000 + offset + i) for i in range(retmax)]}}
+
+        @app.api_route("/eutils/efetch.fcgi", methods=["GET", "POST"])
+        async def efetch(request: Request):
+            self.calls["ncbi"] += 1
+            await asyncio.sleep(self.ncbi_latency)
+            params = dict(request.query_params) if request.method == "GET" else dict(parse_qsl((await request.body()).decode()))
+            if "WebEnv" in params:
+                retstart = int(params.get("retstart", 0))
+                ids = self.history[params["WebEnv"]][retstart:retstart + int(params.get("retmax", 20))]
+            else:
+                ids = params["id"].split(",")
+            return Response(content=efetch_xml(ids), media_type="text/xml")
+
+        @app.post("/v1/messages")
+        async def messages(request: Request):
+            body = await request.json()
+            self.calls["llm"] += 1
+            self.calls[f"llm:{body['model']}"] += 1
+            if random.random() < self.overload_rate.get(body["model"], 0.0):
+                self.calls["llm_overloaded"] += 1
+                return _json({"type": "error", "error": {"type": "overloaded_error", "message": "Overloaded"}}, 529)
+            if body.get("stream"):
+                return StreamingResponse(self._stream_message(body), media_type="text/event-stream")
+            usage = self._prompt_usage(body)
+            prefill = usage["input_tokens"] + usage["cache_creation_input_tokens"]
+            await asyncio.sleep(self._llm_latency(body) + self.llm_latency_per_1k_input * prefill / 1000)
+            return self._message(body, usage)
+
+        # Message Batches: a batch ends llm_latency after it is created, whatever its size
+        @app.post("/v1/messages/batches")
+        async def create_batch(request: Request):
+            body = await request.json()
+            self.calls["llm_batch"] += 1
+            batch_id = f"msgbatch_stub_{len(self.batches)}"
+            self.batches[batch_id] = {"requests": body["requests"], "created": time.time()}
+            return self._batch(batch_id)
+
+        @app.get("/v1/messages/batches/{batch_id}")
+        async def retrieve_batch(batch_id: str):
+            return self._batch(batch_id)
+
+        @app.post("/v1/messages/batches/{batch_id}/cancel")
+        async def cancel_batch(batch_id: str):
+            self.calls["llm_batch_cancel"] += 1
+            self.batches[batch_id]["canceled"] = True
+            return self._batch(batch_id)
+
+        @app.get("/v1/messages/batches/{batch_id}/results")
+        async def batch_results(batch_id: str):
+            lines = [json.dumps({
+                "custom_id": entry["custom_id"],
+                "result": {"type": "succeeded", "message": self._message(entry["params"], self._prompt_usage(entry["params"]))},
+            }) for entry in self.batches[batch_id]["requests"]]
+            return Response(content="\n".join(lines) + "\n", media_type="application/binary")
+
+        return app
+
+    def _llm_latency(self, body: Dict, text: str = "") -> float:
+        latency = self.model_latency.get(body["model"], self.llm_latency)
+        if self.output_scaled_latency and text:
+            latency *= min(1.0, len(text) / len(json.dumps(SAMPLE_PLAN)))
+        return latency
+
+    def _completion(self, body: Dict) -> Tuple[str, bool, str, int]:
+        """The plan JSON generated for a request: (text, as_tool_call, stop_reason, output_tokens).
+
+        Continuation requests get only the fields they ask for, adaptations ADAPTED_FIELDS.
+        """
+        plan = SAMPLE_PLAN
+        content = body["messages"][-1]["content"]
+        last = content[-1]["text"] if isinstance(content, list) else content
+        match = CONTINUATION.search(last)
+        if match:
+            wanted = {name.strip() for name in match.group(1).split(",")}
+            plan = {k: v for k, v in SAMPLE_PLAN.items() if k in wanted}
+        elif ADAPTATION in last:
+            plan = {k: v for k, v in SAMPLE_PLAN.items() if k in ADAPTED_FIELDS}
+        text = json.dumps(plan)
+        as_tool_call = (body.get("tool_choice") or {}).get("type") == "tool"
+        stop_reason = "end_turn"
+        if random.random() < self.llm_truncate_rate:
+            text = text[:random.randint(len(text) // 10, len(text) * 9 // 10)]
+            stop_reason = "max_tokens"
+        output_tokens = round(SAMPLE_PLAN_TOKENS * len(text) / len(json.dumps(SAMPLE_PLAN)))
+        if not as_tool_call and random.random() < self.llm_preamble_rate:
+            text = "Here is the treatment plan:\n```json\n" + text + ("\n```" if stop_reason == "end_turn" else "")
+        return text, as_tool_call, stop_reason, output_tokens
+
+    def _message(self, body: Dict, usage: Dict) -> Dict:
+        text, as_tool_call, stop_reason, output_tokens = self._completion(body)
+        if as_tool_call:
+            block = {"type": "tool_use", "id": "toolu_stub", "name": body["tool_choice"]["name"],
+                     "input": jiter.from_json(text.encode(), partial_mode=True)}
+        else:
+            block = {"type": "text", "text": text}
+        return {
+            "id": "msg_stub",
+            "type": "message",
+            "role": "assistant",
+            "model": body["model"],
+            "content": [block],
+            "stop_reason": stop_reason,
+            "stop_sequence": None,
+            "usage": {**usage, "output_tokens": output_tokens},
+        }
+
+    def _batch(self, batch_id: str) -> Dict:
+        batch = self.batches[batch_id]
+        ended = batch.get("canceled") or time.time() >= batch["created"] + self.llm_latency
+        count = len(batch["requests"])
+        timestamp = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(batch["created"]))
+        return {
+            "id": batch_id,
+            "type": "message_batch",
+            "processing_status": "ended" if ended else "in_progress",
+            "request_counts": {"processing": 0 if ended else count, "succeeded": count if ended else 0,
+                               "errored": 0, "canceled": 0, "expired": 0},
+            "created_at": timestamp,
+            "expires_at": timestamp,
+            "ended_at": timestamp if ended else None,
+            "results_url": f"{self.url}/v1/messages/batches/{batch_id}/results" if ended else None,
+        }
+
+    def _prompt_usage(self, body: Dict) -> Dict:
+        """Emulate Anthropic prompt caching: prefixes up to a cache_control block are reused."""
+        blocks = body.get("system") or []
+        if isinstance(blocks, str):
+            blocks = [{"type": "text", "text": blocks}]
+        for message in body["messages"]:
+            content = message["content"]
+            blocks = blocks + ([{"type": "text", "text": content}] if isinstance(content, str) else content)
+
+        prefix = hashlib.sha256()
+        tokens = read = written = 0
+        for block in blocks:
+            prefix.update(block.get("text", "").encode())
+            tokens += len(block.get("text", "")) // 4
+            if block.get("cache_control"):
+                key = prefix.hexdigest()
+                if key in self.cached_prefixes:
+                    read = tokens
+                else:
+                    self.cached_prefixes.add(key)
+                    written = tokens - read
+        return {
+            "input_tokens": tokens - read - written,
+            "cache_read_input_tokens": read,
+            "cache_creation_input_tokens": written,
+        }
+
+    async def _stream_message(self, body: Dict, chunks: int = 40):
+        """Anthropic SSE stream that spreads llm_latency evenly over the plan text."""
+        text, as_tool_call, stop_reason, output_tokens = self._completion(body)
+        step = -(-len(text) // chunks)
+
+        def sse(event: str, data: Dict) -> str:
+            return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+        usage = self._prompt_usage(body)
+        yield sse("message_start", {"type": "message_start", "message": {
+            "id": "msg_stub", "type": "message", "role": "assistant", "content": [], "model": body["model"],
+            "stop_reason": None, "stop_sequence": None, "usage": {**usage, "output_tokens": 1},
+        }})
+        prefill = usage["input_tokens"] + usage["cache_creation_input_tokens"]
+        await asyncio.sleep(self.llm_latency_per_1k_input * prefill / 1000)
+        if as_tool_call:
+            block = {"type": "tool_use", "id": "toolu_stub", "name": body["tool_choice"]["name"], "input": {}}
+        else:
+            block = {"type": "text", "text": ""}
+        yield sse("content_block_start", {"type": "content_block_start", "index": 0, "content_block": block})
+        for i in range(0, len(text), step):
+            await asyncio.sleep(self._llm_latency(body, text) / chunks)
+            delta = {"type": "input_json_delta", "partial_json": text[i:i + step]} if as_tool_call \
+                else {"type": "text_delta", "text": text[i:i + step]}
+            yield sse("content_block_delta", {"type": "content_block_delta", "index": 0, "delta": delta})
+        yield sse("content_block_stop", {"type": "content_block_stop", "index": 0})
+        yield sse("message_delta", {"type": "message_delta", "delta": {"stop_reason": stop_reason, "stop_sequence": None},
+                                    "usage": {"output_tokens": output_tokens}})
+        yield sse("message_stop", {"type": "message_stop"})
+
+
+def serve_in_thread(app, port: int = 0):
+    """Serve an ASGI app with uvicorn on a daemon thread; returns (server, thread)."""
+    config = uvicorn.Config(app, host="127.0.0.1", port=port or free_port(), log_level="warning")
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    return server, thread
+
+
+def _json(payload, status_code: int = 200) -> Response:
+    # Bypass FastAPI's jsonable_encoder, which dominates runtime on large vector payloads
+    return Response(content=json.dumps(payload), status_code=status_code, media_type="application/json")
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
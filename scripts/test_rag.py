@@ -1,6 +1,7 @@
 import sys
 sys.path.append("../backend")
 
+import asyncio
 from models.schemas import PTInput, HealingStage
 from rag.pipeline import run_rag_pipeline
 
@@ -15,7 +16,7 @@ pt_input = PTInput(
 )
 
 print("Running RAG pipeline...\n")
-result = run_rag_pipeline(pt_input)
+result = asyncio.run(run_rag_pipeline(pt_input))
 
 print("\n=== TREATMENT PLAN ===")
 print(result.treatment_plan)
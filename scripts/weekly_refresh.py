@@ -1,100 +1,63 @@
 import sys
 sys.path.append("../backend")
 
-from ingestion.pubmed import fetch_research
-from ingestion.pedro import fetch_pedro_research
-from rag.vectorstore import store_documents
-from supabase import create_client
-import time
-from datetime import datetime, timedelta
-
-# Import settings
-sys.path.insert(0, "../backend")
-from app.core.config import settings
-
-supabase = create_client(settings.SUPABASE_URL, settings.SUPABASE_KEY)
-
-CONDITIONS = [
-    "ACL reconstruction rehabilitation physical therapy",
-    "rotator cuff tear physical therapy treatment",
-    "lateral ankle sprain rehabilitation",
-    "patellofemoral pain syndrome exercise treatment",
-    "lumbar disc herniation physical therapy",
-    "shoulder impingement syndrome rehabilitation",
-    "Achilles tendinopathy exercise treatment",
-    "knee osteoarthritis physical therapy",
-    "plantar fasciitis treatment rehabilitation",
-    "cervical radiculopathy physical therapy",
-    "hip labral tear rehabilitation",
-    "tennis elbow lateral epicondylitis treatment",
-    "frozen shoulder adhesive capsulitis treatment",
-    "meniscus tear rehabilitation physical therapy",
-    "carpal tunnel syndrome physical therapy",
-    "IT band syndrome rehabilitation running",
-    "hamstring strain rehabilitation return to sport",
-    "low back pain exercise therapy treatment",
-    "biceps tendinopathy rehabilitation",
-    "tibial stress fracture rehabilitation",
-]
-
-# High priority conditions to also fetch from PEDro
-PEDRO_CONDITIONS = [
-    "ACL reconstruction rehabilitation",
-    "rotator cuff rehabilitation",
-    "low back pain exercise therapy",
-    "knee osteoarthritis physiotherapy",
-    "shoulder impingement physiotherapy",
-    "patellofemoral pain physiotherapy",
-    "Achilles tendinopathy exercise",
-    "ankle sprain rehabilitation",
-    "plantar fasciitis physiotherapy",
-    "cervical radiculopathy physiotherapy",
-]
-
-total_stored = 0
-
-print(f"\n{'='*60}")
-print(f"promPT Weekly Research Refresh")
-print(f"Started: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-print(f"{'='*60}\n")
-
-# Step 1: Refresh PubMed articles
-print("PHASE 1: PubMed Refresh")
-print("-" * 40)
-
-for i, condition in enumerate(CONDITIONS):
-    print(f"\n[{i+1}/{len(CONDITIONS)}] PubMed: {condition}")
-    try:
-        articles = fetch_research(condition, max_results=8)
-        if articles:
-            store_documents(articles, query_term=condition)
-            total_stored += len(articles)
-        if i < len(CONDITIONS) - 1:
-            print("Waiting 25 seconds...")
-            time.sleep(25)
-    except Exception as e:
-        print(f"Error: {e}")
-        time.sleep(60)
-        continue
-
-# Step 2: Fetch from PEDro
-print("\n\nPHASE 2: PEDro Refresh")
-print("-" * 40)
-
-for i, condition in enumerate(PEDRO_CONDITIONS):
-    print(f"\n[{i+1}/{len(PEDRO_CONDITIONS)}] PEDro: {condition}")
-    try:
-        articles = fetch_pedro_research(condition, max_results=10)
-        if articles:
-            store_documents(articles, query_term=condition)
-            total_stored += len(articles)
-        time.sleep(5)
-    except Exception as e:
-        print(f"Error: {e}")
-        continue
-
-print(f"\n{'='*60}")
-print(f"Refresh Complete!")
-print(f"New articles stored: {total_stored}")
-print(f"Finished: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-print(f"{'='*60}\n")
+import argparse
+import asyncio
+import os
+from datetime import datetime
+from ingestion.engine import IngestionEngine, IngestionTask, load_conditions
+from precompute_plans import precompute
+# Its store listener drops the warm plans of conditions that get new research
+from rag.warm_plans import warm_plans
+
+CONDITIONS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "conditions.json")
+WATERMARKS_FILE = ".cache/weekly_refresh.watermarks.json"
+
+
+async def main(args):
+    conditions = load_conditions(args.conditions)
+    # High priority conditions are also fetched through the PEDro-style filter
+    tasks = (
+        [IngestionTask("pubmed", condition, max_results=8) for condition in conditions["pubmed"]]
+        + [IngestionTask("pedro", condition, max_results=10) for condition in conditions["pedro"]]
+    )
+
+    print(f"\n{'='*60}")
+    print(f"promPT Weekly Research Refresh")
+    print(f"Started: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print(f"{'='*60}\n")
+
+    # Incremental by default: conditions refreshed before only fetch articles added since then
+    engine = IngestionEngine(
+        ".cache/weekly_refresh.checkpoint.json",
+        workers=args.workers,
+        batch_size=args.batch_size,
+        watermark_path=None if args.full else args.watermarks,
+    )
+    stats = await engine.run(tasks, resume=not args.fresh)
+
+    warm = None
+    await warm_plans.flush()
+    if warm_plans.enabled and not args.skip_precompute:
+        print("\nRegenerating warm plans for conditions with new research...")
+        warm = await precompute(args.conditions, concurrency=args.workers)
+
+    print(f"\n{'='*60}")
+    print(f"Refresh Complete!")
+    print(f"New articles stored: {stats['stored']}")
+    if warm is not None:
+        print(f"Warm plans generated: {warm['generated']} ({warm['current']} unchanged)")
+    print(f"Finished: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print(f"{'='*60}\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Weekly PubMed and PEDro research refresh")
+    parser.add_argument("--conditions", default=CONDITIONS_FILE, help="JSON file of conditions per source")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--fresh", action="store_true", help="ignore any checkpoint from an interrupted run")
+    parser.add_argument("--watermarks", default=WATERMARKS_FILE, help="JSON file of last refresh date per condition")
+    parser.add_argument("--full", action="store_true", help="re-run the relevance search for every condition")
+    parser.add_argument("--skip-precompute", action="store_true", help="leave warm plans missing until the next run")
+    asyncio.run(main(parser.parse_args()))